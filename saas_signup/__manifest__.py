@@ -45,6 +45,10 @@
         'views/saas_client_views.xml',           # Load second - defines client views
         'views/saas_config_settings_views.xml',  # Load third - defines menu items
         'views/saas_config_list_views.xml',      # Configuration list view (after menu defined)
+        'views/saas_provision_job_views.xml',    # Provisioning queue
+        'views/saas_spare_tenant_views.xml',     # Hot spare pool
+        'views/saas_tenant_usage_views.xml',     # Usage history
+        'views/saas_upgrade_views.xml',          # Upgrade orchestrator
         'views/saas_dashboard_views.xml',        # Dashboard views
         'views/saas_setup_wizard_views.xml',     # Setup wizard
         'views/website_menu_views.xml',          # Website navigation menus
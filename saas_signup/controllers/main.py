@@ -1,47 +1,91 @@
-from odoo import http
+from odoo import http, fields
 from odoo.http import request
-import docker
+from werkzeug.http import http_date
+import hashlib
+import hmac
 import psycopg2
-from psycopg2 import sql
 import logging
 import re
+from urllib.parse import urlsplit
+
+from ..utils.container_runtime import ContainerRuntimeError
+from ..utils.activity import get_activity_log
+from ..utils.routing_service import RoutingService, get_routing_service
 
 _logger = logging.getLogger(__name__)
 
+PUBLIC_MAX_AGE = 300  # seconds a browser may reuse a public page without revalidating
+WAKE_REFRESH = 5  # seconds between reloads of the page shown while a hibernated tenant starts
+
+WAKE_PAGE_HTML = f'''<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><meta http-equiv="refresh" content="{WAKE_REFRESH}"><meta name="viewport" content="width=device-width,initial-scale=1.0"><title>Starting your instance</title><style>body{{font-family:-apple-system,BlinkMacSystemFont,"Segoe UI",Roboto,sans-serif;display:flex;align-items:center;justify-content:center;min-height:100vh;margin:0;background:#F3F4F6;color:#333}}.box{{background:white;border-radius:12px;padding:40px;text-align:center;box-shadow:0 10px 30px rgba(0,0,0,0.1)}}</style></head><body><div class="box"><h1>⏰ Starting your instance</h1><p>It was paused while unused and is waking up. This page reloads by itself.</p></div></body></html>'''
+
+
 class SaasSignupController(http.Controller):
 
+    def _render_public_page(self, template, get_values):
+        """Render a public page with validators derived from the plan/config version.
+
+        Anonymous repeat hits carrying a matching ETag or Last-Modified get a 304 without
+        rendering. The layout embeds the session's CSRF token, so pages are only cached by
+        the browser and the ETag is tied to the session.
+        """
+        version = request.env['saas.subscription'].sudo()._get_public_version()
+        if not request.env.user._is_public():
+            values = dict(get_values(), page_version=version)
+            return request.render(template, values, headers={'Cache-Control': 'private, no-cache'})
+
+        last_modified = fields.Datetime.to_datetime(version)
+        etag = hashlib.sha1(
+            f"{template}|{version}|{request.env.lang}|{request.session.sid}".encode()
+        ).hexdigest()[:20]
+        headers = {
+            'ETag': f'"{etag}"',
+            'Last-Modified': http_date(last_modified),
+            'Cache-Control': f"private, max-age={PUBLIC_MAX_AGE}",
+        }
+        httprequest = request.httprequest
+        if httprequest.if_none_match:
+            not_modified = httprequest.if_none_match.contains(etag)
+        else:
+            since = httprequest.if_modified_since
+            not_modified = since is not None and since.replace(tzinfo=None) >= last_modified
+        if not_modified:
+            return request.make_response(b'', headers=list(headers.items()), status=304)
+
+        values = dict(get_values(), page_version=version)
+        return request.render(template, values, headers=headers)
+
+    def _get_active_plans(self):
+        return request.env['saas.subscription'].sudo().search([
+            ('is_active', '=', True)
+        ], order='sequence')
+
     @http.route('/saas/features', type='http', auth='public', website=True)
     def saas_features(self, **kw):
         """Display SaaS features page"""
-        return request.render('saas_signup.features_page', {})
+        return self._render_public_page('saas_signup.features_page', dict)
 
     @http.route('/saas/pricing', type='http', auth='public', website=True)
     def saas_pricing(self, **kw):
         """Display SaaS pricing page"""
-        plans = request.env['saas.subscription'].sudo().search([
-            ('is_active', '=', True)
-        ], order='sequence')
-        return request.render('saas_signup.pricing_page', {'plans': plans})
+        return self._render_public_page('saas_signup.pricing_page', lambda: {'plans': self._get_active_plans()})
 
     @http.route('/saas/signup', type='http', auth='public', website=True)
     def saas_signup(self, **kw):
         """Display the SaaS signup form"""
-        plans = request.env['saas.subscription'].sudo().search([
-            ('is_active', '=', True)
-        ], order='sequence')
-
-        countries = request.env['res.country'].sudo().search([])
-        config = request.env['saas.configuration'].sudo().get_config()
-
-        values = {
-            'plans': plans,
-            'countries': countries,
-            'config': config,
-            'error': kw.get('error'),
-            'success': kw.get('success'),
-        }
+        def get_values():
+            return {
+                'plans': self._get_active_plans(),
+                'countries': request.env['res.country'].sudo().search([]),
+                'config': request.env['saas.configuration'].sudo().get_config(),
+                'error': kw.get('error'),
+                'success': kw.get('success'),
+            }
 
-        return request.render('saas_signup.signup_form', values)
+        if kw.get('error') or kw.get('success'):
+            return request.render('saas_signup.signup_form', get_values())
+        return self._render_public_page('saas_signup.signup_form', get_values)
 
     @http.route('/saas/signup/submit', type='http', auth='public', website=True, methods=['POST'], csrf=False)
     def saas_signup_submit(self, **post):
@@ -107,30 +151,16 @@ class SaasSignupController(http.Controller):
             # Get port based on deployment mode
             _logger.info(f"Creating tenant record: {subdomain} (mode: {config.deployment_mode})")
             
-            # Always assign unique tenant ports (nginx routes subdomains to these ports)
-            port = config.starting_port or 8001
-            docker_client = docker.from_env()
-            used_ports = [8080, 9069]  # Reserved ports
-            
-            # Get existing tenant ports
-            existing_clients = request.env['saas.client'].sudo().search([])
-            for existing in existing_clients:
-                if existing.port:
-                    used_ports.append(existing.port)
-            
-            containers = docker_client.containers.list(
-                all=True,
-                filters={"label": "saas.type=tenant"}
-            )
-            for container in containers:
-                port_label = container.labels.get('saas.port')
-                if port_label:
-                    used_ports.append(int(port_label))
-            
-            while port in used_ports:
-                port += 1
-            
-            db_name = f'saas_{subdomain}'
+            # Claim a pre-provisioned spare for this plan when one is ready
+            spare = request.env['saas.spare.tenant'].sudo()._claim(plan)
+            if spare:
+                port = spare.port
+                db_name = spare.database_name
+            else:
+                # Always assign unique tenant ports (nginx routes subdomains to these ports)
+                # Reserved for a short TTL; confirmed when the client record is created
+                port = request.env['saas.client'].sudo()._get_next_available_port(ttl_minutes=15)
+                db_name = f'saas_{subdomain}'
             
             # Create client record immediately - provisioning will happen in background
             client_vals = {
@@ -149,265 +179,32 @@ class SaasSignupController(http.Controller):
             }
             
             client = request.env['saas.client'].sudo().create(client_vals)
-            _logger.info(f"Client record created: {client.id}, starting background provisioning...")
+            _logger.info(f"Client record created: {client.id}, queueing provisioning...")
             
-            # Get modules to install from plan
-            plan_modules = plan.module_list or 'base'
-            _logger.info(f"Plan modules: {plan_modules}")
-            
-            # Start background thread to provision tenant
-            import threading
-            def provision_tenant():
-                """Background provisioning - runs asynchronously"""
-                try:
-                    _logger.info(f"[Background] Starting provisioning for {subdomain}")
-                    
-                    # Database configuration - get from Odoo config
-                    from odoo.tools import config as odoo_config
-                    db_host = odoo_config.get('db_host', 'db')
-                    db_port = int(odoo_config.get('db_port', 5432))
-                    db_user = odoo_config.get('db_user', 'odoo')
-                    db_password = odoo_config.get('db_password', '248413')  # Use correct password
-                    
-                    # Create database
-                    _logger.info(f"[Background] Creating database: {db_name}")
-                    conn = psycopg2.connect(
-                        host=db_host,
-                        port=db_port,
-                        database="postgres",
-                        user=db_user,
-                        password=db_password
-                    )
-                    conn.autocommit = True
-                    cursor = conn.cursor()
-                    
-                    cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
-                    if not cursor.fetchone():
-                        cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
-                    
-                    cursor.close()
-                    conn.close()
-                    
-                    # Initialize database with plan-specific modules
-                    _logger.info(f"[Background] Installing plan modules: {plan_modules}...")
-                    
-                    # Install modules with proper initialization
-                    try:
-                        init_container = docker_client.containers.run(
-                            'odoo:19',
-                            name=f"init_{subdomain}",
-                            remove=True,
-                            environment={
-                                'HOST': db_host, 
-                                'PORT': str(db_port), 
-                                'USER': db_user, 
-                                'PASSWORD': db_password
-                            },
-                            command=f'odoo -d {db_name} -i {plan_modules} --stop-after-init --without-demo=all --load-language=en_US',
-                            network='odoo19_odoo-network',
-                            stdout=True,
-                            stderr=True
-                        )
-                        _logger.info(f"[Background] Module installation completed")
-                    except Exception as init_error:
-                        _logger.error(f"[Background] Module installation failed: {init_error}")
-                        raise
-                    
-                    # Create admin user
-                    _logger.info(f"[Background] Creating admin user...")
-                    from passlib.context import CryptContext
-                    pwd_context = CryptContext(schemes=['pbkdf2_sha512'], deprecated='auto')
-                    hashed_password = pwd_context.hash(admin_password)
-                    
-                    tenant_conn = psycopg2.connect(
-                        host=db_host, port=db_port, database=db_name,
-                        user=db_user, password=db_password
-                    )
-                    tenant_conn.autocommit = True
-                    tenant_cursor = tenant_conn.cursor()
-                    
-                    # Find admin user (don't use hardcoded ID as modules may create additional users)
-                    tenant_cursor.execute(
-                        "SELECT id, partner_id FROM res_users WHERE login='admin' LIMIT 1"
-                    )
-                    admin_result = tenant_cursor.fetchone()
-                    
-                    if admin_result:
-                        admin_user_id, admin_partner_id = admin_result
-                        _logger.info(f"[Background] Found admin user ID: {admin_user_id}, updating credentials...")
-                        
-                        # Update admin user credentials
-                        tenant_cursor.execute(
-                            "UPDATE res_users SET login=%s, password=%s WHERE id=%s",
-                            (email, hashed_password, admin_user_id)
-                        )
-                        
-                        # Update partner name and email
-                        tenant_cursor.execute(
-                            "UPDATE res_partner SET name=%s, email=%s WHERE id=%s",
-                            (admin_name, email, admin_partner_id)
-                        )
-                        
-                        _logger.info(f"[Background] ✅ Admin credentials updated: login={email}")
-                    else:
-                        _logger.error(f"[Background] ❌ Admin user not found in tenant database!")
-                    
-                    # Verify modules were installed
-                    _logger.info(f"[Background] Verifying module installation...")
-                    plan_module_list = [m.strip() for m in plan_modules.split(',')]
-                    plan_module_names = ','.join([f"'{m}'" for m in plan_module_list])
-                    
-                    tenant_cursor.execute(
-                        f"SELECT name, state FROM ir_module_module WHERE name IN ({plan_module_names})"
-                    )
-                    installed_modules = tenant_cursor.fetchall()
-                    installed_count = sum(1 for _, state in installed_modules if state == 'installed')
-                    _logger.info(f"[Background] Installed {installed_count}/{len(plan_module_list)} plan modules")
-                    
-                    # Hide non-plan modules from Apps menu
-                    _logger.info(f"[Background] Hiding non-plan modules...")
-                    tenant_cursor.execute(
-                        f"UPDATE ir_module_module SET state='uninstallable' "
-                        f"WHERE state='uninstalled' AND name NOT IN ({plan_module_names})"
-                    )
-                    _logger.info(f"[Background] Tenant ready with all plan modules installed")
-                    
-                    tenant_cursor.close()
-                    tenant_conn.close()
-                    
-                    # Create volume for future use
-                    _logger.info(f"[Background] Creating volume for future container...")
-                    volume_name = f"odoo_tenant_{subdomain}_data"
-                    try:
-                        docker_client.volumes.create(name=volume_name)
-                        _logger.info(f"[Background] Volume created: {volume_name}")
-                    except Exception as vol_error:
-                        _logger.warning(f"[Background] Volume creation warning: {vol_error}")
-                    
-                    # Create temporary nginx container showing "waiting" page
-                    _logger.info(f"[Background] Creating waiting page container on port {port}...")
-                    waiting_container_name = f"waiting_{subdomain}"
-                    
-                    # Create simple nginx config
-                    nginx_html = '''<!DOCTYPE html>
-<html><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1.0"><title>Account Pending Approval</title><style>*{margin:0;padding:0;box-sizing:border-box}body{font-family:-apple-system,BlinkMacSystemFont,"Segoe UI",Roboto,sans-serif;background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);min-height:100vh;display:flex;align-items:center;justify-content:center;padding:20px}.container{max-width:600px;background:white;border-radius:20px;box-shadow:0 20px 60px rgba(0,0,0,0.3);padding:50px;text-align:center;animation:fadeIn 0.5s ease-in}@keyframes fadeIn{from{opacity:0;transform:translateY(-20px)}to{opacity:1;transform:translateY(0)}}.icon{font-size:80px;margin-bottom:20px;animation:pulse 2s infinite}@keyframes pulse{0%,100%{transform:scale(1)}50%{transform:scale(1.1)}}h1{color:#333;font-size:32px;margin-bottom:15px}.status{display:inline-block;background:#FEF3C7;color:#92400E;padding:10px 25px;border-radius:25px;font-weight:bold;margin:20px 0;border:2px solid #F59E0B}p{color:#666;font-size:18px;line-height:1.6;margin:20px 0}.info-box{background:#F3F4F6;border-left:4px solid #667eea;padding:20px;margin:30px 0;text-align:left;border-radius:5px}.info-box h3{color:#667eea;margin-bottom:15px;font-size:18px}.info-box ul{list-style:none;padding:0}.info-box li{padding:8px 0;color:#555}.info-box li:before{content:"✓ ";color:#10B981;font-weight:bold;margin-right:8px}.footer{margin-top:30px;padding-top:20px;border-top:1px solid #E5E7EB;color:#999;font-size:14px}.refresh-notice{background:#DBEAFE;color:#1E40AF;padding:15px;border-radius:10px;margin-top:20px;font-size:14px}</style></head><body><div class="container"><div class="icon">⏳</div><h1>Account Pending Approval</h1><div class="status">⚠️ Awaiting Admin Approval</div><p>Thank you for signing up! Your Odoo ERP instance is being prepared.</p><div class="info-box"><h3>📋 What's Happening?</h3><ul><li>Your account has been created</li><li>Database has been prepared</li><li>Awaiting administrator approval</li><li>Your instance will activate automatically once approved</li></ul></div><p><strong>Approval Time:</strong> Usually within 24 hours</p><div class="refresh-notice"><strong>💡 Tip:</strong> Once approved, simply refresh this page. The Odoo login will appear automatically.</div><div class="footer"><p>Odoo ERP SaaS Platform</p><p>Need help? Contact your administrator</p></div></div><script>setTimeout(function(){location.reload()},60000);</script></body></html>'''
-                    
-                    try:
-                        # Create temporary nginx container showing waiting page
-                        waiting_container = docker_client.containers.run(
-                            'nginx:alpine',
-                            name=waiting_container_name,
-                            detach=True,
-                            command=[
-                                'sh', '-c',
-                                f'echo \'{nginx_html}\' > /usr/share/nginx/html/index.html && nginx -g "daemon off;"'
-                            ],
-                            ports={'80/tcp': port},
-                            network='odoo19_odoo-network',
-                            labels={
-                                'saas.type': 'waiting',
-                                'saas.tenant': subdomain,
-                                'saas.port': str(port)
-                            },
-                            restart_policy={'Name': 'unless-stopped'}
-                        )
-                        _logger.info(f"[Background] Waiting page container started: {waiting_container.id[:12]}")
-                    except Exception as nginx_error:
-                        _logger.warning(f"[Background] Could not create waiting container: {nginx_error}")
-                    
-                    _logger.info(f"[Background] Database and credentials ready for {subdomain}")
-                    _logger.info(f"[Background] Waiting page active, Odoo will start after approval")
-                    
-                except Exception as e:
-                    _logger.error(f"[Background] Provisioning failed for {subdomain}: {e}", exc_info=True)
-                    # Update client record with error status
-                    try:
-                        with request.env.cr.savepoint():
-                            request.env['saas.client'].sudo().search([
-                                ('subdomain', '=', subdomain)
-                            ]).write({
-                                'notes': f"Provisioning error: {str(e)}\n\nPlease contact support."
-                            })
-                            request.env.cr.commit()
-                    except:
-                        pass
-            
-            # Start background provisioning
-            try:
-                thread = threading.Thread(target=provision_tenant, daemon=True)
-                thread.start()
-                _logger.info(f"Background provisioning thread started for {subdomain}")
-            except Exception as thread_error:
-                _logger.error(f"Failed to start background thread: {thread_error}", exc_info=True)
-                # Continue anyway - client is created
-
-            # Auto-approve for localhost mode after database is ready
-            config = request.env['saas.configuration'].sudo().get_config()
-            if config.deployment_mode == 'localhost':
-                def auto_approve_tenant():
-                    """Auto-approve tenant after database is ready"""
-                    import time
-                    max_retries = 30  # Wait up to 30 seconds
-                    for i in range(max_retries):
-                        time.sleep(1)
-                        try:
-                            # Check if database exists
-                            conn = psycopg2.connect(
-                                host='db', port=5432, database='postgres',
-                                user='odoo', password='248413'
-                            )
-                            cursor = conn.cursor()
-                            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
-                            if cursor.fetchone():
-                                cursor.close()
-                                conn.close()
-                                
-                                # Check if admin user exists
-                                tenant_conn = psycopg2.connect(
-                                    host='db', port=5432, database=db_name,
-                                    user='odoo', password='248413'
-                                )
-                                tenant_cursor = tenant_conn.cursor()
-                                tenant_cursor.execute("SELECT 1 FROM res_users WHERE login = %s", (email,))
-                                if tenant_cursor.fetchone():
-                                    tenant_cursor.close()
-                                    tenant_conn.close()
-                                    
-                                    # Database and user ready, approve tenant
-                                    with request.env.cr.savepoint():
-                                        client_to_approve = request.env['saas.client'].sudo().browse(client.id)
-                                        client_to_approve.action_approve()
-                                        request.env.cr.commit()
-                                    _logger.info(f"✅ Auto-approved tenant {subdomain} for localhost mode")
-                                    return
-                                tenant_cursor.close()
-                                tenant_conn.close()
-                            else:
-                                cursor.close()
-                                conn.close()
-                        except Exception as e:
-                            if i == max_retries - 1:
-                                _logger.warning(f"Auto-approval timeout for {subdomain}: {e}")
-                            continue
-                
-                # Start auto-approval in separate thread
-                import threading
-                auto_thread = threading.Thread(target=auto_approve_tenant, daemon=True)
-                auto_thread.start()
-                _logger.info(f"Started auto-approval thread for {subdomain}")
+            # Queue provisioning; a bounded worker pool drains the queue and
+            # resumes from the last finished step after a restart. In localhost
+            # mode the job approves the tenant itself the moment it completes.
+            auto_approve = config.deployment_mode == 'localhost'
+            if spare:
+                spare._assign_to(client)
+                request.env['saas.provision.job'].sudo().enqueue(
+                    client, last_step='install_modules', from_template=True, auto_approve=auto_approve,
+                )
+            else:
+                request.env['saas.provision.job'].sudo().enqueue(client, auto_approve=auto_approve)
 
             # Use werkzeug redirect with 303 See Other for POST-redirect-GET pattern
             from werkzeug.utils import redirect
-            return redirect(f'/saas/signup/success?client_id={client.id}', code=303)
+            return redirect(self._signup_success_url(client), code=303)
 
-        except docker.errors.APIError as e:
+        except ContainerRuntimeError as e:
             error_msg = f'Docker error: {str(e)}'
             _logger.error(error_msg, exc_info=True)
             # Still redirect to success page if client was created
             if 'client' in locals() and client:
                 _logger.warning(f"Docker error but client created, redirecting to success for {client.id}")
                 from werkzeug.utils import redirect
-                return redirect(f'/saas/signup/success?client_id={client.id}', code=303)
+                return redirect(self._signup_success_url(client), code=303)
             return request.redirect(f'/saas/signup?error=System error. Please contact support.')
         except psycopg2.Error as e:
             error_msg = f'Database error: {str(e)}'
@@ -416,7 +213,7 @@ class SaasSignupController(http.Controller):
             if 'client' in locals() and client:
                 _logger.warning(f"Database error but client created, redirecting to success for {client.id}")
                 from werkzeug.utils import redirect
-                return redirect(f'/saas/signup/success?client_id={client.id}', code=303)
+                return redirect(self._signup_success_url(client), code=303)
             return request.redirect(f'/saas/signup?error=System error. Please contact support.')
         except Exception as e:
             error_msg = f'Signup failed: {str(e)}'
@@ -425,34 +222,56 @@ class SaasSignupController(http.Controller):
             if 'client' in locals() and client:
                 _logger.warning(f"General error but client created, redirecting to success for {client.id}")
                 from werkzeug.utils import redirect
-                return redirect(f'/saas/signup/success?client_id={client.id}', code=303)
+                return redirect(self._signup_success_url(client), code=303)
             return request.redirect(f'/saas/signup?error=An error occurred. Please try again.')
 
+    def _signup_success_url(self, client):
+        return f'/saas/signup/success?client_id={client.id}&token={client.sudo().signup_token}'
+
     @http.route('/saas/signup/success', type='http', auth='public', website=True)
-    def saas_signup_success(self, client_id=None, **kw):
+    def saas_signup_success(self, client_id=None, token=None, **kw):
         """Display success page after signup"""
         client = None
         if client_id:
             client = request.env['saas.client'].sudo().browse(int(client_id))
 
+        # Live progress only for the browser that signed up (it holds the token)
+        progress_token = False
+        if client and client.exists() and token and hmac.compare_digest(client.signup_token or '', token):
+            progress_token = token
+
         values = {
             'client': client,
+            'progress_token': progress_token,
         }
 
         return request.render('saas_signup.signup_success', values)
 
-    @http.route('/saas/pricing', type='http', auth='public', website=True)
-    def saas_pricing(self, **kw):
-        """Display pricing page"""
-        plans = request.env['saas.subscription'].sudo().search([
-            ('is_active', '=', True)
-        ], order='sequence')
-
-        values = {
-            'plans': plans,
+    def _read_signup_progress(self, token):
+        """Provisioning progress of the signup holding ``token``, or None if there is none"""
+        client = request.env['saas.client'].sudo().search([('signup_token', '=', token)], limit=1)
+        if not client:
+            return None
+        job = request.env['saas.provision.job'].sudo().search([('client_id', '=', client.id)], limit=1)
+        progress = job._get_progress() if job else {
+            'state': 'pending', 'step': False, 'percent': 0, 'message': False, 'error': False,
         }
-
-        return request.render('saas_signup.pricing_page', values)
+        if progress['error']:
+            # The details stay on the job for administrators
+            progress['error'] = 'Setup failed - our team has been notified'
+        progress['client_state'] = client.state
+        return progress
+
+    @http.route('/saas/signup/progress', type='http', auth='public', methods=['GET'], csrf=False, save_session=False)
+    def saas_signup_progress(self, token=None, **kw):
+        """Current provisioning progress; answers immediately, the success page polls it"""
+        if not token:
+            return request.make_json_response({'error': 'token is required'}, status=400)
+
+        progress = self._read_signup_progress(token)
+        if progress is None:
+            return request.make_json_response({'error': 'Unknown signup'}, status=404)
+        return request.make_json_response(progress, headers={'Cache-Control': 'no-store'})
 
     @http.route('/saas/check-subdomain', type='json', auth='public', methods=['POST'])
     def check_subdomain(self, subdomain):
@@ -488,14 +307,67 @@ class SaasSignupController(http.Controller):
                 return {'available': False, 'message': 'Port must be between 8081 and 65535'}
 
             # Check availability
-            existing = request.env['saas.client'].sudo().search([
-                ('port', '=', port)
-            ], limit=1)
-
-            if existing:
+            if not request.env['saas.port.allocator'].sudo().is_port_available(port):
                 return {'available': False, 'message': f'Port {port} is already taken'}
 
             return {'available': True, 'message': f'Port {port} is available!'}
 
         except ValueError:
             return {'available': False, 'message': 'Port must be a valid number'}
+
+    @http.route('/saas/route', type='http', auth='none', methods=['GET'], csrf=False, save_session=False)
+    def tenant_route(self, host=None, **kwargs):
+        """nginx auth_request lookup: 204 + X-Tenant-Backend for a routed tenant host, 403 otherwise
+
+        Answers from the shared route store and the cached configuration snapshot, so it stays
+        cheap enough to run on every proxied request. Only nginx knows the shared secret it
+        sends; the peer address is not trusted (proxy_mode rewrites it from X-Forwarded-For).
+        """
+        expected = request.env['saas.configuration'].sudo().get_config_snapshot().get('routing_secret')
+        provided = request.httprequest.headers.get('X-Saas-Route-Secret') or ''
+        if not expected or not hmac.compare_digest(provided.encode(), expected.encode()):
+            return request.make_response('', status=403)
+
+        host = request.httprequest.headers.get('X-Original-Host') or host
+        backend = get_routing_service().lookup(host)
+        if not backend:
+            return request.make_response('', status=403)
+        # Feeds idle hibernation: a throttled marker file touch, no database write
+        get_activity_log().touch(RoutingService.subdomain_of(host))
+        return request.make_response('', status=204, headers=[('X-Tenant-Backend', backend)])
+
+    @http.route('/saas/wake', type='http', auth='public', methods=['GET'], csrf=False, save_session=False)
+    def tenant_wake(self, **kwargs):
+        """Scale-to-zero wake path: schedule the start of a hibernated tenant, answer at once
+
+        nginx (stopped tenant subdomain) and the shared waiting page responder (hibernated
+        tenant port) proxy the visitor's request here with its own Host, so the tenant is only
+        ever taken from that host. The page reloads itself until the tenant answers instead.
+        """
+        host = request.httprequest.host
+        config = request.env['saas.configuration'].sudo().get_config()
+        Client = request.env['saas.client'].sudo()
+        client = Client.browse()
+        subdomain = RoutingService.subdomain_of(host, config.main_domain)
+        if subdomain:
+            client = Client.search([('subdomain', '=', subdomain)], limit=1)
+        else:
+            try:
+                port = urlsplit(f'//{host}').port
+            except ValueError:
+                port = None
+            if port:
+                client = Client.search([('port', '=', port)], limit=1)
+        if not client:
+            return request.not_found()
+
+        if client.state != 'active':
+            return request.make_response('This instance is not available.', status=503,
+                                         headers=[('Content-Type', 'text/plain'), ('Retry-After', '300')])
+        # De-duplicated per tenant; the wake cron starts the container
+        client._request_wake()
+        return request.make_response(WAKE_PAGE_HTML, status=503, headers=[
+            ('Content-Type', 'text/html; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+            ('Retry-After', str(WAKE_REFRESH)),
+        ])
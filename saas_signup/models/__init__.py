@@ -4,4 +4,9 @@ from . import saas_config
 from . import saas_master_password_wizard
 from . import saas_dashboard
 from . import saas_cron
-from . import saas_setup_wizard
\ No newline at end of file
+from . import saas_setup_wizard
+from . import saas_provision_job
+from . import saas_spare_tenant
+from . import saas_port_allocator
+from . import saas_tenant_usage
+from . import saas_upgrade
@@ -3,9 +3,18 @@ from odoo.exceptions import ValidationError, UserError
 from datetime import datetime, timedelta
 import logging
 import re
+import secrets
+
+from ..utils.container_runtime import get_runtime, ContainerNotFound
+from ..utils import readiness
+from ..utils.db_pool import get_connection_manager, get_db_params
 
 _logger = logging.getLogger(__name__)
 
+# Tenants that keep their nginx route (suspended tenants keep it until removed)
+ROUTED_STATES = ('approved', 'active', 'suspended')
+WAKE_DEDUP_SECONDS = 30  # a hibernated tenant's wake is scheduled at most once per this many seconds
+
 class SaasClient(models.Model):
     _name = 'saas.client'
     _description = 'SaaS Client'
@@ -23,17 +32,24 @@ class SaasClient(models.Model):
     # Company Information
     company_name = fields.Char(string='Company Name', required=True, index=True, tracking=True)
     subdomain = fields.Char(string='Subdomain', required=True, index=True)
-    port = fields.Integer(string='Port', required=True, index=True)
+    # Required for every state but 'rejected', which gives its port back (see _check_port_range)
+    port = fields.Integer(string='Port', index=True)
     longpolling_port = fields.Integer(string='Longpolling Port', readonly=True)
     database_name = fields.Char(string='Database Name', required=True, index=True)
     container_name = fields.Char(string='Container Name', readonly=True)
     container_id = fields.Char(string='Container ID', readonly=True)
+    volume_name = fields.Char(string='Volume Name', readonly=True)
     admin_name = fields.Char(string='Admin Name', required=True)
     admin_email = fields.Char(string='Admin Email', required=True)
     admin_password = fields.Char(string='Admin Password', required=True)
     phone = fields.Char(string='Phone')
     country_id = fields.Many2one('res.country', string='Country')
 
+    tenant_url = fields.Char(string='Tenant URL', compute='_compute_tenant_url')
+    signup_token = fields.Char(string='Signup Token', readonly=True, copy=False, index=True,
+                               groups='base.group_system', default=lambda self: secrets.token_urlsafe(24),
+                               help='Unguessable key of the public signup success and progress pages')
+
     # Subscription
     subscription_id = fields.Many2one('saas.subscription', string='Subscription Plan', required=True, index=True, tracking=True)
     trial_end_date = fields.Date(string='Trial End Date', index=True)
@@ -43,6 +59,8 @@ class SaasClient(models.Model):
     upgrade_requested = fields.Boolean(string='Upgrade Requested', default=False, index=True)
     upgrade_plan_id = fields.Many2one('saas.subscription', string='Requested Upgrade Plan')
     upgrade_request_date = fields.Datetime(string='Upgrade Request Date')
+    odoo_image = fields.Char(string='Odoo Image', readonly=True,
+                             help='Image the tenant was last upgraded to; empty means the configured default')
 
     # State
     state = fields.Selection([
@@ -56,11 +74,30 @@ class SaasClient(models.Model):
     
     approved_by = fields.Many2one('res.users', string='Approved By', readonly=True)
     approved_date = fields.Datetime(string='Approved Date', readonly=True)
+    readiness_state = fields.Selection([
+        ('unknown', 'Unknown'),
+        ('starting', 'Starting'),
+        ('ready', 'Ready'),
+        ('timeout', 'Not Ready (Timed Out)'),
+    ], string='Readiness', default='unknown', readonly=True, copy=False)
+    ready_date = fields.Datetime(string='Ready Since', readonly=True, copy=False)
     rejection_reason = fields.Text(string='Rejection Reason')
 
+    # Usage (refreshed by the resource monitoring cron)
+    storage_used_mb = fields.Float(string='Storage Used (MB)', readonly=True, digits=(16, 2))
+    user_count = fields.Integer(string='Active Users', readonly=True)
+    usage_date = fields.Datetime(string='Usage Measured On', readonly=True)
+    usage_ids = fields.One2many('saas.tenant.usage', 'client_id', string='Daily Usage',
+                                domain=[('granularity', '=', 'day')], readonly=True)
+
     # Metadata
     create_date = fields.Datetime(string='Created Date', readonly=True)
     last_login = fields.Datetime(string='Last Login')
+    hibernated = fields.Boolean(string='Hibernated', readonly=True, copy=False,
+                                help='Container stopped while idle; started again by the first request')
+    hibernated_date = fields.Datetime(string='Hibernated Since', readonly=True, copy=False)
+    wake_requested_date = fields.Datetime(string='Wake Requested On', readonly=True, copy=False,
+                                          help='Set by the first visitor of a hibernated tenant; the wake cron starts it')
     notes = fields.Text(string='Notes')
 
     _sql_constraints = [
@@ -93,13 +130,22 @@ class SaasClient(models.Model):
                 if not re.match(email_pattern, record.admin_email):
                     raise ValidationError(_('Please enter a valid email address.'))
     
-    @api.constrains('port')
+    @api.constrains('port', 'state')
     def _check_port_range(self):
-        """Validate port is within acceptable range"""
+        """Validate port is set (unless rejected) and within acceptable range"""
         for record in self:
+            if not record.port and record.state != 'rejected':
+                raise ValidationError(_('A port is required.'))
             if record.port and (record.port < 1024 or record.port > 65535):
                 raise ValidationError(_('Port must be between 1024 and 65535.'))
 
+    @api.depends('subdomain', 'port')
+    def _compute_tenant_url(self):
+        """Tenant URLs for the whole recordset at once (no per-record config or host lookups)"""
+        urls = self.env['saas.configuration'].sudo().get_config().generate_tenant_urls(self)
+        for record in self:
+            record.tenant_url = urls[record.id]
+
     @api.depends('trial_end_date', 'is_trial')
     def _compute_trial_status(self):
         """Compute trial days remaining and expiration status"""
@@ -144,83 +190,30 @@ class SaasClient(models.Model):
                 'state': 'suspended',
                 'notes': f"{client.notes or ''}\n\nTrial expired on {fields.Date.today()}. Please upgrade to continue."
             })
-            
-            # Stop container
-            try:
-                import docker
-                docker_client = docker.from_env()
-                container_name = f"odoo_tenant_{client.subdomain}"
-                container = docker_client.containers.get(container_name)
-                container.stop()
-                _logger.info(f"Suspended container: {container_name}")
-            except Exception as e:
-                _logger.warning(f"Could not suspend container: {e}")
+        
+        # Stop containers concurrently
+        for client, error in expired_clients._fan_out_containers('stop').items():
+            if error:
+                _logger.warning(f"Could not suspend container: {error}")
+            else:
+                _logger.info(f"Suspended container: {client.container_name or client.subdomain}")
         
         return True
     
     def action_approve_upgrade(self):
-        """Admin approves the upgrade request and installs new modules"""
-        import logging
-        _logger = logging.getLogger(__name__)
-        
-        for record in self:
-            if record.upgrade_requested and record.upgrade_plan_id:
-                old_plan = record.subscription_id
-                new_plan = record.upgrade_plan_id
-                
-                _logger.info(f"Processing upgrade for {record.subdomain}: {old_plan.name} → {new_plan.name}")
-                
-                # Install additional modules from new plan
-                if new_plan.module_list:
-                    try:
-                        import docker
-                        docker_client = docker.from_env()
-                        
-                        # Stop tenant container
-                        container_name = f"odoo_tenant_{record.subdomain}"
-                        try:
-                            container = docker_client.containers.get(container_name)
-                            container.stop()
-                            _logger.info(f"Stopped container: {container_name}")
-                        except:
-                            pass
-                        
-                        # Install new modules
-                        _logger.info(f"Installing modules: {new_plan.module_list}")
-                        docker_client.containers.run(
-                            'odoo:19',
-                            name=f"upgrade_{record.subdomain}",
-                            remove=True,
-                            environment={'HOST': 'db', 'PORT': '5432', 'USER': 'odoo', 'PASSWORD': 'odoo'},
-                            command=f'odoo -d {record.database_name} -i {new_plan.module_list} -u all --stop-after-init --without-demo=all',
-                            network='odoo19_odoo-network'
-                        )
-                        
-                        # Restart tenant container
-                        try:
-                            container = docker_client.containers.get(container_name)
-                            container.start()
-                            _logger.info(f"Restarted container: {container_name}")
-                        except:
-                            pass
-                        
-                    except Exception as e:
-                        _logger.error(f"Upgrade error: {e}")
-                        record.notes = f"{record.notes or ''}\n\nUpgrade error: {str(e)}"
-                        return False
-                
-                # Update subscription and clear upgrade request
-                record.write({
-                    'subscription_id': new_plan.id,
-                    'is_trial': False,
-                    'upgrade_requested': False,
-                    'upgrade_plan_id': False,
-                    'notes': f"{record.notes or ''}\n\nUpgraded from {old_plan.name} to {new_plan.name} on {fields.Datetime.now()}"
-                })
-                
-                _logger.info(f"Upgrade completed for {record.subdomain}")
-        
-        return True
+        """Admin approves upgrade requests: queue one upgrade batch installing only the new plan modules"""
+        requested = self.filtered(lambda r: r.upgrade_requested and r.upgrade_plan_id)
+        if not requested:
+            return True
+        batch = self.env['saas.upgrade.batch']._create_plan_batch(requested)
+        batch.action_start()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'saas.upgrade.batch',
+            'res_id': batch.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
     
     @api.model
     def create(self, vals):
@@ -239,36 +232,94 @@ class SaasClient(models.Model):
         # Call parent create
         clients = super(SaasClient, self).create(vals)
 
+        Allocator = self.env['saas.port.allocator'].sudo()
+        for client in clients:
+            if client.port:
+                Allocator.assign_port(client.port, client)
+
         # Note: Database and container provisioning is now done in the controller
         # The controller creates the database and Docker container before calling this create method
         # So we skip the _create_client_database call here
 
         return clients
     
-    def _get_next_available_port(self):
-        """Get next available port for new tenant instance"""
-        base_port = 8100
-        max_port = 8999
-        
-        used_ports = self.sudo().search([('port', '!=', False)]).mapped('port')
-        
-        for port in range(base_port, max_port + 1):
-            if port not in used_ports:
-                return port
-        
-        raise UserError("No available ports! Maximum tenant limit reached.")
+    @api.model
+    def _get_next_available_port(self, ttl_minutes=None):
+        """Claim the next available port for a new tenant instance"""
+        return self.env['saas.port.allocator'].sudo().allocate_port(ttl_minutes=ttl_minutes)
+    
+    @api.model
+    def _tenant_container_kwargs(self, database_name, port, volume_name, container_name, labels):
+        """Docker arguments for a tenant Odoo container (shared by approval and the spare pool).
+
+        Called on a client, its own image (set by image upgrades) wins over the configured one.
+        """
+        config = self.env['saas.configuration'].sudo().get_config()
+        db_params = get_db_params()
+        own_image = self.odoo_image if len(self) == 1 else False
+        return {
+            'image': own_image or config.odoo_image or 'odoo:19',
+            'name': container_name,
+            'environment': {
+                'HOST': db_params['host'],
+                'PORT': str(db_params['port']),
+                'USER': db_params['user'],
+                'PASSWORD': db_params['password'],
+            },
+            'command': f'odoo --database={database_name} --db-filter=^{database_name}$ --without-demo=all',
+            'ports': {'8069/tcp': ('0.0.0.0', port)},  # Bind to all interfaces for external access
+            'volumes': {
+                volume_name: {'bind': '/var/lib/odoo', 'mode': 'rw'}
+            },
+            'network': config.docker_network or 'odoo19_odoo-network',
+            'labels': labels,
+            'restart_policy': {'Name': 'unless-stopped'},
+        }
+
+    def _tenant_container_labels(self):
+        """Docker labels identifying this tenant's container (port sync and nginx discovery read them)"""
+        self.ensure_one()
+        return {
+            'saas.type': 'tenant',
+            'saas.tenant': self.subdomain,
+            'saas.database': self.database_name,
+            'saas.company': self.company_name,
+            'saas.port': str(self.port),
+        }
+
+    def write(self, vals):
+        old_ports = self.mapped('port') if 'port' in vals else []
+        res = super().write(vals)
+        if 'port' in vals:
+            Allocator = self.env['saas.port.allocator'].sudo()
+            Allocator.release_port([p for p in old_ports if p != vals['port']])
+            for client in self:
+                if client.port:
+                    Allocator.assign_port(client.port, client)
+        return res
+    
+    def unlink(self):
+        ports = self.mapped('port')
+        res = super().unlink()
+        self.env['saas.port.allocator'].sudo().release_port(ports)
+        return res
     
     def _configure_nginx(self):
         """Configure Nginx reverse proxy for this tenant"""
         self.ensure_one()
         
         try:
-            from ..utils.nginx_manager import NginxManager
-            
+            NginxManager = self._get_nginx_manager()
             config = self.env['saas.configuration'].sudo().get_config()
             
             # Only configure Nginx in subdomain mode
-            if config.deployment_mode == 'subdomain':
+            if config.deployment_mode == 'subdomain' and config.nginx_routing_mode == 'dynamic':
+                self._set_dynamic_routes()
+                return True
+            elif config.deployment_mode == 'subdomain' and config.nginx_routing_mode == 'map':
+                self._sync_nginx_routing()
+                return True
+            elif config.deployment_mode == 'subdomain':
                 NginxManager.create_tenant_config(
                     subdomain=self.subdomain,
                     odoo_port=self.port,
@@ -290,160 +341,324 @@ class SaasClient(models.Model):
         self.ensure_one()
         
         try:
-            from ..utils.nginx_manager import NginxManager
-            
+            NginxManager = self._get_nginx_manager()
             config = self.env['saas.configuration'].sudo().get_config()
             
-            if config.deployment_mode == 'subdomain':
+            if config.deployment_mode == 'subdomain' and config.nginx_routing_mode == 'dynamic':
+                from ..utils.routing_service import get_routing_service
+                get_routing_service().remove_routes([self.subdomain])
+            elif config.deployment_mode == 'subdomain' and config.nginx_routing_mode == 'map':
+                self._sync_nginx_routing(exclude=self)
+            elif config.deployment_mode == 'subdomain':
                 NginxManager.remove_tenant_config(self.subdomain)
                 _logger.info(f"✅ Nginx config removed for {self.subdomain}")
             
         except Exception as e:
             _logger.warning(f"Failed to remove Nginx config: {e}")
     
-    def action_approve(self):
-        """Approve pending tenant and create/start container with Nginx config"""
-        from odoo.exceptions import UserError
+    @api.model
+    def _get_nginx_routes(self, exclude=None):
+        """Routed tenants as plain dicts for the nginx map"""
+        domain = [('state', 'in', ROUTED_STATES), ('subdomain', '!=', False)]
+        if exclude:
+            domain.append(('id', 'not in', exclude.ids))
+        return [{
+            'subdomain': client.subdomain,
+            'port': client.port,
+            'container_name': client.container_name or f"odoo_tenant_{client.subdomain}",
+        } for client in self.search(domain)]
+    
+    @api.model
+    def _get_nginx_manager(self):
+        """NginxManager, with the configured reload window and nginx container applied"""
+        from ..utils.nginx_manager import NginxManager
+        from ..utils.nginx_reload import get_reload_coordinator
         
-        for record in self:
-            if record.state == 'pending':
-                # Set longpolling port if not set
-                if not record.longpolling_port:
-                    record.longpolling_port = record.port + 1000
-                
-                # Set container name
-                if not record.container_name:
-                    record.container_name = f"odoo_tenant_{record.subdomain}"
-                
-                record.write({
-                    'state': 'approved',
-                    'approved_by': self.env.user.id,
-                    'approved_date': fields.Datetime.now()
-                })
-                
-                # Create and start the container now that tenant is approved
+        config = self.env['saas.configuration'].sudo().get_config()
+        get_reload_coordinator().configure(window=config.nginx_reload_window)
+        NginxManager.configure_target(config.nginx_container)
+        return NginxManager
+    
+    @api.model
+    def _cron_recover_nginx_reload(self):
+        """Reload nginx for config a recycled worker wrote but never reloaded"""
+        from ..utils.nginx_reload import get_reload_coordinator
+
+        self._get_nginx_manager()
+        get_reload_coordinator().recover()
+        return True
+
+    @api.model
+    def _sync_nginx_routing(self, exclude=None):
+        """Regenerate nginx routing from client records (map and dynamic routing modes)"""
+        NginxManager = self._get_nginx_manager()
+        config = self.env['saas.configuration'].sudo().get_config()
+        if config.nginx_routing_mode == 'dynamic':
+            from ..utils.routing_service import get_routing_service
+            nginx_type = NginxManager._detect_nginx_type()
+            get_routing_service().sync({
+                route['subdomain']: NginxManager._map_backend(route, nginx_type)
+                for route in self._get_nginx_routes(exclude=exclude)
+            })
+            return NginxManager.write_dynamic_server(
+                config.main_domain, config.routing_lookup_url, config_dir=config.nginx_config_path,
+                wake_url=self._get_wake_url(), route_secret=config.routing_secret,
+            )
+        return NginxManager.write_tenant_map(
+            self._get_nginx_routes(exclude=exclude), config.main_domain,
+            config_dir=config.nginx_config_path, wake_url=self._get_wake_url(),
+        )
+    
+    @api.model
+    def _get_wake_url(self):
+        """Public URL nginx sends visitors of a hibernated tenant to"""
+        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url') or ''
+        return f"{base_url.rstrip('/')}/saas/wake"
+    
+    @api.model
+    def _sync_waiting_responder(self):
+        """Point the shared responder at pending tenant ports (waiting page) and hibernated ones (wake)"""
+        from ..utils.waiting_responder import get_waiting_responder
+        pending = self.search([('state', '=', 'pending'), ('port', '!=', False)])
+        hibernated = self.search([('state', '=', 'active'), ('hibernated', '=', True), ('port', '!=', False)])
+        return get_waiting_responder().sync(
+            pending.mapped('port'), hibernated.mapped('port'), self._get_wake_url(),
+        )
+    
+    def _set_dynamic_routes(self):
+        """Route these tenants in the dynamic routing table (no nginx reload)"""
+        from ..utils.routing_service import get_routing_service
+        NginxManager = self._get_nginx_manager()
+        config = self.env['saas.configuration'].sudo().get_config()
+        nginx_type = NginxManager._detect_nginx_type()
+        get_routing_service().set_routes({
+            record.subdomain: NginxManager._map_backend({
+                'port': record.port,
+                'container_name': record.container_name or f"odoo_tenant_{record.subdomain}",
+            }, nginx_type)
+            for record in self if record.subdomain
+        })
+        # Static server block: written and reloaded only the first time
+        NginxManager.write_dynamic_server(
+            config.main_domain, config.routing_lookup_url, config_dir=config.nginx_config_path,
+            wake_url=self._get_wake_url(), route_secret=config.routing_secret,
+        )
+    
+    def action_approve(self):
+        """Approve pending tenants and create/start their containers concurrently"""
+        pending = self.filtered(lambda r: r.state == 'pending')
+        if not pending:
+            return True
+
+        # Defaults that only depend on the row itself: one statement for the batch
+        self.env.cr.execute("""
+            UPDATE saas_client
+               SET longpolling_port = COALESCE(NULLIF(longpolling_port, 0), port + 1000),
+                   container_name = COALESCE(container_name, 'odoo_tenant_' || subdomain)
+             WHERE id = ANY(%s)
+        """, (pending.ids,))
+        pending.invalidate_recordset(['longpolling_port', 'container_name'])
+        pending.write({
+            'state': 'approved',
+            'approved_by': self.env.user.id,
+            'approved_date': fields.Datetime.now()
+        })
+
+        # Free the approved ports on the shared waiting page before tenant containers bind them
+        try:
+            self._sync_waiting_responder()
+        except Exception as e:
+            _logger.warning(f"Could not update waiting page responder: {e}")
+
+        # Container specs are built up front so worker threads never touch the ORM
+        specs = {
+            record.id: {
+                'subdomain': record.subdomain,
+                'container_name': record.container_name,
+                'waiting_container_name': f"waiting_{record.subdomain}",
+                'kwargs': record._tenant_container_kwargs(
+                    record.database_name, record.port,
+                    record.volume_name or f"odoo_tenant_{record.subdomain}_data",
+                    record.container_name,
+                    labels=record._tenant_container_labels(),
+                ),
+            }
+            for record in pending
+        }
+        runtime = get_runtime()
+        results = runtime.fan_out(lambda record_id: _start_tenant_container(runtime, specs[record_id]), pending.ids)
+
+        errors = {}
+        notes = {}
+        succeeded = self.browse()
+        created = self.browse()
+        for record in pending:
+            container_id, error = results[record.id]
+            if error:
+                _logger.error(f"Error creating/starting container for {record.subdomain}: {error}")
+                errors[record] = error
+                notes[record] = [f"\n\nApproval error: {error}\nPlease contact system administrator."]
+                continue
+            errors[record] = None
+            succeeded |= record
+            notes[record] = []
+            if container_id:
+                created |= record
+                record.container_id = container_id[:12]
+                notes[record].append(
+                    f"\n\nApproved and activated on {fields.Datetime.now()}\nContainer: {container_id[:12]}\nStatus: Running on port {record.port}"
+                )
+
+        if succeeded:
+            import subprocess
+
+            config = self.env['saas.configuration'].sudo().get_config()
+            if config.deployment_mode == 'subdomain' and config.nginx_routing_mode == 'dynamic':
+                # Routing table update only: no config rewrite, no reload
                 try:
-                    import docker
-                    docker_client = docker.from_env()
-                    container_name = f"odoo_tenant_{record.subdomain}"
-                    volume_name = f"odoo_tenant_{record.subdomain}_data"
-                    waiting_container_name = f"waiting_{record.subdomain}"
-                    
-                    # Remove waiting page container if it exists
-                    try:
-                        waiting_container = docker_client.containers.get(waiting_container_name)
-                        _logger.info(f"Removing waiting page container: {waiting_container_name}")
-                        waiting_container.stop()
-                        waiting_container.remove()
-                        _logger.info(f"Waiting page container removed")
-                    except docker.errors.NotFound:
-                        _logger.info(f"No waiting container found (already removed or never created)")
-                    except Exception as e:
-                        _logger.warning(f"Error removing waiting container: {e}")
-                    
-                    # Check if Odoo container already exists
-                    try:
-                        container = docker_client.containers.get(container_name)
-                        _logger.info(f"Container {container_name} already exists, starting...")
-                        if container.status != 'running':
-                            container.start()
-                    except docker.errors.NotFound:
-                        # Container doesn't exist, create it
-                        _logger.info(f"Creating container {container_name} on port {record.port}...")
-                        
-                        container = docker_client.containers.run(
-                            'odoo:19',
-                            name=container_name,
-                            detach=True,
-                            environment={
-                                'HOST': 'db',
-                                'PORT': '5432',
-                                'USER': 'odoo',
-                                'PASSWORD': '248413',  # Use correct password from .env
-                            },
-                            command=f'odoo --database={record.database_name} --db-filter=^{record.database_name}$ --without-demo=all',
-                            ports={'8069/tcp': ('0.0.0.0', record.port)},  # Bind to all interfaces for external access
-                            volumes={
-                                volume_name: {'bind': '/var/lib/odoo', 'mode': 'rw'}
-                            },
-                            network='odoo19_odoo-network',
-                            labels={
-                                'saas.type': 'tenant',
-                                'saas.tenant': record.subdomain,
-                                'saas.database': record.database_name,
-                                'saas.company': record.company_name,
-                                'saas.port': str(record.port)
-                            },
-                            restart_policy={'Name': 'unless-stopped'}
-                        )
-                        
-                        _logger.info(f"Container created and started: {container.id[:12]}")
-                        record.container_id = container.id[:12]
-                        record.notes = f"{record.notes or ''}\n\nApproved and activated on {fields.Datetime.now()}\nContainer: {container.id[:12]}\nStatus: Running on port {record.port}"
-                        
-                        # Regenerate nginx map with robust multi-pattern detection
-                        try:
-                            _logger.info(f"Regenerating nginx map with robust detection...")
-                            import subprocess
-                            result = subprocess.run(
-                                ['python3', '/opt/odoo19/scripts/generate_robust_tenant_map.py'],
-                                capture_output=True,
-                                text=True,
-                                timeout=20
-                            )
-                            if result.returncode == 0:
-                                _logger.info(f"✅ Robust nginx map regenerated: {result.stdout}")
-                                record.notes = f"{record.notes}\nNginx: Robust mapping active, found {result.stdout.count('Found:')} containers"
-                            else:
-                                _logger.warning(f"Robust mapping generation warning: {result.stderr}")
-                                record.notes = f"{record.notes}\nNginx: Robust mapping attempted (check logs)"
-                        except Exception as nginx_error:
-                            _logger.error(f"❌ Robust nginx map generation failed: {nginx_error}", exc_info=True)
-                            record.notes = f"{record.notes}\nNginx: Manual robust config may be needed"
-                            # Don't fail approval just because nginx failed
-                            pass
-
-                    # Generate tenant proxy configurations for reverse proxy
+                    succeeded._set_dynamic_routes()
+                    for record in succeeded:
+                        notes[record].append(f"\nNginx: routed {record.subdomain}.{config.main_domain}")
+                except Exception as nginx_error:
+                    _logger.error(f"❌ Dynamic route update failed: {nginx_error}", exc_info=True)
+                    for record in succeeded:
+                        notes[record].append("\nNginx: route update failed (check logs)")
+            elif config.deployment_mode == 'subdomain' and config.nginx_routing_mode == 'map':
+                # One map regeneration (and at most one reload) for the whole batch
+                try:
+                    succeeded._sync_nginx_routing()
+                    for record in succeeded:
+                        notes[record].append(f"\nNginx: routed {record.subdomain}.{config.main_domain}")
+                except Exception as nginx_error:
+                    _logger.error(f"❌ Nginx map update failed: {nginx_error}", exc_info=True)
+                    for record in succeeded:
+                        notes[record].append("\nNginx: map update failed (check logs)")
+            else:
+                # Regenerate nginx map with robust multi-pattern detection (once per batch)
+                if created:
                     try:
-                        _logger.info(f"Generating tenant proxy configurations...")
+                        _logger.info(f"Regenerating nginx map with robust detection...")
                         result = subprocess.run(
-                            ['python3', '/opt/odoo19/scripts/generate_tenant_proxy_configs.py'],
+                            ['python3', '/opt/odoo19/scripts/generate_robust_tenant_map.py'],
                             capture_output=True,
                             text=True,
-                            timeout=10
+                            timeout=20
                         )
                         if result.returncode == 0:
-                            _logger.info(f"✅ Tenant proxy configs generated: {result.stdout}")
-                            record.notes = f"{record.notes}\nReverse Proxy: {record.subdomain}.avodahconsult.info configured"
+                            _logger.info(f"✅ Robust nginx map regenerated: {result.stdout}")
+                            nginx_note = f"\nNginx: Robust mapping active, found {result.stdout.count('Found:')} containers"
                         else:
-                            _logger.warning(f"Proxy config generation warning: {result.stderr}")
-                    except Exception as proxy_error:
-                        _logger.warning(f"Proxy config generation failed: {proxy_error}")
+                            _logger.warning(f"Robust mapping generation warning: {result.stderr}")
+                            nginx_note = "\nNginx: Robust mapping attempted (check logs)"
+                    except Exception as nginx_error:
+                        # Don't fail approval just because nginx failed
+                        _logger.error(f"❌ Robust nginx map generation failed: {nginx_error}", exc_info=True)
+                        nginx_note = "\nNginx: Manual robust config may be needed"
+                    for record in created:
+                        notes[record].append(nginx_note)
 
-                    # Wait for container to be fully ready and then reset admin password
-                    import time
-                    _logger.info(f"Waiting for container {container_name} to be ready...")
-                    time.sleep(10)  # Give container time to start
+                # Generate tenant proxy configurations for reverse proxy
+                try:
+                    _logger.info(f"Generating tenant proxy configurations...")
+                    result = subprocess.run(
+                        ['python3', '/opt/odoo19/scripts/generate_tenant_proxy_configs.py'],
+                        capture_output=True,
+                        text=True,
+                        timeout=10
+                    )
+                    if result.returncode == 0:
+                        _logger.info(f"✅ Tenant proxy configs generated: {result.stdout}")
+                        for record in succeeded:
+                            notes[record].append(f"\nReverse Proxy: {record.subdomain}.avodahconsult.info configured")
+                    else:
+                        _logger.warning(f"Proxy config generation warning: {result.stderr}")
+                except Exception as proxy_error:
+                    _logger.warning(f"Proxy config generation failed: {proxy_error}")
 
-                    # Reset admin password to ensure proper authentication
-                    try:
-                        record._reset_admin_password()
-                        record.notes = f"{record.notes}\n✅ Admin password reset for immediate login"
-                    except Exception as pwd_error:
-                        _logger.warning(f"Password reset failed for {record.subdomain}: {pwd_error}")
-                        record.notes = f"{record.notes}\n⚠️ Password reset failed - admin may need to reset manually"
+            # Wait until each container actually answers before touching its database
+            _logger.info(f"Waiting for {len(succeeded)} container(s) to be ready...")
+            ready = succeeded._wait_ready()
+
+            # Reset admin password to ensure proper authentication
+            for record in ready:
+                try:
+                    record._reset_admin_password()
+                    notes[record].append("\n✅ Admin password reset for immediate login")
+                except Exception as pwd_error:
+                    _logger.warning(f"Password reset failed for {record.subdomain}: {pwd_error}")
+                    notes[record].append("\n⚠️ Password reset failed - admin may need to reset manually")
+            for record in succeeded - ready:
+                notes[record].append("\n⚠️ Container not ready before the readiness deadline - reset the admin password once it is up")
 
-                    record.state = 'active'
+            # Tenants that never became ready stay approved
+            ready.write({'state': 'active'})
 
-                except Exception as e:
-                    _logger.error(f"Error creating/starting container for {record.subdomain}: {e}", exc_info=True)
-                    record.notes = f"{record.notes or ''}\n\nApproval error: {str(e)}\nPlease contact system administrator."
-        
-        return True
+        for record, lines in notes.items():
+            if lines:
+                record.notes = (record.notes or '') + ''.join(lines)
+
+        return self._bulk_result_notification(_("Approve Tenants"), errors)
+
+    def _wait_ready(self):
+        """Probe tenant containers concurrently; returns the ready records and stores readiness"""
+        config = self.env['saas.configuration'].sudo().get_config()
+        deadline = config.readiness_timeout or readiness.DEFAULT_DEADLINE
+        endpoints = {
+            record.id: readiness.tenant_endpoints(
+                record.container_name or f"odoo_tenant_{record.subdomain}", record.port,
+                mode=config.readiness_probe or 'http',
+            )
+            for record in self
+        }
+        self.write({'readiness_state': 'starting', 'ready_date': False})
+        results = get_runtime().fan_out(
+            lambda record_id: readiness.wait_until_ready(endpoints[record_id], deadline=deadline), self.ids
+        )
+
+        ready = self.browse()
+        for record in self:
+            waited, error = results[record.id]
+            if waited is None:
+                _logger.warning(f"Tenant {record.subdomain} not ready after {deadline}s: {error or 'timeout'}")
+            else:
+                _logger.info(f"✅ Tenant {record.subdomain} ready after {waited:.1f}s")
+                ready |= record
+        ready.write({'readiness_state': 'ready', 'ready_date': fields.Datetime.now()})
+        (self - ready).write({'readiness_state': 'timeout'})
+        return ready
+
+    def _fan_out_containers(self, operation):
+        """Run a runtime operation (e.g. 'stop', 'start') on every tenant container concurrently.
+
+        Returns {record: error or None}.
+        """
+        runtime = get_runtime()
+        names = {record: record.container_name or f"odoo_tenant_{record.subdomain}" for record in self}
+        results = runtime.fan_out(getattr(runtime, operation), set(names.values()))
+        return {record: results[name][1] for record, name in names.items()}
+
+    def _bulk_result_notification(self, title, errors):
+        """Notification summarising a bulk action from {record: error or None}"""
+        failed = {record: error for record, error in errors.items() if error}
+        skipped = len(self) - len(errors)
+        message = _("%(done)s succeeded, %(failed)s failed, %(skipped)s skipped",
+                    done=len(errors) - len(failed), failed=len(failed), skipped=skipped)
+        if failed:
+            message += "\n" + "\n".join(f"{record.subdomain}: {error}" for record, error in failed.items())
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': title,
+                'message': message,
+                'type': 'warning' if failed else 'success',
+                'sticky': bool(failed),
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            }
+        }
 
     def _reset_admin_password(self):
         """Internal method to reset admin password with proper hashing"""
-        import psycopg2
         from passlib.context import CryptContext
 
         try:
@@ -456,73 +671,52 @@ class SaasClient(models.Model):
             hashed_password = pwd_context.hash(self.admin_password)
 
             # Connect to tenant database
-            db_host = 'db'
-            db_port = 5432
-            db_user = 'odoo'
-            db_password = '248413'
-
-            tenant_conn = psycopg2.connect(
-                host=db_host, port=db_port, database=self.database_name,
-                user=db_user, password=db_password
-            )
-            tenant_conn.autocommit = True
-            tenant_cursor = tenant_conn.cursor()
-
-            # Find the admin user (could be id=2 or login='admin')
-            tenant_cursor.execute(
-                "SELECT id, partner_id FROM res_users WHERE login IN ('admin', 'admin@example.com') OR id = 2 LIMIT 1"
-            )
-            admin_result = tenant_cursor.fetchone()
-
-            if admin_result:
-                admin_user_id, admin_partner_id = admin_result
-
-                # Update admin user login and password
+            with get_connection_manager().cursor(self.database_name) as tenant_cursor:
+                # Find the admin user (could be id=2 or login='admin')
                 tenant_cursor.execute(
-                    "UPDATE res_users SET login=%s, password=%s WHERE id=%s",
-                    (self.admin_email, hashed_password, admin_user_id)
+                    "SELECT id, partner_id FROM res_users WHERE login IN ('admin', 'admin@example.com') OR id = 2 LIMIT 1"
                 )
+                admin_result = tenant_cursor.fetchone()
 
-                # Update partner information
-                tenant_cursor.execute(
-                    "UPDATE res_partner SET name=%s, email=%s WHERE id=%s",
-                    (self.admin_name, self.admin_email, admin_partner_id)
-                )
+                if admin_result:
+                    admin_user_id, admin_partner_id = admin_result
 
-                _logger.info(f"✅ Admin password reset for {self.subdomain}: {self.admin_email}")
-            else:
-                _logger.warning(f"⚠️ No admin user found in database {self.database_name}")
+                    # Update admin user login and password
+                    tenant_cursor.execute(
+                        "UPDATE res_users SET login=%s, password=%s WHERE id=%s",
+                        (self.admin_email, hashed_password, admin_user_id)
+                    )
 
-            tenant_cursor.close()
-            tenant_conn.close()
+                    # Update partner information
+                    tenant_cursor.execute(
+                        "UPDATE res_partner SET name=%s, email=%s WHERE id=%s",
+                        (self.admin_name, self.admin_email, admin_partner_id)
+                    )
+
+                    _logger.info(f"✅ Admin password reset for {self.subdomain}: {self.admin_email}")
+                else:
+                    _logger.warning(f"⚠️ No admin user found in database {self.database_name}")
 
         except Exception as e:
             _logger.error(f"❌ Failed to reset admin password for {self.subdomain}: {e}")
             raise
 
     def action_reject(self):
-        """Reject pending tenant and stop/remove container"""
-        for record in self:
-            if record.state == 'pending':
-                record.write({'state': 'rejected'})
-                
-                # Remove Nginx config
-                try:
-                    record._remove_nginx_config()
-                except Exception as e:
-                    _logger.warning(f"Failed to remove Nginx config: {e}")
-                
-                # Stop and remove the container
-                try:
-                    import docker
-                    client = docker.from_env()
-                    container_name = f"odoo_tenant_{record.subdomain}"
-                    container = client.containers.get(container_name)
-                    container.stop()
-                    container.remove()
-                    record.notes = f"{record.notes}\nRejection: Container and Nginx config removed"
-                except Exception as e:
-                    record.notes = f"{record.notes}\nRejection note: {str(e)}"
+        """Reject pending tenants: release their ports and take them off the shared waiting page"""
+        pending = self.filtered(lambda r: r.state == 'pending')
+        if not pending:
+            return True
+        # Pending tenants have no container of their own; clearing the port releases it (see write)
+        pending.write({'state': 'rejected', 'port': False})
+        for record in pending:
+            try:
+                record._remove_nginx_config()
+            except Exception as e:
+                _logger.warning(f"Failed to remove Nginx config: {e}")
+        try:
+            self._sync_waiting_responder()
+        except Exception as e:
+            _logger.warning(f"Could not update waiting page responder: {e}")
         return True
     
     def action_reset_password(self):
@@ -562,38 +756,30 @@ class SaasClient(models.Model):
         return True
     
     def action_suspend(self):
-        """Suspend active tenant (stops container but keeps Nginx config)"""
-        for record in self:
-            if record.state in ['active', 'approved']:
-                record.write({'state': 'suspended'})
-                try:
-                    import docker
-                    client = docker.from_env()
-                    container_name = record.container_name or f"odoo_tenant_{record.subdomain}"
-                    container = client.containers.get(container_name)
-                    container.stop()
-                    _logger.info(f"Suspended tenant: {record.subdomain}")
-                except Exception as e:
-                    _logger.error(f"Suspension error: {e}")
-                    record.notes = f"{record.notes}\nSuspension error: {str(e)}"
-        return True
+        """Suspend active tenants (stops containers but keeps Nginx config)"""
+        targets = self.filtered(lambda r: r.state in ['active', 'approved'])
+        targets.write({'state': 'suspended'})
+        errors = targets._fan_out_containers('stop')
+        for record, error in errors.items():
+            if error:
+                _logger.error(f"Suspension error for {record.subdomain}: {error}")
+                record.notes = f"{record.notes}\nSuspension error: {str(error)}"
+            else:
+                _logger.info(f"Suspended tenant: {record.subdomain}")
+        return self._bulk_result_notification(_("Suspend Tenants"), errors)
     
     def action_activate(self):
-        """Activate suspended tenant (restarts container)"""
-        for record in self:
-            if record.state == 'suspended':
-                record.write({'state': 'active'})
-                try:
-                    import docker
-                    client = docker.from_env()
-                    container_name = record.container_name or f"odoo_tenant_{record.subdomain}"
-                    container = client.containers.get(container_name)
-                    container.start()
-                    _logger.info(f"Reactivated tenant: {record.subdomain}")
-                except Exception as e:
-                    _logger.error(f"Activation error: {e}")
-                    record.notes = f"{record.notes}\nActivation error: {str(e)}"
-        return True
+        """Activate suspended tenants (restarts containers)"""
+        targets = self.filtered(lambda r: r.state == 'suspended')
+        targets.write({'state': 'active', 'hibernated': False, 'hibernated_date': False})
+        errors = targets._fan_out_containers('start')
+        for record, error in errors.items():
+            if error:
+                _logger.error(f"Activation error for {record.subdomain}: {error}")
+                record.notes = f"{record.notes}\nActivation error: {str(error)}"
+            else:
+                _logger.info(f"Reactivated tenant: {record.subdomain}")
+        return self._bulk_result_notification(_("Activate Tenants"), errors)
     
     def action_delete_tenant(self):
         """Completely delete tenant - container, database, Nginx config"""
@@ -602,29 +788,25 @@ class SaasClient(models.Model):
         from odoo.exceptions import UserError
         
         try:
-            import docker
-            import psycopg2
-            from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+            from psycopg2 import sql
             
-            docker_client = docker.from_env()
+            runtime = get_runtime()
             container_name = self.container_name or f"odoo_tenant_{self.subdomain}"
             
             # Stop and remove container
             try:
-                container = docker_client.containers.get(container_name)
-                container.stop(timeout=10)
-                container.remove()
+                runtime.stop(container_name, timeout=10)
+                runtime.remove(container_name)
                 _logger.info(f"✅ Removed container: {container_name}")
-            except docker.errors.NotFound:
+            except ContainerNotFound:
                 _logger.warning(f"Container not found: {container_name}")
             
             # Remove Docker volumes
-            volume_name = f"odoo_tenant_{self.subdomain}_data"
+            volume_name = self.volume_name or f"odoo_tenant_{self.subdomain}_data"
             try:
-                volume = docker_client.volumes.get(volume_name)
-                volume.remove()
+                runtime.remove_volume(volume_name)
                 _logger.info(f"✅ Removed volume: {volume_name}")
-            except docker.errors.NotFound:
+            except ContainerNotFound:
                 pass
             
             # Remove Nginx config
@@ -633,27 +815,18 @@ class SaasClient(models.Model):
             # Drop database
             if self.database_name:
                 try:
-                    conn = psycopg2.connect(
-                        host='localhost',
-                        port=5432,
-                        user='odoo',
-                        password='odoo',
-                        database='postgres'
-                    )
-                    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-                    cursor = conn.cursor()
-                    
-                    # Terminate connections
-                    cursor.execute(f"""
-                        SELECT pg_terminate_backend(pid) 
-                        FROM pg_stat_activity 
-                        WHERE datname = '{self.database_name}' AND pid <> pg_backend_pid()
-                    """)
-                    
-                    # Drop database
-                    cursor.execute(f'DROP DATABASE IF EXISTS "{self.database_name}"')
-                    cursor.close()
-                    conn.close()
+                    pool = get_connection_manager()
+                    pool.close_database(self.database_name)
+                    with pool.cursor() as cursor:
+                        # Terminate connections
+                        cursor.execute("""
+                            SELECT pg_terminate_backend(pid) 
+                            FROM pg_stat_activity 
+                            WHERE datname = %s AND pid <> pg_backend_pid()
+                        """, (self.database_name,))
+                        
+                        # Drop database
+                        cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(self.database_name)))
                     
                     _logger.info(f"✅ Dropped database: {self.database_name}")
                 except Exception as db_error:
@@ -677,23 +850,14 @@ class SaasClient(models.Model):
         try:
             # Import necessary modules
             import subprocess
-            import psycopg2
-            from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-
-            # Connect to PostgreSQL server (not a specific database)
-            conn = psycopg2.connect(
-                host='localhost',
-                port=5432,
-                user='odoo',
-                password='odoo'
-            )
-            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-            cursor = conn.cursor()
+            from psycopg2 import sql
+
+            pool = get_connection_manager()
+            db_params = get_db_params()
 
             # Create the new database
-            cursor.execute(f"CREATE DATABASE {client.database_name}")
-            cursor.close()
-            conn.close()
+            with pool.cursor() as cursor:
+                cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(client.database_name)))
 
             # Initialize the new database with Odoo schema
             subprocess.run([
@@ -701,41 +865,30 @@ class SaasClient(models.Model):
                 '-d', client.database_name,
                 '--init=base',
                 '--stop-after-init',
-                '--db_host=localhost',
-                '--db_port=5432',
-                '--db_user=odoo',
-                '--db_password=odoo'
+                f"--db_host={db_params['host']}",
+                f"--db_port={db_params['port']}",
+                f"--db_user={db_params['user']}",
+                f"--db_password={db_params['password']}"
             ], capture_output=True, check=True)
 
             # Connect to the new database and create admin user
-            new_conn = psycopg2.connect(
-                host='localhost',
-                port=5432,
-                user='odoo',
-                password='odoo',
-                database=client.database_name
-            )
-            new_cursor = new_conn.cursor()
-
-            # Update admin user credentials
-            new_cursor.execute("""
-                UPDATE res_users
-                SET login = %s,
-                    password = crypt(%s, password),
-                    email = %s,
-                    name = %s
-                WHERE login = 'admin'
-            """, (client.admin_email, client.admin_password, client.admin_email, client.admin_name))
-
-            # Update company information
-            new_cursor.execute("""
-                UPDATE res_company
-                SET name = %s
-                WHERE id = 1
-            """, (client.company_name,))
-
-            new_cursor.close()
-            new_conn.close()
+            with pool.cursor(client.database_name, autocommit=False) as new_cursor:
+                # Update admin user credentials
+                new_cursor.execute("""
+                    UPDATE res_users
+                    SET login = %s,
+                        password = crypt(%s, password),
+                        email = %s,
+                        name = %s
+                    WHERE login = 'admin'
+                """, (client.admin_email, client.admin_password, client.admin_email, client.admin_name))
+
+                # Update company information
+                new_cursor.execute("""
+                    UPDATE res_company
+                    SET name = %s
+                    WHERE id = 1
+                """, (client.company_name,))
 
             client.write({
                 'state': 'active',
@@ -758,7 +911,210 @@ class SaasClient(models.Model):
             ('state', '=', 'active')
         ])
         expired_clients.write({'state': 'suspended'})
-    
+
+    # ==================
+    # HIBERNATION (SCALE TO ZERO)
+    # ==================
+
+    def _refresh_last_seen(self):
+        """Update last_login from the activity markers of the routing hook (no tenant database access)"""
+        from ..utils.activity import get_activity_log
+        seen = get_activity_log().last_seen([sub for sub in self.mapped('subdomain') if sub])
+        for record in self:
+            latest = seen.get(record.subdomain)
+            if latest and (not record.last_login or latest > record.last_login):
+                record.last_login = latest
+
+    def _refresh_last_login(self):
+        """Update last_login from the tenant databases' login logs (one connection per tenant)"""
+        databases = {db for db in self.mapped('database_name') if db}
+        logins = get_runtime().fan_out(_last_tenant_login, databases)
+        for record in self:
+            login, error = logins.get(record.database_name, (None, None))
+            if error:
+                _logger.warning(f"Could not read login log of {record.database_name}: {error}")
+            elif login and (not record.last_login or login > record.last_login):
+                record.last_login = login
+
+    def _filter_idle(self):
+        """Tenants without activity for longer than their plan's idle_hibernate_hours"""
+        now = fields.Datetime.now()
+        return self.filtered(
+            lambda r: (r.last_login or r.approved_date or r.create_date)
+            < now - timedelta(hours=r.subscription_id.idle_hibernate_hours)
+        )
+
+    @api.model
+    def _cron_hibernate_idle(self):
+        """Cron: stop active tenants idle for longer than their plan allows (dynamic routing only)"""
+        config = self.env['saas.configuration'].sudo().get_config()
+        if config.nginx_routing_mode != 'dynamic':
+            # Only the dynamic routing hook sees every request; elsewhere a long session would look idle
+            return True
+        running = self.search([
+            ('state', '=', 'active'),
+            ('hibernated', '=', False),
+            ('subscription_id.idle_hibernate_hours', '>', 0),
+        ])
+        running._refresh_last_seen()
+        # Tenant databases are only asked about tenants already idle by their traffic
+        idle = running._filter_idle()
+        idle._refresh_last_login()
+        idle = idle._filter_idle()
+        if idle:
+            idle._hibernate()
+        return True
+
+    def _hibernate(self):
+        """Stop tenant containers; the shared responder or nginx sends the next visitor to /saas/wake"""
+        errors = self._fan_out_containers('stop')
+        stopped = self.browse([record.id for record, error in errors.items() if not error])
+        for record, error in errors.items():
+            if error:
+                _logger.warning(f"Could not hibernate {record.subdomain}: {error}")
+        stopped.write({
+            'hibernated': True,
+            'hibernated_date': fields.Datetime.now(),
+            'readiness_state': 'unknown',
+            'ready_date': False,
+        })
+        for record in stopped:
+            _logger.info(f"💤 Hibernated idle tenant: {record.subdomain}")
+        if stopped:
+            try:
+                self._sync_waiting_responder()
+            except Exception as e:
+                _logger.warning(f"Could not update waiting page responder: {e}")
+        return stopped
+
+    def _request_wake(self):
+        """Schedule the start of a hibernated tenant for the wake cron; True if this call scheduled it.
+
+        One conditional update: however many visitors (and workers) hit a sleeping tenant,
+        its wake is scheduled at most once per WAKE_DEDUP_SECONDS.
+        """
+        self.ensure_one()
+        self.env.cr.execute("""
+            UPDATE saas_client
+               SET wake_requested_date = now() at time zone 'UTC'
+             WHERE id = %s AND state = 'active' AND hibernated
+               AND (wake_requested_date IS NULL
+                    OR wake_requested_date < (now() at time zone 'UTC') - %s * interval '1 second')
+         RETURNING id
+        """, (self.id, WAKE_DEDUP_SECONDS))
+        scheduled = bool(self.env.cr.fetchone())
+        self.invalidate_recordset(['wake_requested_date'])
+        if scheduled:
+            self.env.ref('saas_signup.ir_cron_wake_tenants')._trigger()
+        return scheduled
+
+    @api.model
+    def _cron_wake_requested(self):
+        """Start the hibernated tenants visitors asked for (see /saas/wake)"""
+        for client in self.search([('wake_requested_date', '!=', False)]):
+            try:
+                client._wake(wait=False)
+            except Exception as e:
+                # _wake hibernated it again, the next visit schedules a new attempt
+                _logger.error(f"Could not wake tenant {client.subdomain}: {e}")
+                self.env.cr.rollback()
+            client.wake_requested_date = False
+            self.env.cr.commit()
+        return True
+
+    def _wake(self, wait=True):
+        """Start a hibernated tenant; with ``wait``, True once it answers (else once it is started).
+
+        The state change is committed before the container starts, so the row lock is
+        only held while deciding who wakes the tenant, not during the readiness wait.
+        """
+        self.ensure_one()
+        self.env.cr.execute("SELECT id FROM saas_client WHERE id = %s FOR UPDATE", (self.id,))
+        self.invalidate_recordset(['hibernated', 'state'])
+        if self.state != 'active':
+            return False
+        waking = self.hibernated
+        if waking:
+            self.write({'hibernated': False, 'hibernated_date': False, 'last_login': fields.Datetime.now()})
+        self.env.cr.commit()
+
+        container_name = self.container_name or f"odoo_tenant_{self.subdomain}"
+        if not waking and not wait:
+            return True
+        if not waking:
+            # Woken by a concurrent request: only wait for the tenant to answer, leave the row alone
+            config = self.env['saas.configuration'].sudo().get_config()
+            endpoints = readiness.tenant_endpoints(container_name, self.port, mode=config.readiness_probe or 'http')
+            waited = readiness.wait_until_ready(endpoints, deadline=config.readiness_timeout or readiness.DEFAULT_DEADLINE)
+            return waited is not None
+
+        _logger.info(f"⏰ Waking tenant: {self.subdomain}")
+        try:
+            # Release the port on the shared responder before the tenant container binds it again
+            self._sync_waiting_responder()
+            get_runtime().start(container_name)
+        except Exception:
+            # Still stopped: hibernate again so the next request retries the wake
+            self.env.cr.rollback()
+            self.write({'hibernated': True, 'hibernated_date': fields.Datetime.now()})
+            self.env.cr.commit()
+            try:
+                self._sync_waiting_responder()
+            except Exception as e:
+                _logger.warning(f"Could not update waiting page responder: {e}")
+            raise
+        return bool(self._wait_ready()) if wait else True
+
+    # ==================
+    # AGGREGATES
+    # ==================
+
+    @api.model
+    def _get_state_aggregates(self):
+        """Client counts by state, plan, trial flag and trial expiry bucket in one query.
+
+        Returns ``{'total', 'stale_approved', 'by_state': {state: n}, 'by_plan': {plan_id: {state: n}},
+        'by_trial': {bool: {state: n}}, 'by_expiry': {bucket: {state: n}}}`` where buckets are
+        ``expired``, ``week`` (within 7 days), ``month`` (within 30 days), ``later`` and ``none``.
+        """
+        self.flush_model(['state', 'subscription_id', 'is_trial', 'trial_end_date', 'create_date'])
+        today = fields.Date.context_today(self)
+        self.env.cr.execute("""
+            SELECT GROUPING(subscription_id, is_trial, expiry, state) AS grouping_set,
+                   subscription_id, is_trial, expiry, state,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE state = 'approved' AND create_date < %(stale)s) AS stale_approved
+              FROM (
+                SELECT state, subscription_id, COALESCE(is_trial, false) AS is_trial, create_date,
+                       CASE WHEN trial_end_date IS NULL THEN 'none'
+                            WHEN trial_end_date < %(today)s THEN 'expired'
+                            WHEN trial_end_date <= %(week)s THEN 'week'
+                            WHEN trial_end_date <= %(month)s THEN 'month'
+                            ELSE 'later' END AS expiry
+                  FROM saas_client
+              ) c
+             GROUP BY GROUPING SETS ((), (state), (subscription_id, state), (is_trial, state), (expiry, state))
+        """, {
+            'today': today,
+            'week': fields.Date.add(today, days=7),
+            'month': fields.Date.add(today, days=30),
+            'stale': fields.Datetime.subtract(fields.Datetime.now(), hours=24),
+        })
+
+        result = {'total': 0, 'stale_approved': 0, 'by_state': {}, 'by_plan': {}, 'by_trial': {}, 'by_expiry': {}}
+        # GROUPING() sets a bit for every column aggregated away (first column = highest bit)
+        groups = {0b0110: ('by_plan', 1), 0b1010: ('by_trial', 2), 0b1100: ('by_expiry', 3)}
+        for row in self.env.cr.fetchall():
+            grouping_set, state, count = row[0], row[4], row[5]
+            if grouping_set == 0b1111:
+                result['total'], result['stale_approved'] = count, row[6]
+            elif grouping_set == 0b1110:
+                result['by_state'][state] = count
+            elif grouping_set in groups:
+                key, column = groups[grouping_set]
+                result[key].setdefault(row[column], {})[state] = count
+        return result
+
     # ==================
     # MULTI-TENANCY HELPERS
     # ==================
@@ -770,21 +1126,9 @@ class SaasClient(models.Model):
             return 0
         
         try:
-            conn = psycopg2.connect(
-                host=self.env['ir.config_parameter'].sudo().get_param('db_host', 'localhost'),
-                port=int(self.env['ir.config_parameter'].sudo().get_param('db_port', 5432)),
-                database='postgres',
-                user=self.env['ir.config_parameter'].sudo().get_param('db_user', 'odoo'),
-                password=self.env['ir.config_parameter'].sudo().get_param('db_password', 'odoo')
-            )
-            conn.autocommit = True
-            cur = conn.cursor()
-            
-            cur.execute("SELECT pg_database_size(%s) / (1024 * 1024)", (self.database_name,))
-            result = cur.fetchone()
-            
-            cur.close()
-            conn.close()
+            with get_connection_manager().cursor() as cur:
+                cur.execute("SELECT pg_database_size(%s) / (1024 * 1024)", (self.database_name,))
+                result = cur.fetchone()
             
             return round(result[0], 2) if result else 0
         except Exception as e:
@@ -794,19 +1138,7 @@ class SaasClient(models.Model):
     def get_tenant_url(self):
         """Get the full URL for accessing this tenant"""
         self.ensure_one()
-        config = self.env['saas.configuration'].sudo().get_config()
-        
-        if config.deployment_mode == 'subdomain':
-            protocol = 'https' if config.use_ssl else 'http'
-            # For subdomain mode, always show subdomain.domain format
-            # For production with nginx: subdomain.yourdomain.com (no port)
-            # For local testing: subdomain.localhost:port
-            if config.main_domain == 'localhost':
-                return f"{protocol}://{self.subdomain}.{config.main_domain}:{self.port}"
-            else:
-                return f"{protocol}://{self.subdomain}.{config.main_domain}"
-        else:
-            return f"http://localhost:{self.port}"
+        return self.tenant_url
     
     def action_open_tenant(self):
         """Open tenant URL in browser"""
@@ -822,31 +1154,22 @@ class SaasClient(models.Model):
         self.ensure_one()
         
         try:
-            import psycopg2
-            from odoo.tools import config
-            
-            conn = psycopg2.connect(
-                host=config.get('db_host', 'localhost'),
-                port=config.get('db_port', 5432),
-                database='postgres',
-                user=config.get('db_user', 'odoo'),
-                password=config.get('db_password', 'odoo')
-            )
-            conn.autocommit = True
-            cur = conn.cursor()
-            
-            # Terminate connections to template
-            cur.execute(f"""
-                SELECT pg_terminate_backend(pid) 
-                FROM pg_stat_activity 
-                WHERE datname = '{template_db}' AND pid <> pg_backend_pid()
-            """)
-            
-            # Create database from template (much faster than fresh install)
-            cur.execute(f'CREATE DATABASE "{self.database_name}" WITH TEMPLATE "{template_db}"')
+            from psycopg2 import sql
             
-            cur.close()
-            conn.close()
+            pool = get_connection_manager()
+            pool.close_database(template_db)
+            with pool.cursor() as cur:
+                # Terminate connections to template
+                cur.execute("""
+                    SELECT pg_terminate_backend(pid) 
+                    FROM pg_stat_activity 
+                    WHERE datname = %s AND pid <> pg_backend_pid()
+                """, (template_db,))
+                
+                # Create database from template (much faster than fresh install)
+                cur.execute(sql.SQL("CREATE DATABASE {} WITH TEMPLATE {}").format(
+                    sql.Identifier(self.database_name), sql.Identifier(template_db)
+                ))
             
             _logger.info(f"Created {self.database_name} from template {template_db}")
             return True
@@ -854,4 +1177,33 @@ class SaasClient(models.Model):
         except Exception as e:
             _logger.error(f"Template duplication failed: {e}")
             return False
-        return expired_clients
\ No newline at end of file
+
+
+def _start_tenant_container(runtime, spec):
+    """Replace the waiting page with the tenant container; returns the new container id, if any"""
+    try:
+        runtime.remove(spec['waiting_container_name'], force=True)
+        _logger.info(f"Waiting page container removed for {spec['subdomain']}")
+    except ContainerNotFound:
+        pass
+    except Exception as e:
+        _logger.warning(f"Error removing waiting container: {e}")
+
+    try:
+        container = runtime.get(spec['container_name'])
+        _logger.info(f"Container {spec['container_name']} already exists, starting...")
+        if container.status != 'running':
+            runtime.start(spec['container_name'])
+        return None
+    except ContainerNotFound:
+        _logger.info(f"Creating container {spec['container_name']}...")
+        container = runtime.run(**spec['kwargs'])
+        _logger.info(f"Container created and started: {container.id[:12]}")
+        return container.id
+
+
+def _last_tenant_login(database_name):
+    """Most recent login recorded in a tenant database (naive UTC), or None"""
+    with get_connection_manager().cursor(database_name) as cur:
+        cur.execute("SELECT max(create_date) FROM res_users_log")
+        return cur.fetchone()[0]
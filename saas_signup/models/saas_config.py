@@ -1,11 +1,24 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from types import MappingProxyType
+import functools
 import logging
+import secrets
+import socket
 
 _logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=1)
+def _resolve_host_ip():
+    """Address of this host, resolved once per process (False when resolution fails)"""
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return False
+
+
 class SaasConfiguration(models.Model):
     _name = 'saas.configuration'
     _description = 'SaaS Configuration'
@@ -24,22 +37,80 @@ class SaasConfiguration(models.Model):
     base_url = fields.Char(string='Base URL', compute='_compute_base_url', store=True,
                            help='Full base URL for the SaaS platform')
     
+    host_ip = fields.Char(string='Detected Host IP', readonly=True,
+                          help='Address this server resolves to, detected on install and when the domain or mode changes')
+    
     starting_port = fields.Integer(string='Starting Port', default=8001,
                                    help='Starting port for localhost deployments')
     
+    ending_port = fields.Integer(string='Ending Port', default=8999,
+                                 help='Last port of the tenant port range')
+    
     use_ssl = fields.Boolean(string='Use SSL/HTTPS', default=False,
                             help='Enable if using HTTPS for subdomain deployments')
     
     nginx_config_path = fields.Char(string='Nginx Config Path',
                                     default='/etc/nginx/sites-enabled/',
                                     help='Path where nginx config files should be created')
+    nginx_routing_mode = fields.Selection([
+        ('server_blocks', 'Server Block per Tenant'),
+        ('map', 'Single Map File'),
+        ('dynamic', 'Dynamic Lookup (no reload)'),
+    ], string='Nginx Routing', default='server_blocks',
+        help='Map: one generated host map plus a shared server block, so nginx parse time '
+             'does not grow with the number of tenants. Dynamic: nginx asks Odoo for each '
+             "host's backend, so routing changes never touch nginx config")
+    routing_lookup_url = fields.Char(string='Routing Lookup URL', default='http://127.0.0.1:8069',
+                                     help='Odoo address nginx queries for tenant backends in dynamic routing mode')
+    routing_secret = fields.Char(string='Routing Lookup Secret', copy=False, groups='base.group_system',
+                                 default=lambda self: secrets.token_urlsafe(32),
+                                 help='Sent by nginx with every backend lookup; /saas/route refuses requests without it')
+    nginx_container = fields.Char(string='Nginx Container',
+                                  help='Docker nginx container ID or name to reload; leave empty to auto-discover')
+    nginx_reload_window = fields.Float(string='Nginx Reload Window (s)', default=2.0,
+                                       help='Config changes within this window share one nginx test and reload. 0 reloads immediately')
     
     docker_network = fields.Char(string='Docker Network', 
                                  default='odoo19_odoo-network',
                                  help='Docker network name for tenant containers')
     
+    odoo_image = fields.Char(string='Odoo Image', default='odoo:19',
+                             help='Docker image used for tenant containers and plan templates')
+    
+    provision_workers = fields.Integer(string='Provisioning Workers', default=2,
+                                       help='Maximum number of tenants provisioned concurrently')
+    
+    readiness_probe = fields.Selection([
+        ('http', 'HTTP /web/health'),
+        ('tcp', 'TCP connect'),
+    ], string='Readiness Probe', default='http',
+        help='How a started tenant container is detected as ready')
+    readiness_timeout = fields.Integer(string='Readiness Timeout (s)', default=120,
+                                       help='Maximum time to wait for a tenant container to become ready')
+    
+    # Usage time series retention (monthly roll-ups are kept)
+    usage_hourly_retention_days = fields.Integer(string='Hourly Usage Retention (days)', default=14,
+                                                 help='Hourly usage samples older than this are deleted')
+    usage_daily_retention_days = fields.Integer(string='Daily Usage Retention (days)', default=400,
+                                                help='Daily usage roll-ups older than this are deleted')
+    
+    # Hot spare pool: pre-provisioned tenants claimed on signup
+    spare_pool_enabled = fields.Boolean(string='Enable Spare Pool', default=False,
+                                        help='Keep pre-provisioned tenants ready to be claimed on signup')
+    spare_pool_size = fields.Integer(string='Spares per Plan', default=2,
+                                     help='Default number of ready spares per plan (overridable per plan)')
+    spare_refill_rate = fields.Integer(string='Spares Built per Run', default=2,
+                                       help='Maximum spares the refiller builds on each run')
+    spare_pool_hits = fields.Integer(string='Pool Hits', readonly=True,
+                                     help='Signups served from a ready spare')
+    spare_pool_misses = fields.Integer(string='Pool Misses', readonly=True,
+                                       help='Signups that found no ready spare and were provisioned from scratch')
+    
     active = fields.Boolean(string='Active', default=True)
     
+    # Counters updated in SQL on every signup; not part of the cached snapshot
+    _SNAPSHOT_EXCLUDE = {'spare_pool_hits', 'spare_pool_misses'}
+    
     _sql_constraints = [
         ('single_config', 'CHECK(id = 1)', 'Only one configuration record is allowed!'),
     ]
@@ -56,11 +127,7 @@ class SaasConfiguration(models.Model):
     @api.model
     def get_config(self):
         """Get or create the SaaS configuration - prioritize active configs"""
-        # First try to get active configuration
-        config = self.search([('active', '=', True)], limit=1)
-        if not config:
-            # If no active config, try any config
-            config = self.search([], limit=1)
+        config = self.browse(self._get_config_id())
         if not config:
             # Create default if none exists
             config = self.create({
@@ -72,27 +139,47 @@ class SaasConfiguration(models.Model):
             _logger.info(f"Created SaaS configuration: Mode={config.deployment_mode}, Domain={config.main_domain}")
         return config
     
+    @api.model
+    @tools.ormcache()
+    def _get_config_id(self):
+        """Id of the configuration in use, cached until a configuration is created, written or deleted"""
+        Config = self.sudo().with_context(active_test=False)
+        # Prefer the active configuration, fall back to any
+        config = Config.search([('active', '=', True)], limit=1) or Config.search([], limit=1)
+        return config.id
+    
+    @api.model
+    @tools.ormcache()
+    def get_config_snapshot(self):
+        """Read-only mapping of the configuration values.
+
+        Plain values only, so it can be handed to worker threads that have no environment.
+        Cached until a configuration is created, written or deleted.
+        """
+        config = self.sudo().get_config()
+        names = [
+            name for name, field in self._fields.items()
+            if field.store and not field.relational and name not in self._SNAPSHOT_EXCLUDE
+        ]
+        return MappingProxyType(config.read(names)[0])
+    
     @api.model
     def init_default_config(self):
         """Initialize default configuration on module install"""
         if not self.search_count([]):
             _logger.info('Initializing default SaaS configuration...')
             # Auto-detect if we're on a remote server or localhost
-            import socket
-            try:
-                hostname = socket.gethostname()
-                ip_address = socket.gethostbyname(hostname)
-                # If we have a real IP (not localhost), use it
-                if ip_address and ip_address not in ['127.0.0.1', '::1']:
-                    main_domain = ip_address
-                else:
-                    main_domain = 'localhost'
-            except:
+            ip_address = _resolve_host_ip()
+            # If we have a real IP (not localhost), use it
+            if ip_address and ip_address not in ['127.0.0.1', '::1']:
+                main_domain = ip_address
+            else:
                 main_domain = 'localhost'
             
             config = self.create({
                 'deployment_mode': 'localhost',
                 'main_domain': main_domain,
+                'host_ip': ip_address,
                 'starting_port': 8001,
                 'use_ssl': False,
             })
@@ -100,31 +187,39 @@ class SaasConfiguration(models.Model):
             return config
         return self.search([], limit=1)
     
+    def _get_localhost_base(self):
+        """Host used in localhost-mode tenant URLs, from the cached host address (no DNS lookup)"""
+        self.ensure_one()
+        ip_address = self.host_ip or _resolve_host_ip()
+        if not ip_address:
+            return self.main_domain or 'localhost'
+        # Use the configured domain/IP when the server has a real IP (not localhost)
+        if ip_address != '127.0.0.1' and self.main_domain not in ['localhost', '127.0.0.1']:
+            return self.main_domain
+        return 'localhost'
+    
     def generate_tenant_url(self, subdomain, port=None):
         """Generate tenant URL based on deployment mode"""
         self.ensure_one()
         
         if self.deployment_mode == 'subdomain':
             protocol = 'https' if self.use_ssl else 'http'
+            # Without nginx in front (local testing) the tenant port stays in the URL
+            if self.main_domain == 'localhost':
+                return f"{protocol}://{subdomain}.{self.main_domain}:{port}"
             return f"{protocol}://{subdomain}.{self.main_domain}"
-        else:
-            # Localhost/IP mode - support both localhost and IP addresses
-            import socket
-            # Try to get the server's IP address
-            try:
-                # Get hostname
-                hostname = socket.gethostname()
-                # Get IP address
-                ip_address = socket.gethostbyname(hostname)
-                # Check if it's a real IP (not localhost)
-                if ip_address and ip_address != '127.0.0.1' and self.main_domain not in ['localhost', '127.0.0.1']:
-                    # Use the configured domain/IP
-                    base_host = self.main_domain
-                else:
-                    base_host = 'localhost'
-            except:
-                base_host = self.main_domain or 'localhost'
-            return f"http://{base_host}:{port}"
+        return f"http://{self._get_localhost_base()}:{port}"
+    
+    def generate_tenant_urls(self, clients):
+        """Tenant URLs for a whole recordset: {client_id: url}"""
+        self.ensure_one()
+        if self.deployment_mode == 'subdomain':
+            protocol = 'https' if self.use_ssl else 'http'
+            if self.main_domain == 'localhost':
+                return {c.id: f"{protocol}://{c.subdomain}.{self.main_domain}:{c.port}" for c in clients}
+            return {c.id: f"{protocol}://{c.subdomain}.{self.main_domain}" for c in clients}
+        base_host = self._get_localhost_base()
+        return {c.id: f"http://{base_host}:{c.port}" for c in clients}
     
     def get_next_available_port(self):
         """Get next available port for localhost deployment"""
@@ -133,11 +228,28 @@ class SaasConfiguration(models.Model):
         if self.deployment_mode != 'localhost':
             return None
         
-        # Get highest port from existing clients
-        Client = self.env['saas.client']
-        last_client = Client.search([], order='port desc', limit=1)
-        
-        if last_client and last_client.port:
-            return last_client.port + 1
-        else:
-            return self.starting_port
+        return self.env['saas.port.allocator'].sudo().next_free_port() or self.starting_port
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        configs = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return configs
+    
+    def write(self, vals):
+        if 'deployment_mode' in vals or 'main_domain' in vals:
+            # Re-detect the host address once, not on every URL
+            _resolve_host_ip.cache_clear()
+            vals = dict(vals, host_ip=_resolve_host_ip())
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        if 'starting_port' in vals or 'ending_port' in vals:
+            self.env['saas.port.allocator'].sudo()._sync_ports()
+        # Signup page shows the deployment mode and domain
+        self.env['saas.subscription']._bump_public_version()
+        return res
+    
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
@@ -2,11 +2,15 @@
 
 from odoo import models, api, fields
 import logging
-import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 from odoo.tools import config
 
+from ..utils.db_pool import get_connection_manager
+
 _logger = logging.getLogger(__name__)
 
+USER_COUNT_WORKERS = 8  # tenant databases queried concurrently for user counts
+
 
 class SaaSCron(models.Model):
     _name = 'saas.cron'
@@ -21,15 +25,42 @@ class SaaSCron(models.Model):
             ('state', '=', 'active'),
             ('database_name', '!=', False)
         ])
+        if not clients:
+            return
+        
+        # One query for every database size, user counts concurrently per tenant DB
+        database_names = clients.mapped('database_name')
+        sizes = self._get_database_sizes(database_names)
+        user_counts = self._get_user_counts(database_names)
         
+        # Store all measurements in one statement
+        self.env.cr.execute("""
+            UPDATE saas_client c
+               SET storage_used_mb = v.size_mb,
+                   user_count = COALESCE(v.users, c.user_count),
+                   usage_date = (now() at time zone 'UTC')
+              FROM unnest(%s::int[], %s::float8[], %s::int[]) AS v(id, size_mb, users)
+             WHERE c.id = v.id
+        """, (
+            clients.ids,
+            [sizes.get(c.database_name, 0.0) for c in clients],
+            [user_counts.get(c.database_name) for c in clients],
+        ))
+        clients.invalidate_recordset(['storage_used_mb', 'user_count', 'usage_date'])
+
+        # Append to the usage time series and refresh this month's roll-ups
+        Usage = self.env['saas.tenant.usage']
+        Usage._record_samples(
+            [(c.id, 'storage_mb', sizes.get(c.database_name)) for c in clients]
+            + [(c.id, 'users', user_counts.get(c.database_name)) for c in clients]
+        )
+        Usage._rollup()
+
+        over_limit = self.env['saas.client']
         for client in clients:
             try:
-                # Check database size
-                db_size_mb = self._get_database_size(client.database_name)
-                plan_limit_mb = (client.plan_id.storage_limit or 10) * 1024
-                
-                # Update stored value
-                client.storage_used_mb = db_size_mb
+                db_size_mb = sizes.get(client.database_name, 0.0)
+                plan_limit_mb = (client.subscription_id.storage_limit or 10) * 1024
                 
                 # 90% warning
                 if db_size_mb > plan_limit_mb * 0.9:
@@ -44,18 +75,21 @@ class SaaSCron(models.Model):
                     client.message_post(
                         body=f"🚫 Storage limit exceeded. Tenant suspended."
                     )
-                    client.action_suspend()
+                    over_limit |= client
                 
                 # Check user count
-                if client.database_name:
-                    user_count = self._get_user_count(client.database_name)
-                    if user_count > client.max_users:
-                        client.message_post(
-                            body=f"⚠️ User limit exceeded: {user_count} / {client.max_users} users"
-                        )
+                user_count = user_counts.get(client.database_name)
+                max_users = client.subscription_id.max_users
+                if user_count is not None and max_users and user_count > max_users:
+                    client.message_post(
+                        body=f"⚠️ User limit exceeded: {user_count} / {max_users} users"
+                    )
                 
             except Exception as e:
                 _logger.error(f"Error monitoring {client.subdomain}: {e}")
+        
+        if over_limit:
+            over_limit.action_suspend()
     
     @api.model
     def check_trial_expirations(self):
@@ -83,9 +117,10 @@ class SaaSCron(models.Model):
             ('trial_end_date', '=', fields.Date.today())
         ])
         
+        # Suspend in one batch so containers stop concurrently
+        expired.action_suspend()
         for client in expired:
             _logger.info(f"Trial expired for {client.subdomain}")
-            client.action_suspend()
             client.message_post(body="🚫 Trial expired - account suspended")
             self._send_trial_expired(client)
     
@@ -112,63 +147,51 @@ class SaaSCron(models.Model):
             except Exception as e:
                 _logger.error(f"Cleanup failed for {client.subdomain}: {e}")
     
-    def _get_database_size(self, database_name):
-        """Get database size in MB"""
+    def _get_database_sizes(self, database_names):
+        """Sizes in MB of the given databases, in a single query"""
         try:
-            conn = psycopg2.connect(
-                host=config.get('db_host', 'localhost'),
-                port=config.get('db_port', 5432),
-                database='postgres',
-                user=config.get('db_user', 'odoo'),
-                password=config.get('db_password', 'odoo')
-            )
-            conn.autocommit = True
-            cur = conn.cursor()
-            
-            cur.execute("""
-                SELECT pg_database_size(%s) / (1024 * 1024)
-            """, (database_name,))
-            
-            result = cur.fetchone()
-            cur.close()
-            conn.close()
-            
-            return result[0] if result else 0
+            with get_connection_manager().cursor() as cur:
+                cur.execute("""
+                    SELECT datname, pg_database_size(datname) / (1024.0 * 1024)
+                    FROM pg_database
+                    WHERE datname = ANY(%s)
+                """, (list(database_names),))
+                return {name: float(size) for name, size in cur.fetchall()}
         except Exception as e:
-            _logger.error(f"Failed to get DB size: {e}")
-            return 0
+            _logger.error(f"Failed to get DB sizes: {e}")
+            return {}
+    
+    def _get_user_counts(self, database_names):
+        """Active user count per tenant database, counted concurrently"""
+        workers = max(min(USER_COUNT_WORKERS, len(database_names)), 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='saas_user_count') as executor:
+            counts = executor.map(self._get_user_count, database_names)
+            return {name: count for name, count in zip(database_names, counts) if count is not None}
     
     def _get_user_count(self, database_name):
-        """Get active user count in tenant database"""
+        """Get active user count in tenant database (None when unreachable).
+
+        Runs outside the request thread: must not use the ORM.
+        """
         try:
-            conn = psycopg2.connect(
-                host=config.get('db_host', 'localhost'),
-                port=config.get('db_port', 5432),
-                database=database_name,
-                user=config.get('db_user', 'odoo'),
-                password=config.get('db_password', 'odoo')
-            )
-            cur = conn.cursor()
-            
-            cur.execute("""
-                SELECT COUNT(*) FROM res_users 
-                WHERE active = true AND id > 2
-            """)
-            
-            result = cur.fetchone()
-            cur.close()
-            conn.close()
+            with get_connection_manager().cursor(database_name) as cur:
+                cur.execute("""
+                    SELECT COUNT(*) FROM res_users 
+                    WHERE active = true AND id > 2
+                """)
+                result = cur.fetchone()
             
             return result[0] if result else 0
         except Exception as e:
-            _logger.error(f"Failed to get user count: {e}")
-            return 0
+            _logger.error(f"Failed to get user count for {database_name}: {e}")
+            return None
     
     def _delete_database(self, database_name):
         """Delete a database"""
         try:
             from odoo.service import db as db_service
             master_pwd = config.get('admin_passwd', 'admin')
+            get_connection_manager().close_database(database_name)
             db_service.exp_drop(master_pwd, database_name)
             _logger.info(f"Deleted database: {database_name}")
         except Exception as e:
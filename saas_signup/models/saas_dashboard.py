@@ -1,59 +1,134 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
-import psycopg2
-from odoo.tools import config
 import logging
+import time
+
+from ..utils.db_pool import get_connection_manager
 
 _logger = logging.getLogger(__name__)
 
+SNAPSHOT_MAX_AGE = 600  # seconds before a snapshot is reported stale and a refresh is queued
+
+
+class SaaSDashboardSnapshot(models.Model):
+    """Materialized dashboard payload, refreshed by cron"""
+    _name = 'saas.dashboard.snapshot'
+    _description = 'SaaS Dashboard Snapshot'
+    _order = 'computed_at desc, id desc'
+
+    data = fields.Json(string='Payload', readonly=True)
+    computed_at = fields.Datetime(string='Computed At', readonly=True)
+    duration_ms = fields.Float(string='Compute Time (ms)', readonly=True, digits=(16, 1))
+
+    @api.model
+    def _get_current(self):
+        return self.search([], limit=1)
+
 
 class SaaSDashboard(models.Model):
     _name = 'saas.dashboard'
     _description = 'SaaS Monitoring Dashboard'
     _auto = False  # No database table needed
     
-    @api.model
-    def get_dashboard_data(self):
-        """Get comprehensive dashboard metrics"""
+    # ==================
+    # SNAPSHOT
+    # ==================
+    
+    def _get_sections(self, aggregates=None):
+        """Dashboard sections and the callables computing them (sharing one aggregation pass)"""
         return {
-            'tenants': self._get_tenant_stats(),
-            'resources': self._get_resource_usage(),
-            'recent_signups': self._get_recent_signups(),
-            'revenue': self._get_revenue_stats(),
-            'alerts': self._get_system_alerts(),
-            'database_sizes': self._get_database_sizes(),
+            'tenants': lambda: self._get_tenant_stats(aggregates),
+            'resources': self._get_resource_usage,
+            'recent_signups': self._get_recent_signups,
+            'revenue': lambda: self._get_revenue_stats(aggregates),
+            'alerts': lambda: self._get_system_alerts(aggregates),
+            'database_sizes': self._get_database_sizes,
         }
     
-    def _get_tenant_stats(self):
-        """Get tenant statistics"""
-        Client = self.env['saas.client']
+    @api.model
+    def get_dashboard_data(self):
+        """Get comprehensive dashboard metrics from the last snapshot"""
+        snapshot = self.env['saas.dashboard.snapshot'].sudo()._get_current()
+        if not snapshot:
+            snapshot = self._refresh_snapshot()
+        
+        age = (fields.Datetime.now() - snapshot.computed_at).total_seconds()
+        if age > SNAPSHOT_MAX_AGE:
+            # Serve what we have; the cron recomputes in the background
+            cron = self.env.ref('saas_signup.ir_cron_refresh_dashboard', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+        
+        return dict(
+            snapshot.data or {},
+            db_pool=get_connection_manager().stats(),
+            snapshot={
+                'computed_at': fields.Datetime.to_string(snapshot.computed_at),
+                'age_seconds': round(age),
+                'duration_ms': snapshot.duration_ms,
+                'stale': age > SNAPSHOT_MAX_AGE,
+            },
+        )
+    
+    @api.model
+    def refresh_dashboard(self, sections=None):
+        """Recompute the given sections now (all when empty) and return the dashboard"""
+        self._refresh_snapshot(sections)
+        return self.get_dashboard_data()
+    
+    @api.model
+    def _refresh_snapshot(self, sections=None):
+        """Compute sections into the snapshot, keeping the others from the previous one"""
+        Snapshot = self.env['saas.dashboard.snapshot'].sudo()
+        snapshot = Snapshot._get_current()
+        started = time.monotonic()
+        available = self._get_sections(self.env['saas.client']._get_state_aggregates())
+        names = [name for name in (sections or available) if name in available]
+        if not snapshot:
+            names = list(available)
         
-        total = Client.search_count([])
-        active = Client.search_count([('state', '=', 'active')])
-        suspended = Client.search_count([('state', '=', 'suspended')])
-        pending = Client.search_count([('state', '=', 'pending')])
-        provisioning = Client.search_count([('state', '=', 'provisioning')])
+        data = dict(snapshot.data or {}) if snapshot else {}
+        for name in names:
+            data[name] = available[name]()
+        duration_ms = (time.monotonic() - started) * 1000
+        
+        values = {'data': data, 'computed_at': fields.Datetime.now(), 'duration_ms': duration_ms}
+        if snapshot:
+            snapshot.write(values)
+        else:
+            snapshot = Snapshot.create(values)
+        _logger.info(f"📊 Dashboard snapshot refreshed ({', '.join(names)}) in {duration_ms:.0f}ms")
+        return snapshot
+    
+    @api.model
+    def _cron_refresh_snapshot(self):
+        self._refresh_snapshot()
+        return True
+    
+    # ==================
+    # SECTIONS
+    # ==================
+    
+    def _get_tenant_stats(self, aggregates=None):
+        """Get tenant statistics"""
+        aggregates = aggregates or self.env['saas.client']._get_state_aggregates()
+        by_state = aggregates['by_state']
         
-        # Tenants by plan
-        self.env.cr.execute("""
-            SELECT 
-                COALESCE(s.name, 'No Plan') as plan_name,
-                COUNT(c.id) as count
-            FROM saas_client c
-            LEFT JOIN saas_subscription s ON c.plan_id = s.id
-            WHERE c.state = 'active'
-            GROUP BY s.name
-            ORDER BY count DESC
-        """)
-        by_plan = self.env.cr.dictfetchall()
+        # Active tenants by plan
+        plans = self.env['saas.subscription'].browse([plan_id for plan_id in aggregates['by_plan'] if plan_id])
+        names = {plan.id: plan.name for plan in plans}
+        by_plan = sorted((
+            {'plan_name': names.get(plan_id, 'No Plan'), 'count': states['active']}
+            for plan_id, states in aggregates['by_plan'].items() if states.get('active')
+        ), key=lambda row: row['count'], reverse=True)
         
         return {
-            'total': total,
-            'active': active,
-            'suspended': suspended,
-            'pending': pending,
-            'provisioning': provisioning,
+            'total': aggregates['total'],
+            'active': by_state.get('active', 0),
+            'suspended': by_state.get('suspended', 0),
+            'pending': by_state.get('pending', 0),
+            'provisioning': by_state.get('approved', 0),
             'by_plan': by_plan
         }
     
@@ -62,7 +137,8 @@ class SaaSDashboard(models.Model):
         try:
             import psutil
             
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # Non-blocking: utilisation since the previous call in this process
+            cpu_percent = psutil.cpu_percent(interval=None)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
             
@@ -91,51 +167,49 @@ class SaaSDashboard(models.Model):
         
         return [{
             'id': c.id,
-            'name': c.name,
+            'name': c.company_name,
             'subdomain': c.subdomain,
-            'plan': c.plan_id.name if c.plan_id else 'N/A',
+            'plan': c.subscription_id.name if c.subscription_id else 'N/A',
             'port': c.port if c.port else 'N/A',
             'date': c.create_date.strftime('%Y-%m-%d %H:%M') if c.create_date else '',
             'state': c.state
         } for c in clients]
     
-    def _get_revenue_stats(self):
+    def _get_revenue_stats(self, aggregates=None):
         """Calculate revenue statistics"""
-        self.env.cr.execute("""
-            SELECT 
-                COALESCE(SUM(s.monthly_price), 0) as mrr,
-                COALESCE(SUM(s.yearly_price), 0) as arr,
-                COUNT(c.id) as paying_customers
-            FROM saas_client c
-            JOIN saas_subscription s ON c.plan_id = s.id
-            WHERE c.state = 'active' AND s.monthly_price > 0
-        """)
-        result = self.env.cr.fetchone()
+        aggregates = aggregates or self.env['saas.client']._get_state_aggregates()
+        active = {plan_id: states['active'] for plan_id, states in aggregates['by_plan'].items()
+                  if plan_id and states.get('active')}
         
-        mrr = result[0] if result else 0
-        arr_total = result[1] if result else 0
-        paying = result[2] if result else 0
+        mrr = arr_total = 0.0
+        paying = free = 0
+        for plan in self.env['saas.subscription'].browse(list(active)):
+            count = active[plan.id]
+            if plan.monthly_price > 0:
+                mrr += plan.monthly_price * count
+                arr_total += plan.yearly_price * count
+                paying += count
+            elif plan.monthly_price == 0:
+                free += count
         
         return {
             'mrr': round(mrr, 2),
             'arr': round(arr_total, 2),
             'arr_from_monthly': round(mrr * 12, 2),
             'paying_customers': paying,
-            'free_customers': self.env['saas.client'].search_count([
-                ('state', '=', 'active'),
-                ('plan_id.monthly_price', '=', 0)
-            ])
+            'free_customers': free
         }
     
-    def _get_system_alerts(self):
+    def _get_system_alerts(self, aggregates=None):
         """Get system alerts and warnings"""
+        aggregates = aggregates or self.env['saas.client']._get_state_aggregates()
         alerts = []
         
         # Resource alerts
         try:
             import psutil
             
-            cpu = psutil.cpu_percent()
+            cpu = psutil.cpu_percent(interval=None)
             if cpu > 80:
                 alerts.append({
                     'type': 'warning',
@@ -162,7 +236,7 @@ class SaaSDashboard(models.Model):
             pass
         
         # Pending tenants
-        pending = self.env['saas.client'].search_count([('state', '=', 'pending')])
+        pending = aggregates['by_state'].get('pending', 0)
         if pending > 0:
             alerts.append({
                 'type': 'info',
@@ -171,11 +245,8 @@ class SaaSDashboard(models.Model):
             })
         
         # Expiring subscriptions
-        expiring = self.env['saas.client'].search_count([
-            ('state', '=', 'active'),
-            ('trial_end_date', '!=', False),
-            ('trial_end_date', '<=', fields.Date.add(fields.Date.today(), days=7))
-        ])
+        by_expiry = aggregates['by_expiry']
+        expiring = sum(by_expiry.get(bucket, {}).get('active', 0) for bucket in ('expired', 'week'))
         if expiring > 0:
             alerts.append({
                 'type': 'warning',
@@ -183,11 +254,8 @@ class SaaSDashboard(models.Model):
                 'message': f'{expiring} trial(s) expiring within 7 days'
             })
         
-        # Failed provisions
-        failed = self.env['saas.client'].search_count([
-            ('state', '=', 'draft'),
-            ('create_date', '<', fields.Datetime.subtract(fields.Datetime.now(), hours=24))
-        ])
+        # Approved but never became active (container not ready)
+        failed = aggregates['stale_approved']
         if failed > 0:
             alerts.append({
                 'type': 'danger',
@@ -197,42 +265,17 @@ class SaaSDashboard(models.Model):
         
         return alerts
     
-    def _get_database_sizes(self):
-        """Get sizes of tenant databases"""
-        try:
-            conn = psycopg2.connect(
-                host=config.get('db_host', 'localhost'),
-                port=config.get('db_port', 5432),
-                database='postgres',
-                user=config.get('db_user', 'odoo'),
-                password=config.get('db_password', 'odoo')
-            )
-            conn.autocommit = True
-            cur = conn.cursor()
-            
-            # Get all SaaS databases
-            cur.execute("""
-                SELECT 
-                    datname as database,
-                    pg_size_pretty(pg_database_size(datname)) as size,
-                    pg_database_size(datname) as size_bytes
-                FROM pg_database 
-                WHERE datname LIKE 'saas_%' OR datname LIKE 'db_%'
-                ORDER BY pg_database_size(datname) DESC
-                LIMIT 20
-            """)
-            
-            results = cur.fetchall()
-            cur.close()
-            conn.close()
-            
-            return [{
-                'database': r[0],
-                'size': r[1],
-                'size_bytes': r[2],
-                'size_mb': round(r[2] / (1024 * 1024), 2)
-            } for r in results]
-            
-        except Exception as e:
-            _logger.error(f"Failed to get database sizes: {e}")
-            return []
+    def _get_database_sizes(self, limit=20):
+        """Get sizes of tenant databases from the latest usage samples"""
+        Client = self.env['saas.client']
+        sizes = self.env['saas.tenant.usage']._get_latest('storage_mb')
+        largest = sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:limit]
+        clients = Client.browse([client_id for client_id, _size in largest])
+        databases = {c.id: c.database_name or c.subdomain for c in clients}
+        
+        return [{
+            'database': databases.get(client_id),
+            'size': f"{size_mb:.0f} MB" if size_mb < 1024 else f"{size_mb / 1024:.1f} GB",
+            'size_bytes': int(size_mb * 1024 * 1024),
+            'size_mb': round(size_mb, 2)
+        } for client_id, size_mb in largest]
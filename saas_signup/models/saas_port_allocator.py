@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+import logging
+
+from ..utils.container_runtime import get_runtime
+
+_logger = logging.getLogger(__name__)
+
+RESERVED_PORTS = (8080, 9069)  # Master Odoo and platform services
+
+
+class SaasPortAllocator(models.Model):
+    """One row per tenant port in the configured range.
+
+    Free ports are found through a partial index on ``state = 'free'`` and
+    claimed with ``FOR UPDATE SKIP LOCKED``, so allocation does not depend on
+    the number of tenants and concurrent signups never get the same port.
+    """
+    _name = 'saas.port.allocator'
+    _description = 'SaaS Port Allocator'
+    _order = 'port'
+    _rec_name = 'port'
+
+    port = fields.Integer(string='Port', required=True, readonly=True)
+    state = fields.Selection([
+        ('free', 'Free'),
+        ('reserved', 'Reserved'),
+        ('used', 'Used'),
+        ('blocked', 'Blocked'),
+    ], string='Status', default='free', required=True, readonly=True)
+    client_id = fields.Many2one('saas.client', string='Client', readonly=True, index=True, ondelete='set null')
+    owner = fields.Char(string='Owner', readonly=True, help='Holder of a port not owned by a client (e.g. a spare tenant)')
+    reserved_until = fields.Datetime(string='Reserved Until', readonly=True)
+
+    def init(self):
+        tools.create_unique_index(self.env.cr, 'saas_port_allocator_port_uniq', self._table, ['port'])
+        tools.create_index(self.env.cr, 'saas_port_allocator_free_idx', self._table, ['port'], where="state = 'free'")
+
+    # ==================
+    # ALLOCATION API
+    # ==================
+
+    @api.model
+    def allocate_port(self, owner=None, ttl_minutes=None):
+        """Atomically claim the lowest free port.
+
+        With ``ttl_minutes`` the port is only reserved and returns to the pool
+        once the reservation expires unless ``assign_port`` confirms it.
+        """
+        port = self._claim(owner, ttl_minutes)
+        if port is None:
+            # Range may not be seeded yet (fresh install, changed range)
+            self._sync_ports()
+            port = self._claim(owner, ttl_minutes)
+        if port is None:
+            raise UserError("No available ports! Maximum tenant limit reached.")
+        return port
+
+    @api.model
+    def _claim(self, owner, ttl_minutes):
+        start, end = self._get_range()
+        state = 'reserved' if ttl_minutes else 'used'
+        self.env.cr.execute("""
+            UPDATE saas_port_allocator
+               SET state = %s,
+                   owner = %s,
+                   client_id = NULL,
+                   reserved_until = CASE WHEN %s::int IS NULL THEN NULL
+                                         ELSE (now() at time zone 'UTC') + %s::int * interval '1 minute' END
+             WHERE id = (
+                SELECT id FROM saas_port_allocator
+                 WHERE state = 'free' AND port BETWEEN %s AND %s
+                 ORDER BY port
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+             )
+         RETURNING port
+        """, (state, owner, ttl_minutes, ttl_minutes, start, end))
+        row = self.env.cr.fetchone()
+        self.invalidate_model()
+        return row[0] if row else None
+
+    @api.model
+    def next_free_port(self):
+        """Lowest free port without claiming it"""
+        start, end = self._get_range()
+        self.env.cr.execute("""
+            SELECT port FROM saas_port_allocator
+             WHERE state = 'free' AND port BETWEEN %s AND %s
+             ORDER BY port LIMIT 1
+        """, (start, end))
+        row = self.env.cr.fetchone()
+        return row[0] if row else None
+
+    @api.model
+    def assign_port(self, port, client):
+        """Mark a port as used by a client, adding it when outside the seeded range"""
+        self.env.cr.execute("""
+            INSERT INTO saas_port_allocator (port, state, client_id, owner, reserved_until)
+            VALUES (%s, 'used', %s, NULL, NULL)
+            ON CONFLICT (port) DO UPDATE
+               SET state = 'used', client_id = EXCLUDED.client_id, owner = NULL, reserved_until = NULL
+        """, (port, client.id))
+        self.invalidate_model()
+
+    @api.model
+    def release_port(self, ports):
+        """Return ports to the free pool"""
+        if isinstance(ports, int):
+            ports = [ports]
+        ports = [p for p in ports if p]
+        if not ports:
+            return
+        self.env.cr.execute("""
+            UPDATE saas_port_allocator
+               SET state = 'free', client_id = NULL, owner = NULL, reserved_until = NULL
+             WHERE port = ANY(%s) AND state != 'blocked'
+        """, (ports,))
+        self.invalidate_model()
+
+    @api.model
+    def is_port_available(self, port):
+        self.env.cr.execute("SELECT state FROM saas_port_allocator WHERE port = %s", (port,))
+        row = self.env.cr.fetchone()
+        if row:
+            return row[0] == 'free'
+        # Outside the managed range: available unless a client already holds it
+        return not self.env['saas.client'].sudo().search_count([('port', '=', port)], limit=1)
+
+    # ==================
+    # MAINTENANCE
+    # ==================
+
+    @api.model
+    def _get_range(self):
+        config = self.env['saas.configuration'].sudo().get_config()
+        start = config.starting_port or 8001
+        end = max(config.ending_port or start + 999, start)
+        return start, end
+
+    @api.model
+    def _sync_ports(self):
+        """Seed the configured range and reconcile it with clients and spares"""
+        start, end = self._get_range()
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO saas_port_allocator (port, state)
+            SELECT p, CASE WHEN p = ANY(%s) THEN 'blocked' ELSE 'free' END
+              FROM generate_series(%s, %s) AS p
+            ON CONFLICT (port) DO NOTHING
+        """, (list(RESERVED_PORTS), start, end))
+        # Expired reservations go back to the pool
+        cr.execute("""
+            UPDATE saas_port_allocator
+               SET state = 'free', owner = NULL, reserved_until = NULL
+             WHERE state = 'reserved' AND reserved_until < (now() at time zone 'UTC')
+        """)
+        cr.execute("""
+            INSERT INTO saas_port_allocator (port, state, client_id)
+            SELECT port, 'used', id FROM saas_client WHERE port IS NOT NULL
+            ON CONFLICT (port) DO UPDATE
+               SET state = 'used', client_id = EXCLUDED.client_id, owner = NULL, reserved_until = NULL
+        """)
+        cr.execute("""
+            INSERT INTO saas_port_allocator (port, state, owner)
+            SELECT port, 'used', 'spare:' || name FROM saas_spare_tenant
+             WHERE port IS NOT NULL AND state != 'claimed'
+            ON CONFLICT (port) DO UPDATE
+               SET state = 'used', owner = EXCLUDED.owner, client_id = NULL, reserved_until = NULL
+        """)
+        # Ports used by nobody any more (deleted clients/spares)
+        cr.execute("""
+            UPDATE saas_port_allocator a
+               SET state = 'free', client_id = NULL, owner = NULL
+             WHERE a.state = 'used'
+               AND NOT EXISTS (SELECT 1 FROM saas_client c WHERE c.port = a.port)
+               AND NOT EXISTS (SELECT 1 FROM saas_spare_tenant s WHERE s.port = a.port AND s.state != 'claimed')
+        """)
+        self.invalidate_model()
+        self._sync_container_ports()
+        return True
+
+    @api.model
+    def _sync_container_ports(self):
+        """Block ports published by tenant containers the platform does not know about"""
+        try:
+            containers = get_runtime().list(labels={'saas.type': 'tenant'})
+        except Exception as e:
+            _logger.warning(f"Port sync skipped Docker reconciliation: {e}")
+            return
+        for container in containers:
+            port_label = container.labels.get('saas.port')
+            if not port_label:
+                continue
+            self.env.cr.execute("""
+                UPDATE saas_port_allocator
+                   SET state = 'used', owner = %s
+                 WHERE port = %s AND state = 'free'
+            """, (f"container:{container.name}", int(port_label)))
+        self.invalidate_model()
+
+    @api.model
+    def _cron_sync_ports(self):
+        result = self._sync_ports()
+        try:
+            # Also drops ports of pending tenants that were deleted or cancelled meanwhile
+            self.env['saas.client']._sync_waiting_responder()
+        except Exception as e:
+            _logger.warning(f"Could not reconcile waiting page responder: {e}")
+        return result
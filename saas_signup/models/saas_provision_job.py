@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+from odoo.tools import SQL
+import logging
+import threading
+import uuid
+
+from ..utils.container_runtime import get_runtime, ContainerNotFound
+from ..utils.db_pool import get_connection_manager, get_db_params
+from ..utils.progress import LOG_HANDLER, ProgressTracker
+
+_logger = logging.getLogger(__name__)
+
+# Provisioning steps, in execution order. A job records the last step it
+# finished so a crashed or restarted worker resumes from the next one.
+PROVISION_STEPS = [
+    ('create_db', 'Create Database'),
+    ('install_modules', 'Install Modules'),
+    ('set_admin', 'Set Admin Credentials'),
+    ('create_volume', 'Create Volume'),
+    ('waiting_container', 'Waiting Page'),
+]
+
+# Share of the overall progress each step accounts for (module install dominates)
+STEP_WEIGHTS = {
+    'create_db': 10,
+    'install_modules': 70,
+    'set_admin': 10,
+    'create_volume': 5,
+    'waiting_container': 5,
+}
+
+HEARTBEAT_INTERVAL = 60  # seconds between heartbeats of a running job
+STALE_AFTER_MINUTES = 10  # running jobs without heartbeat are requeued
+
+# Worker threads currently draining the queue, per database
+_workers_lock = threading.Lock()
+_active_workers = {}
+
+
+def spawn_workers(dbname):
+    """Start provisioning worker threads up to the configured pool size"""
+    if getattr(threading.current_thread(), 'testing', False):
+        return
+    with Registry(dbname).cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        max_workers = max(env['saas.configuration'].get_config_snapshot()['provision_workers'] or 1, 1)
+    with _workers_lock:
+        running = _active_workers.get(dbname, 0)
+        for index in range(running, max_workers):
+            _active_workers[dbname] = _active_workers.get(dbname, 0) + 1
+            threading.Thread(
+                target=_worker_loop, args=(dbname,),
+                name=f"saas_provision_{dbname}_{index}", daemon=True,
+            ).start()
+
+
+def _worker_loop(dbname):
+    """Claim and run jobs until the queue is empty"""
+    try:
+        while True:
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                job = env['saas.provision.job']._claim_next()
+                cr.commit()
+                if not job:
+                    return
+                job._run()
+    except Exception as e:
+        _logger.error(f"Provisioning worker crashed: {e}", exc_info=True)
+    finally:
+        with _workers_lock:
+            _active_workers[dbname] = max(_active_workers.get(dbname, 1) - 1, 0)
+
+
+def _heartbeat_loop(dbname, job_id, stop_event, table='saas_provision_job'):
+    """Keep the lease of a running job (or upgrade batch) alive while a long step is running"""
+    while not stop_event.wait(HEARTBEAT_INTERVAL):
+        try:
+            with Registry(dbname).cursor() as cr:
+                cr.execute(SQL(
+                    "UPDATE %s SET heartbeat = (now() at time zone 'UTC') WHERE id = %s AND state = 'running'",
+                    SQL.identifier(table), job_id,
+                ))
+        except Exception as e:
+            _logger.warning(f"Heartbeat failed for {table} {job_id}: {e}")
+
+
+def _progress_writer(dbname, table, record_id):
+    """Callback storing tracker snapshots on a job row, each in its own short transaction"""
+    def write(snapshot):
+        try:
+            with Registry(dbname).cursor() as cr:
+                cr.execute(SQL(
+                    "UPDATE %s SET progress = %s, progress_message = %s, write_date = (now() at time zone 'UTC') WHERE id = %s",
+                    SQL.identifier(table), snapshot['percent'], snapshot['message'], record_id,
+                ))
+        except Exception as e:
+            _logger.warning(f"Could not store progress of {table} {record_id}: {e}")
+    return write
+
+
+class SaasProvisionJob(models.Model):
+    _name = 'saas.provision.job'
+    _description = 'SaaS Provisioning Job'
+    _order = 'id desc'
+    _rec_name = 'client_id'
+
+    client_id = fields.Many2one('saas.client', string='Client', required=True, index=True, ondelete='cascade')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True)
+    last_step = fields.Selection(PROVISION_STEPS, string='Last Finished Step', readonly=True)
+    attempts = fields.Integer(string='Attempts', default=0, readonly=True)
+    max_attempts = fields.Integer(string='Max Attempts', default=3)
+    heartbeat = fields.Datetime(string='Heartbeat', readonly=True)
+    date_started = fields.Datetime(string='Started', readonly=True)
+    date_done = fields.Datetime(string='Finished', readonly=True)
+    error = fields.Text(string='Last Error', readonly=True)
+    from_template = fields.Boolean(string='Cloned From Template', readonly=True,
+                                   help='Database was created from the plan template, modules are already installed')
+    progress = fields.Integer(string='Step Progress (%)', readonly=True,
+                              help='Progress of the running step, parsed from the install container output')
+    progress_message = fields.Char(string='Progress', readonly=True)
+    auto_approve = fields.Boolean(string='Approve When Done', readonly=True,
+                                  help='Approve the tenant as soon as provisioning finishes (localhost mode)')
+
+    _indexes = {
+        'state_id_idx': 'state, id',
+    }
+
+    # ==================
+    # QUEUE API
+    # ==================
+
+    @api.model
+    def enqueue(self, client, last_step=False, from_template=False, auto_approve=False):
+        """Queue provisioning for a client and wake the worker pool after commit"""
+        job = self.create({
+            'client_id': client.id,
+            'last_step': last_step,
+            'from_template': from_template,
+            'auto_approve': auto_approve,
+        })
+        dbname = self.env.cr.dbname
+        self.env.cr.postcommit.add(lambda: spawn_workers(dbname))
+        _logger.info(f"Provisioning job {job.id} queued for {client.subdomain}")
+        return job
+
+    @api.model
+    def _claim_next(self):
+        """Atomically claim the oldest pending job, skipping rows locked by other workers"""
+        self.env.cr.execute("""
+            UPDATE saas_provision_job
+               SET state = 'running',
+                   attempts = attempts + 1,
+                   heartbeat = (now() at time zone 'UTC'),
+                   date_started = COALESCE(date_started, now() at time zone 'UTC')
+             WHERE id = (
+                SELECT id FROM saas_provision_job
+                 WHERE state = 'pending'
+                 ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+             )
+         RETURNING id
+        """)
+        row = self.env.cr.fetchone()
+        self.invalidate_model()
+        return self.browse(row[0]) if row else self.browse()
+
+    @api.model
+    def _requeue_stale(self):
+        """Put back running jobs whose worker stopped sending heartbeats"""
+        self.env.cr.execute("""
+            UPDATE saas_provision_job
+               SET state = 'pending'
+             WHERE state = 'running'
+               AND heartbeat < (now() at time zone 'UTC') - %s * interval '1 minute'
+         RETURNING id
+        """, (STALE_AFTER_MINUTES,))
+        requeued = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model()
+        if requeued:
+            _logger.warning(f"Requeued stale provisioning jobs: {requeued}")
+        return requeued
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Cron: recover jobs lost by crashed workers and drain the queue"""
+        self._requeue_stale()
+        self.env.cr.commit()
+        spawn_workers(self.env.cr.dbname)
+        return True
+
+    # ==================
+    # EXECUTION
+    # ==================
+
+    def _run(self):
+        """Execute the remaining steps of a claimed job, committing after each one"""
+        self.ensure_one()
+        client = self.client_id
+        step_names = [step for step, _label in PROVISION_STEPS]
+        start = step_names.index(self.last_step) + 1 if self.last_step else 0
+
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=_heartbeat_loop, args=(self.env.cr.dbname, self.id, stop_heartbeat), daemon=True,
+        )
+        heartbeat.start()
+        try:
+            _logger.info(f"[Provision] Job {self.id} for {client.subdomain}: resuming at step {step_names[start] if start < len(step_names) else 'done'}")
+            for step in step_names[start:]:
+                getattr(self, f'_step_{step}')(client)
+                self.write({'last_step': step, 'heartbeat': fields.Datetime.now(), 'progress': 0, 'progress_message': False})
+                self.env.cr.commit()
+            self.write({'state': 'done', 'date_done': fields.Datetime.now(), 'error': False})
+            self.env.cr.commit()
+            _logger.info(f"[Provision] Database and credentials ready for {client.subdomain}")
+            if self.auto_approve:
+                # Approval waits for the tenant to be ready; keep it off the provisioning workers
+                self.env.ref('saas_signup.ir_cron_auto_approve_tenants')._trigger()
+                self.env.cr.commit()
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.error(f"[Provision] Job {self.id} failed for {client.subdomain}: {e}", exc_info=True)
+            if self.attempts < self.max_attempts:
+                self.write({'state': 'pending', 'error': str(e)})
+            else:
+                self.write({'state': 'failed', 'error': str(e), 'date_done': fields.Datetime.now()})
+                client.write({'notes': f"Provisioning error: {str(e)}\n\nPlease contact support."})
+            self.env.cr.commit()
+        finally:
+            stop_heartbeat.set()
+
+    @api.model
+    def _cron_auto_approve(self):
+        """Cron: approve the clients of finished auto-approve jobs (triggered when such a job completes)"""
+        for job in self.search([('state', '=', 'done'), ('auto_approve', '=', True)], order='id'):
+            job._auto_approve()
+        return True
+
+    def _auto_approve(self):
+        """Approve the client of a finished job, once; a failure leaves it pending for manual approval"""
+        client = self.client_id
+        self.auto_approve = False
+        self.env.cr.commit()
+        if client.state != 'pending':
+            return
+        try:
+            client.action_approve()
+            self.env.cr.commit()
+            _logger.info(f"✅ Auto-approved tenant {client.subdomain} on provisioning completion")
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.warning(f"Auto-approval failed for {client.subdomain}, left pending: {e}", exc_info=True)
+
+    @api.model
+    def _get_db_params(self):
+        """Database connection parameters from the Odoo server configuration"""
+        return get_db_params()
+
+    def _get_plan_modules(self, client):
+        return client.subscription_id.module_list or 'base'
+
+    # ==================
+    # STEPS (each one must be idempotent)
+    # ==================
+
+    def _step_create_db(self, client):
+        from psycopg2 import sql
+
+        pool = get_connection_manager()
+        with pool.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (client.database_name,))
+            exists = cursor.fetchone()
+        if exists:
+            # Retry after a crash: the flag of an uncommitted template clone was lost with the transaction
+            if not self.from_template and self._is_initialized(client.database_name):
+                _logger.info(f"[Provision] {client.database_name} already initialized, treating it as a template clone")
+                self.from_template = True
+            return
+
+        # Clone the plan's pre-initialized template when it is up to date
+        plan = client.subscription_id
+        if plan._template_is_current() and client._duplicate_from_template(plan._get_template_db_name()):
+            self.from_template = True
+            return
+
+        _logger.info(f"[Provision] Creating database: {client.database_name}")
+        with pool.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(client.database_name)))
+
+    @api.model
+    def _is_initialized(self, database_name):
+        """Whether a database already has Odoo installed (base module in state installed)"""
+        with get_connection_manager().cursor(database_name) as cursor:
+            cursor.execute("SELECT to_regclass('ir_module_module') IS NOT NULL")
+            if not cursor.fetchone()[0]:
+                return False
+            cursor.execute("SELECT 1 FROM ir_module_module WHERE name = 'base' AND state = 'installed'")
+            return bool(cursor.fetchone())
+
+    def _step_install_modules(self, client):
+        if self.from_template:
+            _logger.info(f"[Provision] Modules already installed from template, skipping")
+            return
+        tracker = ProgressTracker(_progress_writer(self.env.cr.dbname, self._table, self.id))
+        self._run_module_install(
+            client.database_name, self._get_plan_modules(client), f"init_{client.subdomain}",
+            on_output=tracker.feed,
+        )
+        tracker.finish()
+
+    @api.model
+    def _run_module_install(self, database_name, modules, container_name, on_output=None):
+        """Initialize a database with the given modules in a throwaway Odoo container (log lines go to on_output)"""
+        db_params = self._get_db_params()
+        config = self.env['saas.configuration'].get_config()
+        runtime = get_runtime()
+
+        # A crashed attempt may have left its init container behind
+        try:
+            runtime.remove(container_name, force=True)
+        except ContainerNotFound:
+            pass
+
+        _logger.info(f"[Provision] Installing modules on {database_name}: {modules}...")
+        runtime.run_to_completion(
+            config.odoo_image or 'odoo:19',
+            container_name,
+            environment={
+                'HOST': db_params['host'],
+                'PORT': str(db_params['port']),
+                'USER': db_params['user'],
+                'PASSWORD': db_params['password'],
+            },
+            command=f'odoo -d {database_name} -i {modules} --stop-after-init --without-demo=all --load-language=en_US {LOG_HANDLER}',
+            network=config.docker_network or 'odoo19_odoo-network',
+            on_output=on_output,
+        )
+        _logger.info(f"[Provision] Module installation completed on {database_name}")
+
+    def _step_set_admin(self, client):
+        from passlib.context import CryptContext
+
+        _logger.info(f"[Provision] Creating admin user...")
+        pwd_context = CryptContext(schemes=['pbkdf2_sha512'], deprecated='auto')
+        hashed_password = pwd_context.hash(client.admin_password)
+
+        with get_connection_manager().cursor(client.database_name) as tenant_cursor:
+            # Find admin user (don't use hardcoded ID as modules may create additional users);
+            # a resumed job may already have renamed it to the tenant's email
+            tenant_cursor.execute(
+                "SELECT id, partner_id FROM res_users WHERE login IN ('admin', %s) ORDER BY login = 'admin' DESC LIMIT 1",
+                (client.admin_email,)
+            )
+            admin_result = tenant_cursor.fetchone()
+
+            if admin_result:
+                admin_user_id, admin_partner_id = admin_result
+                tenant_cursor.execute(
+                    "UPDATE res_users SET login=%s, password=%s WHERE id=%s",
+                    (client.admin_email, hashed_password, admin_user_id)
+                )
+                tenant_cursor.execute(
+                    "UPDATE res_partner SET name=%s, email=%s WHERE id=%s",
+                    (client.admin_name, client.admin_email, admin_partner_id)
+                )
+                _logger.info(f"[Provision] ✅ Admin credentials updated: login={client.admin_email}")
+            else:
+                _logger.error(f"[Provision] ❌ Admin user not found in tenant database!")
+
+            if self.from_template:
+                # Clones share the template's identity; give each tenant its own
+                tenant_cursor.execute(
+                    "UPDATE ir_config_parameter SET value = %s WHERE key = 'database.uuid'",
+                    (str(uuid.uuid1()),)
+                )
+                tenant_cursor.execute(
+                    "UPDATE ir_config_parameter SET value = %s WHERE key = 'database.secret'",
+                    (str(uuid.uuid4()),)
+                )
+
+            plan_module_list = [m.strip() for m in self._get_plan_modules(client).split(',') if m.strip()]
+            tenant_cursor.execute(
+                "SELECT count(*) FROM ir_module_module WHERE name = ANY(%s) AND state = 'installed'",
+                (plan_module_list,)
+            )
+            installed_count = tenant_cursor.fetchone()[0]
+            _logger.info(f"[Provision] Installed {installed_count}/{len(plan_module_list)} plan modules")
+
+            # Hide non-plan modules from Apps menu
+            tenant_cursor.execute(
+                "UPDATE ir_module_module SET state='uninstallable' "
+                "WHERE state='uninstalled' AND NOT (name = ANY(%s))",
+                (plan_module_list,)
+            )
+
+    def _step_create_volume(self, client):
+        volume_name = client.volume_name or f"odoo_tenant_{client.subdomain}_data"
+        try:
+            get_runtime().create_volume(volume_name)
+            client.volume_name = volume_name
+            _logger.info(f"[Provision] Volume created: {volume_name}")
+        except Exception as vol_error:
+            _logger.warning(f"[Provision] Volume creation warning: {vol_error}")
+
+    def _step_waiting_container(self, client):
+        """Serve the waiting page on the tenant port from the shared responder (no per-tenant container)"""
+        _logger.info(f"[Provision] Serving waiting page on port {client.port}...")
+        try:
+            client._sync_waiting_responder()
+        except Exception as responder_error:
+            _logger.warning(f"[Provision] Could not update waiting page responder: {responder_error}")
+
+    # ==================
+    # PROGRESS
+    # ==================
+
+    def _get_progress(self):
+        """Overall progress of the job: finished steps plus the running step's own progress"""
+        self.ensure_one()
+        step_names = [step for step, _label in PROVISION_STEPS]
+        finished = step_names[:step_names.index(self.last_step) + 1] if self.last_step else []
+        current = next((step for step in step_names if step not in finished), None)
+        if self.state == 'done':
+            percent = 100
+        else:
+            percent = sum(STEP_WEIGHTS[step] for step in finished)
+            if current and self.state == 'running':
+                percent += STEP_WEIGHTS[current] * (self.progress or 0) // 100
+        labels = dict(PROVISION_STEPS)
+        return {
+            'state': self.state,
+            'step': labels.get(current) if current and self.state != 'done' else False,
+            'percent': percent,
+            'message': self.progress_message or False,
+            'error': self.error if self.state == 'failed' else False,
+        }
+
+    # ==================
+    # UI ACTIONS
+    # ==================
+
+    def action_retry(self):
+        """Requeue failed jobs; they resume after their last finished step"""
+        self.filtered(lambda j: j.state == 'failed').write({'state': 'pending', 'attempts': 0})
+        dbname = self.env.cr.dbname
+        self.env.cr.postcommit.add(lambda: spawn_workers(dbname))
+        return True
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.modules.registry import Registry
+import logging
+import uuid
+
+from ..utils.container_runtime import get_runtime, ContainerNotFound
+from ..utils.db_pool import get_connection_manager
+
+_logger = logging.getLogger(__name__)
+
+
+def _adopt_container(dbname, client_id, spare_container, container_kwargs):
+    """Replace a claimed spare's stopped container with the client's own (runs after the signup commit)"""
+    runtime = get_runtime()
+    try:
+        try:
+            runtime.remove(spare_container, force=True)
+        except ContainerNotFound:
+            pass
+        container = runtime.create(**container_kwargs)
+    except Exception as e:
+        # Approval creates the container itself when it does not exist
+        _logger.warning(f"Could not hand spare container {spare_container} over: {e}")
+        return
+    with Registry(dbname).cursor() as cr:
+        cr.execute("UPDATE saas_client SET container_id = %s WHERE id = %s", (container.id[:12], client_id))
+
+
+class SaasSpareTenant(models.Model):
+    _name = 'saas.spare.tenant'
+    _description = 'SaaS Spare Tenant'
+    _order = 'id'
+
+    name = fields.Char(string='Spare', required=True, readonly=True)
+    plan_id = fields.Many2one('saas.subscription', string='Plan', required=True, index=True, ondelete='cascade')
+    state = fields.Selection([
+        ('building', 'Building'),
+        ('ready', 'Ready'),
+        ('claimed', 'Claimed'),
+        ('failed', 'Failed'),
+    ], string='Status', default='building', required=True, index=True)
+    database_name = fields.Char(string='Database Name', readonly=True)
+    port = fields.Integer(string='Port', readonly=True, index=True)
+    container_name = fields.Char(string='Container Name', readonly=True)
+    container_id = fields.Char(string='Container ID', readonly=True)
+    volume_name = fields.Char(string='Volume Name', readonly=True)
+    template_signature = fields.Char(string='Template Signature', readonly=True,
+                                     help='Signature of the plan template this spare was cloned from')
+    client_id = fields.Many2one('saas.client', string='Claimed By', readonly=True, ondelete='set null')
+    error = fields.Text(string='Error', readonly=True)
+
+    _indexes = {
+        'plan_state_idx': 'plan_id, state',
+    }
+
+    # ==================
+    # CLAIMING
+    # ==================
+
+    @api.model
+    def _claim(self, plan):
+        """Claim a ready spare for the plan, or return an empty recordset on a pool miss"""
+        config = self.env['saas.configuration'].sudo().get_config()
+        if not config.spare_pool_enabled or not plan:
+            return self.browse()
+
+        self.env.cr.execute("""
+            UPDATE saas_spare_tenant
+               SET state = 'claimed'
+             WHERE id = (
+                SELECT id FROM saas_spare_tenant
+                 WHERE state = 'ready' AND plan_id = %s AND template_signature = %s
+                 ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+             )
+         RETURNING id
+        """, (plan.id, plan._compute_template_signature()))
+        row = self.env.cr.fetchone()
+        self.invalidate_model()
+
+        counter = 'spare_pool_hits' if row else 'spare_pool_misses'
+        self.env.cr.execute(
+            f"UPDATE saas_configuration SET {counter} = COALESCE({counter}, 0) + 1 WHERE id = %s",
+            (config.id,)
+        )
+        config.invalidate_recordset([counter])
+
+        if not row:
+            _logger.info(f"Spare pool miss for plan {plan.code}")
+            return self.browse()
+        spare = self.browse(row[0])
+        _logger.info(f"Spare pool hit for plan {plan.code}: {spare.name}")
+        return spare
+
+    def _assign_to(self, client):
+        """Hand the spare's database and volume over to the client; its container follows after commit"""
+        self.ensure_one()
+        container_name = f"odoo_tenant_{client.subdomain}"
+        container_kwargs = client._tenant_container_kwargs(
+            self.database_name, self.port, self.volume_name, container_name,
+            labels=client._tenant_container_labels(),
+        )
+        client.write({
+            'container_name': container_name,
+            'volume_name': self.volume_name,
+        })
+        self.write({'client_id': client.id})
+
+        # Docker labels are fixed at creation, so the stopped spare container is replaced rather
+        # than renamed; only once the signup committed, a rolled back one leaves the spare intact
+        dbname, client_id, spare_container = self.env.cr.dbname, client.id, self.container_name
+        self.env.cr.postcommit.add(
+            lambda: _adopt_container(dbname, client_id, spare_container, container_kwargs)
+        )
+        _logger.info(f"Spare {self.name} assigned to {client.subdomain}")
+        return True
+
+    # ==================
+    # REFILLING
+    # ==================
+
+    @api.model
+    def _cron_refill_pool(self):
+        """Discard outdated spares and build new ones up to each plan's target"""
+        config = self.env['saas.configuration'].sudo().get_config()
+        if not config.spare_pool_enabled:
+            return True
+
+        budget = max(config.spare_refill_rate or 1, 1)
+        for plan in self.env['saas.subscription'].search([('is_active', '=', True)]):
+            if not plan._template_is_current():
+                continue
+
+            signature = plan._compute_template_signature()
+            outdated = self.search([
+                ('plan_id', '=', plan.id),
+                ('state', '=', 'ready'),
+                ('template_signature', '!=', signature),
+            ])
+            for spare in outdated:
+                spare._destroy()
+
+            # Spares whose cleanup failed earlier: retry it, and build nothing new until it worked
+            failed = self.search([('plan_id', '=', plan.id), ('state', '=', 'failed')])
+            if failed:
+                failed._destroy()
+                if failed.exists():
+                    _logger.warning(f"Spare pool for plan {plan.code} paused: {len(failed.exists())} failed spare(s) left")
+                    continue
+
+            target = plan.spare_pool_target or config.spare_pool_size
+            available = self.search_count([('plan_id', '=', plan.id), ('state', 'in', ['building', 'ready'])])
+            while available < target and budget > 0:
+                spare = self._build_spare(plan)
+                budget -= 1
+                if not spare.exists() or spare.state != 'ready':
+                    break  # Retried on the next run rather than failing over and over now
+                available += 1
+        return True
+
+    @api.model
+    def _build_spare(self, plan):
+        """Clone the plan template and create (but do not start) its container"""
+        from psycopg2 import sql
+
+        token = uuid.uuid4().hex[:8]
+        name = f"spare_{plan.code}_{token}"
+        spare = self.create({
+            'name': name,
+            'plan_id': plan.id,
+            'database_name': f"saas_{name}",
+            'container_name': f"odoo_{name}",
+            'volume_name': f"odoo_{name}_data",
+            'port': self.env['saas.port.allocator'].allocate_port(owner=f"spare:{name}"),
+            'template_signature': plan._compute_template_signature(),
+        })
+        # Commit so the port is visible to concurrent allocations
+        self.env.cr.commit()
+
+        try:
+            template_db = plan._get_template_db_name()
+            pool = get_connection_manager()
+            pool.close_database(template_db)
+            with pool.cursor() as cur:
+                cur.execute(
+                    "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                    "WHERE datname = %s AND pid <> pg_backend_pid()", (template_db,)
+                )
+                cur.execute(sql.SQL("CREATE DATABASE {} WITH TEMPLATE {}").format(
+                    sql.Identifier(spare.database_name), sql.Identifier(template_db)
+                ))
+
+            runtime = get_runtime()
+            runtime.create_volume(spare.volume_name)
+            container = runtime.create(**self.env['saas.client']._tenant_container_kwargs(
+                spare.database_name, spare.port, spare.volume_name, spare.container_name,
+                labels={
+                    'saas.type': 'tenant',
+                    'saas.tenant': name,
+                    'saas.database': spare.database_name,
+                    'saas.port': str(spare.port),
+                    'saas.spare': 'true',
+                },
+            ))
+            spare.write({'state': 'ready', 'container_id': container.id[:12]})
+            _logger.info(f"✅ Spare {name} ready on port {spare.port}")
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.error(f"❌ Failed to build spare {name}: {e}", exc_info=True)
+            spare.write({'state': 'failed', 'error': str(e)})
+            self.env.cr.commit()
+            # Give the port, database and volume back; kept as 'failed' only if that fails too
+            spare._destroy()
+        self.env.cr.commit()
+        return spare
+
+    def _destroy(self):
+        """Remove the spare's container, volume and database"""
+        from psycopg2 import sql
+
+        runtime = get_runtime()
+        pool = get_connection_manager()
+        for spare in self:
+            try:
+                try:
+                    runtime.remove(spare.container_name, force=True)
+                except ContainerNotFound:
+                    pass
+                try:
+                    runtime.remove_volume(spare.volume_name)
+                except ContainerNotFound:
+                    pass
+
+                pool.close_database(spare.database_name)
+                with pool.cursor() as cur:
+                    cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(spare.database_name)))
+                self.env['saas.port.allocator'].release_port(spare.port)
+                spare.unlink()
+            except Exception as e:
+                _logger.error(f"Failed to remove spare {spare.name}: {e}")
+        return True
+
+    def action_destroy(self):
+        """Remove unclaimed spares from the pool"""
+        return self.filtered(lambda s: s.state != 'claimed')._destroy()
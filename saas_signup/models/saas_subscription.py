@@ -1,4 +1,14 @@
 from odoo import models, fields, api
+from datetime import timedelta
+import hashlib
+import logging
+
+from ..utils.db_pool import get_connection_manager
+
+_logger = logging.getLogger(__name__)
+
+PUBLIC_VERSION_PARAM = 'saas_signup.public_page_version'
+
 
 class SaasSubscription(models.Model):
     _name = 'saas.subscription'
@@ -30,6 +40,11 @@ class SaasSubscription(models.Model):
 
     # Settings
     trial_days = fields.Integer(string='Trial Days', default=14)
+    idle_hibernate_hours = fields.Integer(string='Hibernate After (Hours Idle)', default=0,
+                                          help='Stop tenant containers after this many hours without '
+                                               'traffic or logins; they start again on the next request. '
+                                               'Needs dynamic nginx routing, which sees every request. '
+                                               '0 keeps them running.')
     is_popular = fields.Boolean(string='Popular Plan')
     is_active = fields.Boolean(string='Active', default=True)
 
@@ -41,12 +56,171 @@ class SaasSubscription(models.Model):
         help='Comma-separated list of technical module names to install for this plan. E.g: mail,hr,point_of_sale,project,sale,hr_expense'
     )
 
-    client_count = fields.Integer(compute='_compute_client_count', string='Active Clients')
+    client_ids = fields.One2many('saas.client', 'subscription_id', string='Clients')
+    client_count = fields.Integer(compute='_compute_client_count', string='Active Clients', store=True)
+
+    spare_pool_target = fields.Integer(string='Spare Pool Target',
+                                       help='Ready spares to keep for this plan. 0 uses the default from SaaS configuration.')
+
+    # Pre-initialized template database (saas_tpl_<code>) cloned on signup
+    template_state = fields.Selection([
+        ('none', 'Not Built'),
+        ('building', 'Building'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ], string='Template Status', default='none', readonly=True, copy=False)
+    template_signature = fields.Char(string='Template Signature', readonly=True, copy=False,
+                                     help='Module list and Odoo image the template was built with')
+    template_date = fields.Datetime(string='Template Updated', readonly=True, copy=False)
+    template_error = fields.Text(string='Template Error', readonly=True, copy=False)
+
+    # Fields rendered on the public pricing and signup pages
+    _PUBLIC_FIELDS = {
+        'name', 'sequence', 'monthly_price', 'yearly_price', 'max_users', 'storage_limit',
+        'trial_days', 'is_popular', 'is_active', 'features',
+    }
 
-    @api.depends('is_active')
+    @api.model_create_multi
+    def create(self, vals_list):
+        plans = super().create(vals_list)
+        self._bump_public_version()
+        return plans
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._PUBLIC_FIELDS.intersection(vals):
+            self._bump_public_version()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._bump_public_version()
+        return res
+
+    # ==================
+    # PUBLIC PAGE CACHE
+    # ==================
+
+    @api.model
+    def _get_public_version(self):
+        """Last change to plans or configuration shown on public pages (cache key, Last-Modified)"""
+        return self.env['ir.config_parameter'].sudo().get_param(PUBLIC_VERSION_PARAM) or '1970-01-01 00:00:00'
+
+    @api.model
+    def _bump_public_version(self):
+        """Invalidate cached public page fragments and HTTP validators"""
+        self.env['ir.config_parameter'].sudo().set_param(
+            PUBLIC_VERSION_PARAM, fields.Datetime.to_string(fields.Datetime.now()))
+
+    @api.depends('client_ids.state')
     def _compute_client_count(self):
+        # Stored: recomputed only for plans whose clients changed state or plan
+        counts = dict(self.env['saas.client']._read_group(
+            [('subscription_id', 'in', self.ids), ('state', '=', 'active')],
+            ['subscription_id'], ['__count'],
+        ))
         for plan in self:
-            plan.client_count = self.env['saas.client'].search_count([
-                ('subscription_id', '=', plan.id),
-                ('state', '=', 'active')
-            ])
\ No newline at end of file
+            plan.client_count = counts.get(plan, 0)
+
+    # ==================
+    # TEMPLATE DATABASES
+    # ==================
+
+    def _get_template_db_name(self):
+        self.ensure_one()
+        return f"saas_tpl_{self.code}"
+
+    def _get_template_modules(self):
+        self.ensure_one()
+        modules = sorted({m.strip() for m in (self.module_list or 'base').split(',') if m.strip()})
+        return ','.join(modules)
+
+    def _compute_template_signature(self):
+        """Fingerprint of what the template must contain: modules and Odoo image"""
+        self.ensure_one()
+        image = self.env['saas.configuration'].sudo().get_config().odoo_image or 'odoo:19'
+        return hashlib.sha1(f"{self._get_template_modules()}|{image}".encode()).hexdigest()
+
+    def _template_is_current(self):
+        """Template is built and matches the current module list and image"""
+        self.ensure_one()
+        return self.template_state == 'ready' and self.template_signature == self._compute_template_signature()
+
+    def action_rebuild_template(self):
+        """Schedule a template rebuild for the selected plans"""
+        self.write({'template_state': 'none'})
+        self.env.ref('saas_signup.ir_cron_refresh_plan_templates')._trigger()
+        return True
+
+    @api.model
+    def _cron_refresh_templates(self):
+        """Rebuild templates that are missing or outdated (module list or image changed)"""
+        stale_building = fields.Datetime.now() - timedelta(hours=2)
+        for plan in self.search([('is_active', '=', True)]):
+            if plan._template_is_current():
+                continue
+            if plan.template_state == 'building' and plan.template_date and plan.template_date > stale_building:
+                continue
+            plan._build_template()
+        return True
+
+    def _build_template(self):
+        """Build the template into a scratch database, then swap it into place"""
+        from psycopg2 import sql
+
+        self.ensure_one()
+        signature = self._compute_template_signature()
+        template_db = self._get_template_db_name()
+        build_db = f"{template_db}_build"
+        Job = self.env['saas.provision.job']
+        pool = get_connection_manager()
+
+        self.write({'template_state': 'building', 'template_date': fields.Datetime.now(), 'template_error': False})
+        self.env.cr.commit()
+
+        def run(*queries):
+            with pool.cursor() as cur:
+                for query, params in queries:
+                    cur.execute(query, params)
+
+        def terminate(db):
+            return ("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                    "WHERE datname = %s AND pid <> pg_backend_pid()", (db,))
+
+        try:
+            _logger.info(f"Building template {template_db} for plan {self.name}")
+            run(
+                (sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(build_db)), None),
+                (sql.SQL("CREATE DATABASE {}").format(sql.Identifier(build_db)), None),
+            )
+            modules = self._get_template_modules()
+            Job._run_module_install(build_db, modules, f"tpl_build_{self.code}")
+
+            # Hide non-plan modules from Apps menu, as done for each tenant
+            with pool.cursor(build_db) as cur:
+                cur.execute(
+                    "UPDATE ir_module_module SET state='uninstallable' "
+                    "WHERE state='uninstalled' AND NOT (name = ANY(%s))",
+                    (modules.split(','),)
+                )
+
+            pool.close_database(build_db)
+            pool.close_database(template_db)
+            run(
+                terminate(template_db),
+                terminate(build_db),
+                (sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(template_db)), None),
+                (sql.SQL("ALTER DATABASE {} RENAME TO {}").format(sql.Identifier(build_db), sql.Identifier(template_db)), None),
+            )
+            self.write({
+                'template_state': 'ready',
+                'template_signature': signature,
+                'template_date': fields.Datetime.now(),
+            })
+            _logger.info(f"✅ Template {template_db} ready ({modules})")
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.error(f"❌ Template build failed for plan {self.name}: {e}", exc_info=True)
+            self.write({'template_state': 'failed', 'template_error': str(e), 'template_date': fields.Datetime.now()})
+        self.env.cr.commit()
+        return self.template_state == 'ready'
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+USAGE_METRICS = [
+    ('storage_mb', 'Storage (MB)'),
+    ('users', 'Active Users'),
+]
+
+
+class SaasTenantUsage(models.Model):
+    """Tenant usage time series.
+
+    The monitoring cron stores one ``hour`` sample per tenant and metric;
+    ``day`` and ``month`` rows hold the peak of the finer samples and are
+    refreshed on every run. Readers (dashboard, limits, billing) use these
+    rows instead of querying tenant databases.
+    """
+    _name = 'saas.tenant.usage'
+    _description = 'SaaS Tenant Usage'
+    _order = 'ts desc, id desc'
+    _rec_name = 'metric'
+
+    client_id = fields.Many2one('saas.client', string='Client', required=True, readonly=True, ondelete='cascade')
+    metric = fields.Selection(USAGE_METRICS, string='Metric', required=True, readonly=True)
+    granularity = fields.Selection([
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+        ('month', 'Monthly'),
+    ], string='Granularity', required=True, readonly=True, default='hour')
+    ts = fields.Datetime(string='Period Start', required=True, readonly=True)
+    value = fields.Float(string='Value', readonly=True, digits=(16, 2),
+                         help='Sampled value for hourly rows, peak of the period for daily and monthly rows')
+
+    def init(self):
+        tools.create_unique_index(
+            self.env.cr, 'saas_tenant_usage_sample_uniq', self._table,
+            ['client_id', 'metric', 'granularity', 'ts'],
+        )
+        tools.create_index(self.env.cr, 'saas_tenant_usage_ts_idx', self._table, ['granularity', 'ts'])
+
+    # ==================
+    # WRITING
+    # ==================
+
+    @api.model
+    def _record_samples(self, samples):
+        """Store hourly samples [(client_id, metric, value), ...] in one statement"""
+        samples = [s for s in samples if s[2] is not None]
+        if not samples:
+            return
+        client_ids, metrics, values = zip(*samples)
+        self.env.cr.execute("""
+            INSERT INTO saas_tenant_usage (client_id, metric, granularity, ts, value,
+                                           create_uid, create_date, write_uid, write_date)
+            SELECT v.client_id, v.metric, 'hour', date_trunc('hour', now() at time zone 'UTC'), v.value,
+                   %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+              FROM unnest(%s::int[], %s::varchar[], %s::float8[]) AS v(client_id, metric, value)
+            ON CONFLICT (client_id, metric, granularity, ts) DO UPDATE
+               SET value = EXCLUDED.value, write_date = EXCLUDED.write_date
+        """, (self.env.uid, self.env.uid, list(client_ids), list(metrics), list(values)))
+        self.invalidate_model()
+
+    @api.model
+    def _rollup(self, since=None):
+        """Refresh daily and monthly peaks from the finer rows (current month by default)"""
+        since = since or fields.Datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for source, target in (('hour', 'day'), ('day', 'month')):
+            self.env.cr.execute("""
+                INSERT INTO saas_tenant_usage (client_id, metric, granularity, ts, value,
+                                               create_uid, create_date, write_uid, write_date)
+                SELECT client_id, metric, %s, date_trunc(%s, ts), max(value),
+                       %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+                  FROM saas_tenant_usage
+                 WHERE granularity = %s AND ts >= date_trunc(%s, %s::timestamp)
+                 GROUP BY client_id, metric, date_trunc(%s, ts)
+                ON CONFLICT (client_id, metric, granularity, ts) DO UPDATE
+                   SET value = EXCLUDED.value, write_date = EXCLUDED.write_date
+            """, (target, target, self.env.uid, self.env.uid, source, target, since, target))
+        self.invalidate_model()
+
+    @api.model
+    def _prune(self):
+        """Drop hourly and daily rows older than the configured retention"""
+        config = self.env['saas.configuration'].sudo().get_config()
+        retention = {
+            'hour': config.usage_hourly_retention_days,
+            'day': config.usage_daily_retention_days,
+        }
+        for granularity, days in retention.items():
+            if days and days > 0:
+                self.env.cr.execute("""
+                    DELETE FROM saas_tenant_usage
+                     WHERE granularity = %s AND ts < (now() at time zone 'UTC') - %s * interval '1 day'
+                """, (granularity, days))
+                if self.env.cr.rowcount:
+                    _logger.info(f"Pruned {self.env.cr.rowcount} {granularity}ly usage rows older than {days} days")
+        self.invalidate_model()
+
+    @api.model
+    def _cron_maintain(self):
+        """Daily: roll up last month as well (month boundaries) and prune old rows"""
+        today = fields.Date.today()
+        first_of_month = today.replace(day=1)
+        previous_month = fields.Date.subtract(first_of_month, months=1)
+        self._rollup(since=fields.Datetime.to_datetime(previous_month))
+        self._prune()
+        return True
+
+    # ==================
+    # READING
+    # ==================
+
+    @api.model
+    def _get_latest(self, metric, client_ids=None):
+        """Most recent hourly value per client: {client_id: value}"""
+        query = """
+            SELECT DISTINCT ON (client_id) client_id, value
+              FROM saas_tenant_usage
+             WHERE granularity = 'hour' AND metric = %s
+        """
+        params = [metric]
+        if client_ids is not None:
+            query += " AND client_id = ANY(%s)"
+            params.append(list(client_ids))
+        query += " ORDER BY client_id, ts DESC"
+        self.env.cr.execute(query, params)
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_peak(self, metric, granularity, ts, client_ids=None):
+        """Peak value per client for one day or month period (e.g. for billing): {client_id: value}"""
+        query = """
+            SELECT client_id, value FROM saas_tenant_usage
+             WHERE metric = %s AND granularity = %s AND ts = date_trunc(%s, %s::timestamp)
+        """
+        params = [metric, granularity, granularity, ts]
+        if client_ids is not None:
+            query += " AND client_id = ANY(%s)"
+            params.append(list(client_ids))
+        self.env.cr.execute(query, params)
+        return dict(self.env.cr.fetchall())
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+
+from ..utils.container_runtime import get_runtime, ContainerNotFound
+from ..utils.db_pool import get_db_params
+from ..utils.progress import LOG_HANDLER, ProgressTracker
+from .saas_provision_job import STALE_AFTER_MINUTES, _heartbeat_loop, _progress_writer
+
+_logger = logging.getLogger(__name__)
+
+# Tenants that have a container worth upgrading (stopped ones are upgraded but stay stopped)
+UPGRADABLE_STATES = ('approved', 'active', 'suspended')
+
+
+def _module_set(module_list):
+    return {m.strip() for m in (module_list or '').split(',') if m.strip()}
+
+
+def _upgrade_tenant(runtime, spec):
+    """Stop and upgrade one tenant container, leaving it running only if it was (worker thread, no ORM).
+
+    Returns seconds spent. An image change keeps the old container, renamed, until
+    the new one exists, so a failed run can put the old one back.
+    """
+    started = time.monotonic()
+    name = spec['container_name']
+    previous = f"{name}_pre_upgrade"
+    running = spec['running']
+    if not spec['upgrade_kwargs'] and not spec['container_kwargs']:
+        return 0.0  # Nothing to install or update: the tenant keeps its state
+
+    # A crashed attempt may have left the old container renamed aside
+    if runtime.exists(previous):
+        if runtime.exists(name):
+            runtime.remove(previous, force=True)
+        else:
+            runtime.rename(previous, name)
+
+    try:
+        runtime.stop(name)
+    except ContainerNotFound:
+        pass
+
+    replaced = False
+    try:
+        if spec['upgrade_kwargs']:
+            # A crashed attempt may have left its upgrade container behind
+            try:
+                runtime.remove(spec['upgrade_container_name'], force=True)
+            except ContainerNotFound:
+                pass
+            runtime.run_to_completion(
+                name=spec['upgrade_container_name'], on_output=spec['tracker'].feed, **spec['upgrade_kwargs']
+            )
+            spec['tracker'].finish()
+        if spec['container_kwargs']:
+            # New image: the tenant container has to be recreated
+            try:
+                runtime.rename(name, previous)
+                replaced = True
+            except ContainerNotFound:
+                pass
+            if running:
+                runtime.run(**spec['container_kwargs'])
+            else:
+                runtime.create(**spec['container_kwargs'])
+        elif running:
+            runtime.start(name)
+    except Exception:
+        # Bring the tenant back on whatever it ran before, in the state it was in
+        try:
+            if replaced:
+                try:
+                    runtime.remove(name, force=True)
+                except ContainerNotFound:
+                    pass
+                runtime.rename(previous, name)
+            if running:
+                runtime.start(name)
+        except Exception as e:
+            _logger.warning(f"Could not restore {name} after failed upgrade: {e}")
+        raise
+
+    if replaced:
+        try:
+            runtime.remove(previous, force=True)
+        except Exception as e:
+            _logger.warning(f"Could not remove pre-upgrade container {previous}: {e}")
+    return time.monotonic() - started
+
+
+class SaasUpgradeBatch(models.Model):
+    _name = 'saas.upgrade.batch'
+    _description = 'SaaS Upgrade Batch'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: f"Upgrade {fields.Datetime.now()}")
+    kind = fields.Selection([
+        ('plan', 'Plan Change'),
+        ('image', 'Odoo Image'),
+    ], string='Type', default='plan', required=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='draft', required=True, index=True)
+    target_image = fields.Char(string='Target Image', help='Odoo image every tenant is moved to (image upgrades)')
+    update_modules = fields.Char(string='Modules to Update',
+                                 help="Comma-separated modules passed to -u (e.g. 'base' or 'all'); empty skips -u")
+    max_parallel = fields.Integer(string='Max Parallel Upgrades', default=4)
+    cpu_budget = fields.Float(string='CPU Budget (cores)', default=0.0,
+                              help='Cores upgrades may use on this host; 0 uses every core')
+    cpus_per_task = fields.Float(string='CPUs per Upgrade', default=1.0,
+                                 help='CPU quota given to each upgrade container')
+    wave_size = fields.Integer(string='Wave Size', default=0,
+                               help='Tenants per rolling wave; 0 runs the whole batch as one wave')
+    halt_on_failure = fields.Boolean(string='Halt on Failure', default=True,
+                                     help='Skip the remaining waves once a wave had a failure')
+    task_ids = fields.One2many('saas.upgrade.task', 'batch_id', string='Tenants')
+    task_count = fields.Integer(compute='_compute_task_stats')
+    failed_count = fields.Integer(compute='_compute_task_stats')
+    date_started = fields.Datetime(string='Started', readonly=True)
+    date_done = fields.Datetime(string='Finished', readonly=True)
+    heartbeat = fields.Datetime(string='Heartbeat', readonly=True)
+
+    @api.depends('task_ids.state')
+    def _compute_task_stats(self):
+        for batch in self:
+            batch.task_count = len(batch.task_ids)
+            batch.failed_count = len(batch.task_ids.filtered(lambda t: t.state == 'failed'))
+
+    # ==================
+    # PLANNING
+    # ==================
+
+    @api.model
+    def _create_plan_batch(self, clients):
+        """Batch moving each client to its requested upgrade plan"""
+        batch = self.create({'name': f"Plan upgrade ({len(clients)} tenants)", 'kind': 'plan'})
+        self.env['saas.upgrade.task'].create([{
+            'batch_id': batch.id,
+            'client_id': client.id,
+            'old_plan_id': client.subscription_id.id,
+            'new_plan_id': client.upgrade_plan_id.id,
+        } for client in clients])
+        return batch
+
+    def _plan_image_tasks(self):
+        """One task per upgradable tenant not already on the target image"""
+        self.ensure_one()
+        if not self.target_image:
+            raise UserError("Set the target image first.")
+        clients = self.env['saas.client'].search([
+            ('state', 'in', UPGRADABLE_STATES),
+            ('odoo_image', '!=', self.target_image),
+        ])
+        self.env['saas.upgrade.task'].create([{
+            'batch_id': self.id,
+            'client_id': client.id,
+        } for client in clients])
+
+    def _get_parallelism(self):
+        """Concurrent upgrades: the configured cap, bounded by the host CPU budget"""
+        self.ensure_one()
+        budget = self.cpu_budget or os.cpu_count() or 1
+        by_cpu = int(budget // (self.cpus_per_task or 1.0)) or 1
+        return max(min(self.max_parallel or 1, by_cpu), 1)
+
+    # ==================
+    # EXECUTION
+    # ==================
+
+    def action_start(self):
+        for batch in self.filtered(lambda b: b.state == 'draft'):
+            if batch.kind == 'image' and not batch.task_ids:
+                batch._plan_image_tasks()
+            size = batch.wave_size or len(batch.task_ids) or 1
+            for index, task in enumerate(batch.task_ids.sorted('id')):
+                task.wave = index // size + 1
+            batch.state = 'queued'
+        self.env.ref('saas_signup.ir_cron_run_upgrades')._trigger()
+        return True
+
+    @api.model
+    def _requeue_stale(self):
+        """Put back running batches whose worker stopped sending heartbeats (finished tasks are kept)"""
+        self.env.cr.execute("""
+            UPDATE saas_upgrade_batch
+               SET state = 'queued'
+             WHERE state = 'running'
+               AND COALESCE(heartbeat, date_started) < (now() at time zone 'UTC') - %s * interval '1 minute'
+         RETURNING id
+        """, (STALE_AFTER_MINUTES,))
+        requeued = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model()
+        if requeued:
+            _logger.warning(f"Requeued stale upgrade batches: {requeued}")
+        return requeued
+
+    @api.model
+    def _cron_run_batches(self):
+        """Cron: recover batches lost by crashed workers, run queued batches, committing after every wave"""
+        self._requeue_stale()
+        self.env.cr.commit()
+        for batch in self.search([('state', '=', 'queued')], order='id'):
+            batch._run()
+        return True
+
+    def _run(self):
+        self.ensure_one()
+        self.write({
+            'state': 'running',
+            'date_started': self.date_started or fields.Datetime.now(),
+            'heartbeat': fields.Datetime.now(),
+        })
+        self.env.cr.commit()
+
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=_heartbeat_loop, args=(self.env.cr.dbname, self.id, stop_heartbeat, self._table), daemon=True,
+        )
+        heartbeat.start()
+        try:
+            self._run_waves()
+        finally:
+            stop_heartbeat.set()
+
+    def _run_waves(self):
+        """Run the pending tasks wave by wave; a requeued batch resumes after its finished tasks"""
+        parallel = self._get_parallelism()
+        _logger.info(f"⬆️ Upgrade batch {self.name}: {len(self.task_ids)} tenants, {parallel} at a time")
+        halted = self.halt_on_failure and any(t.state == 'failed' for t in self.task_ids)
+        for wave in sorted(set(self.task_ids.mapped('wave'))):
+            tasks = self.task_ids.filtered(lambda t: t.wave == wave and t.state == 'pending')
+            if halted:
+                tasks.write({'state': 'skipped'})
+                continue
+            tasks._run_wave(parallel)
+            self.env.cr.commit()
+            failed = tasks.filtered(lambda t: t.state == 'failed')
+            _logger.info(f"⬆️ Wave {wave}: {len(tasks) - len(failed)}/{len(tasks)} upgraded")
+            if failed and self.halt_on_failure:
+                halted = True
+
+        self.write({
+            'state': 'failed' if self.failed_count or halted else 'done',
+            'date_done': fields.Datetime.now(),
+        })
+        if self.kind == 'image' and self.state == 'done':
+            # New tenants start on the image the whole fleet now runs
+            self.env['saas.configuration'].sudo().get_config().odoo_image = self.target_image
+        self.env.cr.commit()
+
+
+class SaasUpgradeTask(models.Model):
+    _name = 'saas.upgrade.task'
+    _description = 'SaaS Tenant Upgrade'
+    _order = 'batch_id desc, wave, id'
+    _rec_name = 'client_id'
+
+    batch_id = fields.Many2one('saas.upgrade.batch', string='Batch', required=True, index=True, ondelete='cascade')
+    client_id = fields.Many2one('saas.client', string='Client', required=True, index=True, ondelete='cascade')
+    old_plan_id = fields.Many2one('saas.subscription', string='From Plan')
+    new_plan_id = fields.Many2one('saas.subscription', string='To Plan')
+    wave = fields.Integer(string='Wave', default=1)
+    container_state = fields.Selection([
+        ('running', 'Running'),
+        ('stopped', 'Stopped'),
+    ], string='Container Before Upgrade', readonly=True,
+        help='Recorded before the upgrade; the container is left in the same state afterwards')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ], string='Status', default='pending', required=True)
+    modules_installed = fields.Char(string='Installed (-i)', readonly=True)
+    modules_updated = fields.Char(string='Updated (-u)', readonly=True)
+    progress = fields.Integer(string='Progress (%)', readonly=True)
+    progress_message = fields.Char(string='Progress Detail', readonly=True)
+    duration = fields.Float(string='Duration (s)', readonly=True, digits=(16, 1))
+    date_done = fields.Datetime(string='Finished', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+
+    def _get_module_delta(self):
+        """(modules to install, modules to update) for this tenant"""
+        self.ensure_one()
+        install = _module_set(self.new_plan_id.module_list) - _module_set(self.old_plan_id.module_list)
+        update = _module_set(self.batch_id.update_modules)
+        return sorted(install), sorted(update)
+
+    def _record_container_state(self, runtime):
+        """Remember, once, whether each tenant container is running, before the upgrade stops it"""
+        unknown = self.filtered(lambda t: not t.container_state)
+        names = {task: task.client_id.container_name or f"odoo_tenant_{task.client_id.subdomain}" for task in unknown}
+        statuses = runtime.fan_out(runtime.get, set(names.values()))
+        for task, name in names.items():
+            info, _error = statuses[name]
+            task.container_state = 'running' if info and info.status == 'running' else 'stopped'
+
+    def _build_spec(self, config, db_params):
+        """Everything the worker thread needs, resolved up front so it never touches the ORM"""
+        self.ensure_one()
+        client = self.client_id
+        batch = self.batch_id
+        install, update = self._get_module_delta()
+        image = batch.target_image if batch.kind == 'image' else (client.odoo_image or config.odoo_image or 'odoo:19')
+        container_name = client.container_name or f"odoo_tenant_{client.subdomain}"
+
+        upgrade_kwargs = None
+        if install or update:
+            command = f'odoo -d {client.database_name}'
+            if install:
+                command += f" -i {','.join(install)}"
+            if update:
+                command += f" -u {','.join(update)}"
+            upgrade_kwargs = {
+                'image': image,
+                'environment': {
+                    'HOST': db_params['host'],
+                    'PORT': str(db_params['port']),
+                    'USER': db_params['user'],
+                    'PASSWORD': db_params['password'],
+                },
+                'command': f'{command} --stop-after-init --without-demo=all {LOG_HANDLER}',
+                'network': config.docker_network or 'odoo19_odoo-network',
+                'nano_cpus': int((batch.cpus_per_task or 1.0) * 1e9),
+            }
+
+        container_kwargs = None
+        if batch.kind == 'image':
+            container_kwargs = client._tenant_container_kwargs(
+                client.database_name, client.port,
+                client.volume_name or f"odoo_tenant_{client.subdomain}_data",
+                container_name,
+                labels=client._tenant_container_labels(),
+            )
+            container_kwargs['image'] = image
+
+        return {
+            'container_name': container_name,
+            'running': self.container_state == 'running',
+            'upgrade_container_name': f"upgrade_{client.subdomain}",
+            'upgrade_kwargs': upgrade_kwargs,
+            'tracker': ProgressTracker(_progress_writer(self.env.cr.dbname, self._table, self.id)),
+            'container_kwargs': container_kwargs,
+            'modules_installed': ','.join(install),
+            'modules_updated': ','.join(update),
+        }
+
+    def _run_wave(self, parallel):
+        """Upgrade these tenants concurrently (at most `parallel` at a time) and record outcomes"""
+        if not self:
+            return
+        runtime = get_runtime()
+        # Committed before anything is stopped, so a retried wave restores the original state
+        self._record_container_state(runtime)
+        self.env.cr.commit()
+        config = self.env['saas.configuration'].sudo().get_config()
+        db_params = get_db_params()
+        specs = {task.id: task._build_spec(config, db_params) for task in self}
+
+        def run(task_id):
+            started = time.monotonic()
+            try:
+                return _upgrade_tenant(runtime, specs[task_id]), None
+            except Exception as e:
+                return time.monotonic() - started, e
+
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='saas_upgrade') as executor:
+            results = dict(zip(self.ids, executor.map(run, self.ids)))
+
+        for task in self:
+            duration, error = results[task.id]
+            spec = specs[task.id]
+            task.write({
+                'state': 'failed' if error else 'done',
+                'duration': duration,
+                'date_done': fields.Datetime.now(),
+                'error': str(error) if error else False,
+                'modules_installed': spec['modules_installed'],
+                'modules_updated': spec['modules_updated'],
+            })
+            if error:
+                _logger.error(f"❌ Upgrade failed for {task.client_id.subdomain}: {error}")
+                task.client_id.notes = f"{task.client_id.notes or ''}\n\nUpgrade error: {error}"
+            else:
+                task._apply()
+
+    def _apply(self):
+        """Record the finished upgrade on the client"""
+        self.ensure_one()
+        client = self.client_id
+        if self.batch_id.kind == 'image':
+            client.odoo_image = self.batch_id.target_image
+        elif self.new_plan_id:
+            client.write({
+                'subscription_id': self.new_plan_id.id,
+                'is_trial': False,
+                'upgrade_requested': False,
+                'upgrade_plan_id': False,
+                'notes': f"{client.notes or ''}\n\nUpgraded from {self.old_plan_id.name} to {self.new_plan_id.name} on {fields.Datetime.now()}",
+            })
+        _logger.info(f"✅ Upgrade completed for {client.subdomain} in {self.duration:.1f}s")
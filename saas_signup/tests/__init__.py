@@ -1,3 +1,11 @@
-# -*- coding: utf-8 -*-
-
-from . import test_saas_signup
\ No newline at end of file
+from . import test_saas_signup
+from . import test_provision_job
+from . import test_container_runtime
+from . import test_bulk_actions
+from . import test_readiness
+from . import test_db_pool
+from . import test_resource_monitor
+from . import test_dashboard
+from . import test_nginx_routing
+from . import test_upgrade
+from . import test_spare_pool
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase
+
+from ..utils.container_runtime import FakeRuntime, set_runtime
+
+
+class SaasTestCommon(TransactionCase):
+    """Plan and tenant factories shared by the SaaS test cases"""
+
+    @classmethod
+    def _create_plan(cls, code, **values):
+        return cls.env['saas.subscription'].create({
+            'name': f'{code.title()} Plan',
+            'code': code,
+            'is_active': True,
+            **values,
+        })
+
+    @classmethod
+    def _create_clients(cls, count, prefix='tenant', port=20000, plan=None, **overrides):
+        """Create ``count`` tenants named ``<prefix><i>`` on consecutive ports"""
+        return cls.env['saas.client'].create([{
+            'company_name': f'{prefix.title()} {i}',
+            'subdomain': f'{prefix}{i}',
+            'database_name': f'saas_{prefix}{i}',
+            'port': port + i,
+            'admin_name': 'Admin',
+            'admin_email': f'{prefix}{i}@example.com',
+            'admin_password': 'Tenant123!',
+            'subscription_id': (plan or cls.plan).id,
+            **overrides,
+        } for i in range(count)])
+
+    def _use_runtime(self, runtime=None):
+        """Install a container runtime (a fresh FakeRuntime by default) for this test"""
+        runtime = runtime or FakeRuntime()
+        previous = set_runtime(runtime)
+        self.addCleanup(set_runtime, previous)
+        self.addCleanup(runtime.shutdown)
+        return runtime
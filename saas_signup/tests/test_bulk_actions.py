@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import tempfile
+import time
+
+from odoo import fields
+from odoo.tests import tagged
+
+from ..models import saas_client
+from ..utils import readiness
+from ..utils.activity import ActivityLog, get_activity_log, set_activity_log
+from ..utils.container_runtime import FakeRuntime
+from ..utils.waiting_responder import RESPONDER_NAME, WaitingResponder, set_waiting_responder
+from .common import SaasTestCommon
+
+_logger = logging.getLogger(__name__)
+
+
+class BulkActionsCase(SaasTestCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.plan = cls._create_plan('bulk')
+
+    def _create_tenants(self, count, runtime, state='active', with_containers=True):
+        clients = self._create_clients(count, prefix='bulk', state=state)
+        if with_containers:
+            for client in clients:
+                runtime.run('odoo:19', f'odoo_tenant_{client.subdomain}')
+        return clients
+
+
+@tagged('post_install', '-at_install')
+class TestBulkActions(BulkActionsCase):
+
+    def test_bulk_suspend_reports_per_tenant_results(self):
+        runtime = self._use_runtime(FakeRuntime())
+        clients = self._create_tenants(3, runtime)
+        runtime.remove('odoo_tenant_bulk2', force=True)
+
+        action = clients.action_suspend()
+        self.assertEqual(set(clients.mapped('state')), {'suspended'})
+        self.assertEqual(runtime.get('odoo_tenant_bulk0').status, 'exited')
+        self.assertEqual(action['params']['type'], 'warning')
+        self.assertIn('bulk2', action['params']['message'])
+        self.assertIn('Suspension error', clients[2].notes)
+
+    def test_bulk_activate_skips_other_states(self):
+        runtime = self._use_runtime(FakeRuntime())
+        clients = self._create_tenants(2, runtime, state='suspended')
+        clients[1].state = 'pending'
+
+        action = clients.action_activate()
+        self.assertEqual(clients[0].state, 'active')
+        self.assertEqual(clients[1].state, 'pending')
+        self.assertIn('1 skipped', action['params']['message'])
+
+    def test_idle_tenants_hibernate_and_wake(self):
+        runtime = self._use_runtime(FakeRuntime())
+        previous = set_waiting_responder(WaitingResponder(runtime=runtime))
+        self.addCleanup(set_waiting_responder, previous)
+        previous = set_activity_log(ActivityLog(tempfile.mkdtemp(prefix='saas_activity_'), touch_interval=0))
+        self.addCleanup(set_activity_log, previous)
+        queried = []
+        self.patch(saas_client, '_last_tenant_login', lambda database_name: queried.append(database_name))
+        self.patch(readiness, 'wait_until_ready', lambda endpoints, **kwargs: 0.5)
+        self.patch(self.env.cr, 'commit', lambda: None)
+
+        self.plan.idle_hibernate_hours = 1
+        idle, busy = self._create_tenants(2, runtime)
+        (idle | busy).write({'last_login': fields.Datetime.subtract(fields.Datetime.now(), hours=3)})
+        get_activity_log().touch(busy.subdomain)
+        Client = self.env['saas.client']
+
+        # Requests are only observed in dynamic routing mode
+        Client._cron_hibernate_idle()
+        self.assertFalse(idle.hibernated)
+
+        self.env['saas.configuration'].get_config().nginx_routing_mode = 'dynamic'
+        Client._cron_hibernate_idle()
+        self.assertTrue(idle.hibernated)
+        self.assertFalse(busy.hibernated)
+        # Only the tenant idle by its traffic had its login log read
+        self.assertEqual(queried, [idle.database_name])
+        self.assertEqual(runtime.get('odoo_tenant_bulk0').status, 'exited')
+        self.assertEqual(runtime.get(RESPONDER_NAME).status, 'running')
+
+        # Visitors only schedule the wake, once however many of them arrive
+        self.assertTrue(idle._request_wake())
+        self.assertFalse(idle._request_wake())
+        self.assertFalse(busy._request_wake())
+        self.assertEqual(runtime.get('odoo_tenant_bulk0').status, 'exited')
+
+        Client._cron_wake_requested()
+        self.assertFalse(idle.hibernated)
+        self.assertFalse(idle.wake_requested_date)
+        self.assertEqual(runtime.get('odoo_tenant_bulk0').status, 'running')
+        # A concurrent wake finds the tenant awake and only waits for it
+        self.assertTrue(idle._wake())
+        self.assertEqual([op for op, name in runtime.calls if name == 'odoo_tenant_bulk0'].count('start'), 1)
+
+
+@tagged('post_install', '-at_install', '-standard', 'saas_benchmark')
+class BenchmarkBulkActions(BulkActionsCase):
+    """Wall time of bulk approve/suspend/activate against a runtime with simulated API latency.
+
+    Run with ``--test-tags saas_benchmark``.
+    """
+
+    LATENCY = 0.05  # seconds per container operation
+
+    def test_benchmark_bulk_suspend_activate(self):
+        for count in (1, 50, 500):
+            with self.subTest(tenants=count):
+                runtime = self._use_runtime(FakeRuntime(latency=self.LATENCY))
+                clients = self._create_tenants(count, runtime)
+                serial = count * self.LATENCY
+
+                started = time.monotonic()
+                clients.action_suspend()
+                suspend_time = time.monotonic() - started
+
+                started = time.monotonic()
+                clients.action_activate()
+                activate_time = time.monotonic() - started
+
+                _logger.info(
+                    f"Bulk benchmark: {count} tenants, suspend {suspend_time:.2f}s, "
+                    f"activate {activate_time:.2f}s (serial container time {serial:.2f}s)"
+                )
+                if count > runtime.max_workers:
+                    self.assertLess(suspend_time, serial)
+                    self.assertLess(activate_time, serial)
+                clients.unlink()
+
+    def test_benchmark_bulk_approve(self):
+        Client = type(self.env['saas.client'])
+        self.patch(Client, '_sync_waiting_responder', lambda self: True)
+        self.patch(Client, '_sync_nginx_routing', lambda self: True)
+        self.patch(Client, '_reset_admin_password', lambda self: True)
+        self.patch(readiness, 'wait_until_ready', lambda endpoints, **kwargs: 0.0)
+        config = self.env['saas.configuration'].get_config()
+        config.write({'deployment_mode': 'subdomain', 'nginx_routing_mode': 'map'})
+
+        for count in (1, 50, 500):
+            with self.subTest(tenants=count):
+                runtime = self._use_runtime(FakeRuntime(latency=self.LATENCY))
+                clients = self._create_tenants(count, runtime, state='pending', with_containers=False)
+                # Waiting page removal plus container creation per tenant
+                serial = count * 2 * self.LATENCY
+
+                started = time.monotonic()
+                clients.action_approve()
+                approve_time = time.monotonic() - started
+
+                _logger.info(
+                    f"Bulk benchmark: {count} tenants, approve {approve_time:.2f}s "
+                    f"(serial container time {serial:.2f}s)"
+                )
+                self.assertEqual(set(clients.mapped('state')), {'active'})
+                self.assertEqual(len(runtime.list(labels={'saas.type': 'tenant'})), count)
+                if count > runtime.max_workers:
+                    self.assertLess(approve_time, serial)
+                clients.unlink()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from ..utils.container_runtime import ContainerNotFound, get_runtime
+from .common import SaasTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestContainerRuntime(SaasTestCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.plan = cls._create_plan('runtime')
+        cls.client = cls._create_clients(1, prefix='runtime', port=8502, state='active')
+
+    def setUp(self):
+        super().setUp()
+        self.runtime = self._use_runtime()
+
+    def test_fake_runtime_is_process_wide(self):
+        self.assertIs(get_runtime(), self.runtime)
+
+    def test_async_operations(self):
+        """Async calls run on the pool and surface errors through their futures"""
+        self.runtime.run('odoo:19', 'odoo_tenant_a')
+        self.runtime.stop_async('odoo_tenant_a').result()
+        self.assertEqual(self.runtime.get('odoo_tenant_a').status, 'exited')
+        with self.assertRaises(ContainerNotFound):
+            self.runtime.start_async('missing').result()
+
+    def test_suspend_and_activate_use_runtime(self):
+        container_name = 'odoo_tenant_runtime0'
+        self.runtime.run('odoo:19', container_name)
+
+        self.client.action_suspend()
+        self.assertEqual(self.client.state, 'suspended')
+        self.assertEqual(self.runtime.get(container_name).status, 'exited')
+
+        self.client.action_activate()
+        self.assertEqual(self.client.state, 'active')
+        self.assertEqual(self.runtime.get(container_name).status, 'running')
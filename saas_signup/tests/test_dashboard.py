@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import SaasTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestDashboardSnapshot(SaasTestCommon):
+
+    def test_snapshot_served_and_refreshed_incrementally(self):
+        Dashboard = self.env['saas.dashboard']
+        self.env['saas.dashboard.snapshot'].search([]).unlink()
+
+        data = Dashboard.get_dashboard_data()
+        self.assertIn('tenants', data)
+        self.assertFalse(data['snapshot']['stale'])
+        snapshot = self.env['saas.dashboard.snapshot']._get_current()
+        self.assertEqual(len(snapshot), 1)
+
+        # Later reads come from the snapshot without recomputing
+        self.patch(type(Dashboard), '_get_tenant_stats', lambda self, aggregates=None: {'total': -1})
+        self.assertNotEqual(Dashboard.get_dashboard_data()['tenants'], {'total': -1})
+
+        # Refresh-now recomputes only the requested sections
+        revenue = snapshot.data['revenue']
+        data = Dashboard.refresh_dashboard(['tenants'])
+        self.assertEqual(data['tenants'], {'total': -1})
+        self.assertEqual(data['revenue'], revenue)
+        self.assertEqual(len(self.env['saas.dashboard.snapshot'].search([])), 1)
+
+        snapshot.computed_at = fields.Datetime.subtract(fields.Datetime.now(), hours=1)
+        self.assertTrue(Dashboard.get_dashboard_data()['snapshot']['stale'])
+
+    def test_state_aggregates_single_pass(self):
+        Client = self.env['saas.client']
+        plan = self._create_plan('agg', monthly_price=10)
+        before = Client._get_state_aggregates()
+        clients = self._create_clients(3, prefix='agg', port=22000, plan=plan, state='active',
+                                       trial_end_date=fields.Date.add(fields.Date.today(), days=3))
+        clients[2].state = 'pending'
+
+        aggregates = Client._get_state_aggregates()
+        self.assertEqual(aggregates['total'], before['total'] + 3)
+        self.assertEqual(aggregates['by_plan'][plan.id], {'active': 2, 'pending': 1})
+        self.assertEqual(
+            aggregates['by_expiry']['week'].get('active', 0),
+            before['by_expiry'].get('week', {}).get('active', 0) + 2,
+        )
+        self.assertEqual(plan.client_count, 2)
+        self.assertEqual(self.env['saas.dashboard']._get_revenue_stats(aggregates)['paying_customers'],
+                         self.env['saas.dashboard']._get_revenue_stats(before)['paying_customers'] + 2)
+
+        # Stored count follows state and plan changes of the clients
+        clients[0].state = 'suspended'
+        self.assertEqual(plan.client_count, 1)
+        other = self._create_plan('agg_other')
+        clients[1].subscription_id = other
+        self.assertEqual((plan.client_count, other.client_count), (0, 1))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+from ..utils.db_pool import ConnectionManager
+
+
+@tagged('post_install', '-at_install')
+class TestConnectionManager(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager = ConnectionManager(tenant_maxconn=1, tenant_pools=1, acquire_timeout=0.2)
+        self.addCleanup(self.manager.closeall)
+
+    def test_connections_are_reused(self):
+        for _i in range(3):
+            with self.manager.cursor() as cur:
+                cur.execute("SELECT 1")
+                self.assertEqual(cur.fetchone()[0], 1)
+        stats = self.manager.stats()
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['borrowed'], 0)
+
+    def test_tenant_pools_are_bounded(self):
+        with self.manager.cursor(self.env.cr.dbname) as cur:
+            cur.execute("SELECT 1")
+        with self.manager.cursor('template1') as cur:
+            cur.execute("SELECT 1")
+        stats = self.manager.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['closed'], 1)
+
+    def test_exhausted_pool_counts_waits(self):
+        with self.manager.connection(self.env.cr.dbname):
+            with self.assertRaises(Exception):
+                with self.manager.connection(self.env.cr.dbname):
+                    pass
+        stats = self.manager.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_close_database_waits_for_borrowers(self):
+        with self.manager.cursor(self.env.cr.dbname) as cur:
+            self.manager.close_database(self.env.cr.dbname)
+            cur.execute("SELECT 1")
+            self.assertEqual(self.manager.stats()['closed'], 0)
+        stats = self.manager.stats()
+        self.assertEqual(stats['closed'], 1)
+        self.assertEqual(stats['pools'], 0)
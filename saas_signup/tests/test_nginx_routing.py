@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+
+from odoo.tests import TransactionCase, tagged
+
+from ..utils.container_runtime import FakeRuntime, set_runtime
+from ..utils.nginx_manager import NginxManager
+from ..utils.nginx_reload import ReloadCoordinator, set_reload_coordinator
+from ..utils.routing_service import FileRouteStore, MemoryRouteStore, RoutingService
+
+
+@tagged('post_install', '-at_install')
+class TestNginxMapRouting(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config_dir = tempfile.mkdtemp(prefix='saas_nginx_')
+        self.reloads = []
+        self.patch(NginxManager, '_test_and_reload', classmethod(lambda cls: self.reloads.append(1)))
+        self.patch(NginxManager, '_detect_nginx_type', classmethod(lambda cls: 'docker'))
+        # Reload inline so each change is observable immediately
+        previous = set_reload_coordinator(ReloadCoordinator(window=0))
+        self.addCleanup(set_reload_coordinator, previous)
+
+    def _routes(self, *subdomains):
+        return [{'subdomain': s, 'port': 8100 + i, 'container_name': f'odoo_tenant_{s}'}
+                for i, s in enumerate(subdomains)]
+
+    def test_map_written_atomically_and_reloaded_on_change(self):
+        changed = NginxManager.write_tenant_map(self._routes('acme', 'beta'), 'example.com', self.config_dir)
+        self.assertTrue(changed)
+        self.assertEqual(len(self.reloads), 1)
+
+        with open(os.path.join(self.config_dir, NginxManager.TENANT_MAP_FILE)) as f:
+            content = f.read()
+        self.assertIn('acme.example.com odoo_tenant_acme:8069;', content)
+        self.assertIn('beta.example.com odoo_tenant_beta:8069;', content)
+        # No temp files left behind
+        self.assertEqual(sorted(os.listdir(self.config_dir)),
+                         sorted([NginxManager.TENANT_MAP_FILE, NginxManager.TENANT_SERVER_FILE]))
+
+        # Same routes: nothing rewritten, no reload
+        self.assertFalse(NginxManager.write_tenant_map(self._routes('acme', 'beta'), 'example.com', self.config_dir))
+        self.assertEqual(len(self.reloads), 1)
+
+        NginxManager.write_tenant_map(self._routes('acme'), 'example.com', self.config_dir)
+        self.assertEqual(len(self.reloads), 2)
+        with open(os.path.join(self.config_dir, NginxManager.TENANT_MAP_FILE)) as f:
+            self.assertNotIn('beta.example.com', f.read())
+
+    def test_dynamic_routing_changes_without_reload(self):
+        service = RoutingService(MemoryRouteStore())
+        self.assertTrue(NginxManager.write_dynamic_server(
+            'example.com', 'http://127.0.0.1:8069', self.config_dir, route_secret='s3cret'))
+        self.assertEqual(len(self.reloads), 1)
+        with open(os.path.join(self.config_dir, NginxManager.TENANT_SERVER_FILE)) as f:
+            self.assertIn('proxy_set_header X-Saas-Route-Secret "s3cret";', f.read())
+
+        service.set_routes({'acme': 'odoo_tenant_acme:8069', 'beta': 'odoo_tenant_beta:8069'})
+        self.assertEqual(service.lookup('acme.example.com:80', 'example.com'), 'odoo_tenant_acme:8069')
+        self.assertIsNone(service.lookup('acme.other.com', 'example.com'))
+        service.remove_routes(['acme'])
+        self.assertIsNone(service.lookup('acme.example.com'))
+        self.assertEqual(service.lookup('beta.example.com'), 'odoo_tenant_beta:8069')
+
+        # Server block is static: re-installing it is a no-op
+        self.assertFalse(NginxManager.write_dynamic_server(
+            'example.com', 'http://127.0.0.1:8069', self.config_dir, route_secret='s3cret'))
+        self.assertEqual(len(self.reloads), 1)
+
+    def test_file_route_store_shared_between_workers(self):
+        path = os.path.join(self.config_dir, 'routes.json')
+        writer, reader = FileRouteStore(path), FileRouteStore(path)
+        self.assertIsNone(reader.get('acme'))
+
+        writer.update(routes={'acme': '127.0.0.1:8100'})
+        self.assertEqual(reader.get('acme'), '127.0.0.1:8100')
+        writer.update(removed=['acme'], routes={'beta': '127.0.0.1:8101'})
+        self.assertEqual(reader.all(), {'beta': '127.0.0.1:8101'})
+
+
+@tagged('post_install', '-at_install')
+class TestNginxReloadCoordinator(TransactionCase):
+
+    def test_changes_in_window_share_one_reload(self):
+        reloaded = threading.Event()
+        reloads = []
+
+        def reload():
+            reloads.append(1)
+            reloaded.set()
+
+        coordinator = ReloadCoordinator(reload_fn=reload, window=0.05)
+        for subdomain in ('a1', 'a2', 'a3'):
+            coordinator.request(f"create {subdomain}")
+        # Callers return before nginx is touched
+        self.assertEqual(reloads, [])
+        self.assertEqual(coordinator.pending(), ['create a1', 'create a2', 'create a3'])
+
+        self.assertTrue(reloaded.wait(5))
+        self.assertEqual(len(reloads), 1)
+        entry = coordinator.history[-1]
+        self.assertTrue(entry['ok'])
+        self.assertEqual(entry['changes'], ['create a1', 'create a2', 'create a3'])
+
+        # A failed reload is reported with the changes it covered
+        coordinator._reload_fn = lambda: 1 / 0
+        coordinator.request('remove a1')
+        entry = coordinator.flush()
+        self.assertFalse(entry['ok'])
+        self.assertEqual(entry['changes'], ['remove a1'])
+        self.assertIsNone(coordinator.flush())
+
+    def test_reload_lost_with_worker_recovered(self):
+        marker = os.path.join(tempfile.mkdtemp(prefix='saas_nginx_'), 'reload_pending')
+        reloads = []
+        # The worker that wrote the config exits before its timer fires
+        ReloadCoordinator(reload_fn=lambda: reloads.append('lost'), window=60, marker=marker).request('create lost')
+        self.assertTrue(os.path.exists(marker))
+
+        other = ReloadCoordinator(reload_fn=lambda: reloads.append('recovered'), window=0.05, marker=marker)
+        self.assertIsNone(other.recover())  # Still within the writer's window
+        os.utime(marker, (0, 0))
+        entry = other.recover()
+        self.assertTrue(entry['ok'])
+        self.assertEqual(reloads, ['recovered'])
+        self.assertFalse(os.path.exists(marker))
+        self.assertIsNone(other.recover())
+
+    def test_failed_reload_rolls_back_bad_tenant_config(self):
+        config_dir = tempfile.mkdtemp(prefix='saas_nginx_')
+        self.patch(NginxManager, '_detect_nginx_type', classmethod(lambda cls: 'docker'))
+        self.patch(NginxManager, '_get_config_dir', classmethod(lambda cls: config_dir))
+
+        def reload():
+            # nginx -t rejects the configuration while the 'broken' tenant file is present
+            if os.path.exists(os.path.join(config_dir, 'broken.conf')):
+                raise Exception('nginx: [emerg] invalid config')
+
+        coordinator = ReloadCoordinator(reload_fn=reload, window=60)
+        previous = set_reload_coordinator(coordinator)
+        self.addCleanup(set_reload_coordinator, previous)
+        NginxManager.create_tenant_config('good', 8100, main_domain='example.com')
+        NginxManager.create_tenant_config('broken', 8101, main_domain='example.com')
+
+        entry = coordinator.flush()
+        self.assertFalse(entry['ok'])
+        self.assertEqual(entry['rolled_back'], ['create broken'])
+        self.assertEqual(os.listdir(config_dir), ['good.conf'])
+
+    def test_nginx_container_discovery_cached(self):
+        runtime = FakeRuntime()
+        previous = set_runtime(runtime)
+        self.addCleanup(set_runtime, previous)
+        self.patch(NginxManager, '_detect_nginx_type', classmethod(lambda cls: 'docker'))
+        NginxManager.configure_target(None)
+        NginxManager._invalidate_nginx_target()
+        self.addCleanup(NginxManager._invalidate_nginx_target)
+        listings = []
+        list_containers = runtime.list
+        self.patch(runtime, 'list', lambda *args, **kwargs: listings.append(1) or list_containers(*args, **kwargs))
+        runtime.run('nginx:alpine', 'proxy_nginx')
+        for i in range(5):
+            runtime.run('odoo:19.0', f'odoo_tenant_t{i}')
+
+        NginxManager._test_and_reload()
+        NginxManager._test_and_reload()
+        self.assertEqual([name for op, name in runtime.calls if op == 'exec'], ['proxy_nginx'] * 4)
+        self.assertEqual(len(listings), 1)
+
+        # A failed reload drops the cached target; the next one rediscovers
+        runtime.remove('proxy_nginx', force=True)
+        runtime.run('nginx:alpine', 'edge_nginx')
+        with self.assertRaises(Exception):
+            NginxManager._test_and_reload()
+        NginxManager._test_and_reload()
+        self.assertEqual(runtime.calls[-1], ('exec', 'edge_nginx'))
+
+        # A configured container skips discovery entirely
+        NginxManager.configure_target('pinned_nginx')
+        self.addCleanup(NginxManager.configure_target, None)
+        runtime.run('nginx:alpine', 'pinned_nginx')
+        NginxManager._test_and_reload()
+        self.assertEqual(runtime.calls[-1], ('exec', 'pinned_nginx'))
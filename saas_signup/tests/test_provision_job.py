@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from ..utils.container_runtime import FakeRuntime
+from ..utils.progress import ProgressTracker
+from ..utils.waiting_responder import RESPONDER_NAME, WaitingResponder, set_waiting_responder
+from .common import SaasTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestProvisionJob(SaasTestCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.plan = cls._create_plan('queue')
+        cls.client = cls._create_clients(1, prefix='queuetest', port=8501)
+
+    def test_claim_oldest_pending_job(self):
+        """Claiming marks the oldest pending job running and counts the attempt"""
+        Job = self.env['saas.provision.job']
+        first = Job.enqueue(self.client)
+        second = Job.enqueue(self.client)
+
+        claimed = Job._claim_next()
+        self.assertEqual(claimed, first)
+        self.assertEqual(claimed.state, 'running')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(second.state, 'pending')
+
+    def test_resume_after_last_finished_step(self):
+        """A job only runs the steps after its checkpoint"""
+        job = self.env['saas.provision.job'].enqueue(self.client)
+        job.last_step = 'set_admin'
+        executed = []
+        for step in ('create_db', 'install_modules', 'set_admin', 'create_volume', 'waiting_container'):
+            self.patch(type(job), f'_step_{step}', lambda self, client, step=step: executed.append(step))
+        self.patch(self.env.cr, 'commit', lambda: None)
+
+        job._run()
+        self.assertEqual(executed, ['create_volume', 'waiting_container'])
+        self.assertEqual(job.state, 'done')
+
+    def test_auto_approve_on_completion(self):
+        """A job queued with auto_approve hands its client to the approval cron, which approves it once"""
+        Job = self.env['saas.provision.job']
+        job = Job.enqueue(self.client, last_step='waiting_container', auto_approve=True)
+        approved = []
+        self.patch(type(self.client), 'action_approve', lambda records: approved.append(records.id))
+        self.patch(self.env.cr, 'commit', lambda: None)
+
+        job._run()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(approved, [])
+
+        Job._cron_auto_approve()
+        Job._cron_auto_approve()
+        self.assertEqual(approved, [self.client.id])
+        self.assertFalse(job.auto_approve)
+
+    def test_retry_detects_uncommitted_template_clone(self):
+        """A retried create_db step on an already initialized database skips the module install"""
+        client = self.client.copy({'subdomain': 'queueclone', 'database_name': self.env.cr.dbname, 'port': 8503})
+        job = self.env['saas.provision.job'].enqueue(client)
+        job._step_create_db(client)
+        self.assertTrue(job.from_template)
+
+    def test_requeue_stale_running_job(self):
+        """Jobs whose worker stopped heartbeating go back to the queue"""
+        job = self.env['saas.provision.job'].enqueue(self.client)
+        self.env.cr.execute(
+            "UPDATE saas_provision_job SET state = 'running', heartbeat = now() - interval '1 hour' WHERE id = %s",
+            (job.id,)
+        )
+        self.assertIn(job.id, job._requeue_stale())
+        self.assertEqual(job.state, 'pending')
+
+    def test_module_install_progress_streamed(self):
+        """Install output is parsed line by line into progress, weighted into the job's overall progress"""
+        runtime = self._use_runtime()
+        runtime.outputs['init_queuetest'] = [
+            'INFO saas_queuetest0 odoo.modules.loading: loading 1 modules...',
+            'DEBUG saas_queuetest0 odoo.modules.loading: Loading module base (1/1)',
+            'DEBUG saas_queuetest0 odoo.modules.loading: Loading module base (1/40)',
+            'DEBUG saas_queuetest0 odoo.modules.loading: Loading module crm (30/40)',
+            'DEBUG saas_queuetest0 odoo.modules.loading: Loading module crm (2/45)',
+            'INFO saas_queuetest0 odoo.modules.loading: 40 modules loaded in 12.00s, 0 queries',
+        ]
+        snapshots = []
+        tracker = ProgressTracker(snapshots.append, min_interval=0)
+        self.env['saas.provision.job']._run_module_install('saas_queuetest0', 'crm', 'init_queuetest', on_output=tracker.feed)
+        tracker.finish()
+        percents = [snapshot['percent'] for snapshot in snapshots]
+        # The base-only pass is not reported, and the bar never moves backwards
+        self.assertEqual(percents, sorted(percents))
+        self.assertEqual(percents, [2, 75, 75, 100])
+        self.assertEqual(snapshots[1]['message'], 'Loading crm (30/40)')
+
+        job = self.env['saas.provision.job'].enqueue(self.client)
+        job.write({'state': 'running', 'last_step': 'create_db', 'progress': 50})
+        progress = job._get_progress()
+        self.assertEqual(progress['percent'], 45)
+        self.assertEqual(progress['step'], 'Install Modules')
+
+    def test_pending_tenants_share_one_waiting_responder(self):
+        """The waiting step adds the tenant port to one shared responder instead of starting a container"""
+        runtime = FakeRuntime()
+        previous = set_waiting_responder(WaitingResponder(runtime=runtime))
+        self.addCleanup(set_waiting_responder, previous)
+        other = self.client.copy({'subdomain': 'queuetest1', 'database_name': 'saas_queuetest1', 'port': 8502})
+        job = self.env['saas.provision.job'].enqueue(self.client)
+
+        job._step_waiting_container(self.client)
+        job._step_waiting_container(other)
+        self.assertEqual([c.name for c in runtime.list()], [RESPONDER_NAME])
+        self.assertEqual(runtime.containers[RESPONDER_NAME]['kwargs']['network_mode'], 'host')
+        self.assertIn(('exec', RESPONDER_NAME), runtime.calls)
+
+        other.state = 'approved'
+        ports = self.env['saas.client']._sync_waiting_responder()
+        self.assertIn(8501, ports)
+        self.assertNotIn(8502, ports)
+
+        # Rejecting frees the port at once, without touching tenant containers
+        self.client.action_reject()
+        self.assertFalse(self.client.port)
+        self.assertNotIn(8501, self.env['saas.client']._sync_waiting_responder())
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import http.server
+import socket
+import threading
+
+from odoo.tests import TransactionCase, tagged
+
+from ..utils import readiness
+
+
+class _HealthHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200 if self.path == readiness.HEALTH_PATH else 404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@tagged('post_install', '-at_install')
+class TestReadiness(TransactionCase):
+
+    def _free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def test_ready_when_health_answers(self):
+        server = http.server.HTTPServer(('127.0.0.1', 0), _HealthHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        port = server.server_address[1]
+
+        self.assertTrue(readiness.probe('127.0.0.1', port))
+        self.assertTrue(readiness.probe('127.0.0.1', port, path=None))
+        self.assertIsNotNone(readiness.wait_until_ready([('127.0.0.1', port, readiness.HEALTH_PATH)], deadline=2))
+
+    def test_deadline_when_nothing_listens(self):
+        endpoints = [('127.0.0.1', self._free_port(), readiness.HEALTH_PATH)]
+        self.assertIsNone(readiness.wait_until_ready(endpoints, deadline=0.3, initial_delay=0.05))
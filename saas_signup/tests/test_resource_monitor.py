@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import SaasTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestResourceMonitor(SaasTestCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.plan = cls._create_plan('monitor', max_users=3, storage_limit=1)
+        cls.clients = cls._create_clients(3, prefix='monitor', port=21000, state='active')
+
+    def test_batched_usage_update_and_enforcement(self):
+        runtime = self._use_runtime()
+
+        Cron = self.env['saas.cron']
+        sizes = {'saas_monitor0': 12.5, 'saas_monitor1': 2048.0}
+        users = {'saas_monitor0': 2, 'saas_monitor1': 5}
+        self.patch(type(Cron), '_get_database_sizes', lambda self, names: sizes)
+        self.patch(type(Cron), '_get_user_counts', lambda self, names: users)
+
+        Cron.monitor_resource_limits()
+
+        first, second, third = self.clients
+        self.assertEqual(first.storage_used_mb, 12.5)
+        self.assertEqual(first.user_count, 2)
+        self.assertTrue(first.usage_date)
+        self.assertEqual(first.state, 'active')
+        # Over the 1 GB plan limit: suspended in one batch
+        self.assertEqual(second.state, 'suspended')
+        # Unreachable tenant database keeps its previous user count
+        self.assertEqual(third.user_count, 0)
+
+        # Samples land in the usage time series with current roll-ups
+        Usage = self.env['saas.tenant.usage']
+        self.assertEqual(Usage._get_latest('storage_mb', first.ids), {first.id: 12.5})
+        self.assertEqual(Usage.search_count([
+            ('client_id', '=', first.id), ('metric', '=', 'users'), ('granularity', '=', 'month'),
+        ]), 1)
+
+    def test_usage_rollup_and_prune(self):
+        Usage = self.env['saas.tenant.usage']
+        client = self.clients[0]
+        now = fields.Datetime.now().replace(minute=0, second=0, microsecond=0)
+        old = fields.Datetime.subtract(now, days=30)
+        Usage.create([
+            {'client_id': client.id, 'metric': 'storage_mb', 'granularity': 'hour', 'ts': ts, 'value': value}
+            for ts, value in ((old, 5.0), (fields.Datetime.subtract(now, hours=1), 7.0), (now, 6.0))
+        ])
+
+        Usage._rollup(since=old)
+        daily = Usage._get_peak('storage_mb', 'day', now, client.ids)
+        self.assertEqual(daily[client.id], 7.0 if now.hour else 6.0)
+        # Re-running the roll-up updates rows in place
+        Usage._rollup(since=old)
+        self.assertEqual(Usage.search_count([
+            ('client_id', '=', client.id), ('granularity', '=', 'day'), ('ts', '=', old.replace(hour=0)),
+        ]), 1)
+
+        Usage._prune()
+        hourly = Usage.search([('client_id', '=', client.id), ('granularity', '=', 'hour')])
+        self.assertEqual(len(hourly), 2)
+        self.assertTrue(Usage.search_count([('client_id', '=', client.id), ('granularity', '=', 'day')]))
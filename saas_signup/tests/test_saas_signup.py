@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from unittest.mock import patch
+
 from odoo.tests import TransactionCase, tagged
 
 
@@ -70,4 +72,32 @@ class TestSaaSSignup(TransactionCase):
         })
 
         response = self.url_open(f'/saas/signup/success?client_id={client.id}')
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+    def test_config_cached_until_changed(self):
+        """Configuration lookup is memoized and invalidated on write"""
+        Config = self.env['saas.configuration']
+        config = Config.get_config()
+        snapshot = Config.get_config_snapshot()
+        with self.assertQueryCount(0):
+            self.assertEqual(Config.get_config(), config)
+            self.assertIs(Config.get_config_snapshot(), snapshot)
+        with self.assertRaises(TypeError):
+            snapshot['docker_network'] = 'other'
+
+        config.write({'docker_network': 'saas_cache_test'})
+        self.assertEqual(Config.get_config_snapshot()['docker_network'], 'saas_cache_test')
+
+    def test_tenant_urls_without_dns(self):
+        """Bulk tenant URLs use the cached host address, never resolving per call"""
+        config = self.env['saas.configuration'].get_config()
+        config.write({'deployment_mode': 'localhost', 'main_domain': '203.0.113.7'})
+        config.host_ip = '203.0.113.7'
+        clients = self.env['saas.client'].new({'subdomain': 'urlone', 'port': 8101}) \
+            | self.env['saas.client'].new({'subdomain': 'urltwo', 'port': 8102})
+        with patch('socket.gethostbyname', side_effect=AssertionError('DNS lookup')):
+            urls = config.generate_tenant_urls(clients)
+            self.assertEqual(config.generate_tenant_url('urlone', 8101), 'http://203.0.113.7:8101')
+            # The list view reads the same bulk URLs through the computed field
+            self.assertEqual(clients.mapped('tenant_url'), ['http://203.0.113.7:8101', 'http://203.0.113.7:8102'])
+            self.assertEqual(clients[1].get_tenant_url(), 'http://203.0.113.7:8102')
+        self.assertEqual(sorted(urls.values()), ['http://203.0.113.7:8101', 'http://203.0.113.7:8102'])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+
+from odoo.tests import tagged
+
+from ..models import saas_client, saas_spare_tenant
+from .common import SaasTestCommon
+
+
+class _FakePool:
+    """Connection manager standing in for the PostgreSQL server in spare tests"""
+
+    def __init__(self, fail_clone=False):
+        self.fail_clone = fail_clone
+        self.statements = []
+
+    def close_database(self, database_name):
+        pass
+
+    @contextmanager
+    def cursor(self, database_name=None):
+        pool = self
+
+        class _Cursor:
+            def execute(self, query, params=None):
+                statement = str(query)
+                if pool.fail_clone and 'TEMPLATE' in statement:
+                    raise RuntimeError('template is being accessed by other users')
+                pool.statements.append(statement)
+
+        yield _Cursor()
+
+
+@tagged('post_install', '-at_install')
+class TestSparePool(SaasTestCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.plan = cls._create_plan('spare')
+
+    def setUp(self):
+        super().setUp()
+        self.runtime = self._use_runtime()
+        self.patch(self.env.cr, 'commit', lambda: None)
+        self.patch(self.env.cr, 'rollback', lambda: None)
+        self.patch(saas_client, 'get_db_params', lambda: {
+            'host': 'db', 'port': 5432, 'user': 'odoo', 'password': 'odoo',
+        })
+
+    def test_failed_spare_gives_resources_back(self):
+        pool = _FakePool(fail_clone=True)
+        self.patch(saas_spare_tenant, 'get_connection_manager', lambda: pool)
+        Spare = self.env['saas.spare.tenant']
+
+        spare = Spare._build_spare(self.plan)
+        self.assertFalse(spare.exists())
+        self.assertTrue(any('DROP DATABASE' in statement for statement in pool.statements))
+        self.assertFalse(self.env['saas.port.allocator'].search([('owner', 'like', 'spare:%'), ('state', '!=', 'free')]))
+
+    def test_claimed_container_handed_over_after_commit(self):
+        self.patch(saas_spare_tenant, 'get_connection_manager', lambda: _FakePool())
+        spare = self.env['saas.spare.tenant']._build_spare(self.plan)
+        self.assertEqual(spare.state, 'ready')
+
+        client = self._create_clients(1, prefix='spareco', port=spare.port, database_name=spare.database_name)
+        spare._assign_to(client)
+        # Nothing touches the spare container before the signup is committed
+        self.assertEqual(self.runtime.get(spare.container_name).status, 'created')
+        self.assertFalse(self.runtime.exists('odoo_tenant_spareco0'))
+
+        self.patch(saas_spare_tenant, 'Registry', lambda dbname: self.registry)
+        self.env.cr.postcommit.run()
+        self.assertFalse(self.runtime.exists(spare.container_name))
+        container = self.runtime.get('odoo_tenant_spareco0')
+        self.assertEqual(container.labels['saas.tenant'], 'spareco0')
+        self.assertNotIn('saas.spare', container.labels)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from .common import SaasTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestUpgradeBatch(SaasTestCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.basic = cls._create_plan('upg_basic', module_list='base,crm')
+        cls.pro = cls._create_plan('upg_pro', module_list='base,crm,sale,stock')
+        cls.clients = cls._create_clients(3, prefix='upgrade', port=8600, plan=cls.basic, state='active',
+                                          upgrade_requested=True, upgrade_plan_id=cls.pro.id)
+
+    def setUp(self):
+        super().setUp()
+        self.runtime = self._use_runtime()
+        for client in self.clients:
+            self.runtime.run('odoo:19', f'odoo_tenant_{client.subdomain}')
+        self.patch(self.env.cr, 'commit', lambda: None)
+
+    def test_plan_upgrade_installs_only_new_modules(self):
+        commands = []
+        run_to_completion = self.runtime.run_to_completion
+        self.patch(self.runtime, 'run_to_completion',
+                   lambda image, name, **kwargs: commands.append(kwargs['command']) or run_to_completion(image, name, **kwargs))
+
+        batch = self.env['saas.upgrade.batch']._create_plan_batch(self.clients)
+        batch.write({'max_parallel': 2, 'wave_size': 2})
+        batch.action_start()
+        self.assertEqual(batch.task_ids.mapped('wave'), [1, 1, 2])
+        batch._run()
+
+        self.assertEqual(batch.state, 'done')
+        self.assertEqual(len(commands), 3)
+        self.assertTrue(all(' -i sale,stock ' in command and ' -u ' not in command for command in commands))
+        self.assertEqual(set(batch.task_ids.mapped('state')), {'done'})
+        self.assertEqual(self.clients.mapped('subscription_id'), self.pro)
+        self.assertFalse(any(self.clients.mapped('upgrade_requested')))
+        self.assertEqual(self.runtime.get('odoo_tenant_upgrade0').status, 'running')
+
+    def test_failed_wave_halts_rolling_image_upgrade(self):
+        self.runtime.remove('odoo_tenant_upgrade0', force=True)
+        pull_failed = lambda **kwargs: (_ for _ in ()).throw(RuntimeError('pull failed'))
+        self.patch(self.runtime, 'run', pull_failed)
+        self.patch(self.runtime, 'create', pull_failed)
+
+        batch = self.env['saas.upgrade.batch'].create({
+            'name': 'Image bump', 'kind': 'image', 'target_image': 'odoo:19.1', 'wave_size': 1,
+        })
+        batch.task_ids = [(0, 0, {'client_id': client.id}) for client in self.clients]
+        batch.action_start()
+        batch._run()
+
+        self.assertEqual(batch.state, 'failed')
+        self.assertEqual(batch.task_ids.mapped('state'), ['failed', 'skipped', 'skipped'])
+        self.assertIn('pull failed', batch.task_ids[0].error)
+        self.assertFalse(self.clients[1].odoo_image)
+
+    def test_image_upgrade_keeps_container_state_and_restores_old_container(self):
+        self.runtime.stop('odoo_tenant_upgrade1')
+        Batch = self.env['saas.upgrade.batch']
+        batch = Batch.create({'name': 'Image bump', 'kind': 'image', 'target_image': 'odoo:19.1'})
+        batch.task_ids = [(0, 0, {'client_id': client.id}) for client in self.clients[:2]]
+        batch.action_start()
+        batch._run()
+
+        self.assertEqual(batch.state, 'done')
+        self.assertEqual(batch.task_ids.mapped('container_state'), ['running', 'stopped'])
+        self.assertEqual(self.runtime.get('odoo_tenant_upgrade0').status, 'running')
+        # A stopped (suspended, hibernated) tenant is recreated without being started
+        self.assertEqual(self.runtime.get('odoo_tenant_upgrade1').status, 'created')
+        self.assertFalse(self.runtime.exists('odoo_tenant_upgrade0_pre_upgrade'))
+        # Containers recreated later (approval, waking) keep the upgraded image
+        client = self.clients[0]
+        kwargs = client._tenant_container_kwargs(client.database_name, client.port, 'volume', 'container', labels={})
+        self.assertEqual(kwargs['image'], 'odoo:19.1')
+
+        # The new container cannot start: the old one is renamed back and restarted
+        old_id = self.runtime.get('odoo_tenant_upgrade0').id
+        self.patch(self.runtime, 'run', lambda **kwargs: (_ for _ in ()).throw(RuntimeError('port in use')))
+        batch = Batch.create({'name': 'Image bump 2', 'kind': 'image', 'target_image': 'odoo:19.2'})
+        batch.task_ids = [(0, 0, {'client_id': self.clients[0].id})]
+        batch.action_start()
+        batch._run()
+        self.assertEqual(batch.state, 'failed')
+        container = self.runtime.get('odoo_tenant_upgrade0')
+        self.assertEqual((container.id, container.status), (old_id, 'running'))
+
+        # A batch whose worker died is picked up again
+        self.env.cr.execute(
+            "UPDATE saas_upgrade_batch SET state = 'running', heartbeat = now() - interval '1 hour' WHERE id = %s",
+            (batch.id,)
+        )
+        self.assertIn(batch.id, Batch._requeue_stale())
@@ -1 +1,9 @@
+from . import container_runtime
+from . import db_pool
+from . import readiness
+from . import progress
+from . import activity
+from . import waiting_responder
+from . import nginx_reload
+from . import routing_service
 from . import nginx_manager
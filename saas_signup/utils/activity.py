@@ -0,0 +1,82 @@
+"""
+Tenant Activity Log for SaaS Multi-Tenancy
+Last time each tenant received traffic, recorded from the routing hook.
+
+Every request nginx routes through ``/saas/route`` touches one marker file
+per subdomain (its mtime is the last activity), at most once per
+``TOUCH_INTERVAL`` per worker. Markers live in a directory shared by all
+workers on the host, so the idle-hibernation cron sees traffic handled by
+any of them without a database write per request.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+_logger = logging.getLogger(__name__)
+
+ACTIVITY_DIR = 'saas_activity'
+TOUCH_INTERVAL = 60  # seconds between two marker updates for the same tenant
+
+
+class ActivityLog:
+    """subdomain -> last request time, backed by marker file mtimes"""
+
+    def __init__(self, directory, touch_interval=TOUCH_INTERVAL):
+        self.directory = directory
+        self.touch_interval = touch_interval
+        self._touched = {}
+        self._lock = threading.Lock()
+
+    def _path(self, subdomain):
+        return os.path.join(self.directory, os.path.basename(subdomain))
+
+    def touch(self, subdomain):
+        """Record a request for this tenant (cheap: throttled per worker)"""
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(subdomain, 0) < self.touch_interval:
+                return
+            self._touched[subdomain] = now
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(subdomain)
+            with open(path, 'a'):
+                os.utime(path, (now, now))
+        except OSError as e:
+            _logger.warning(f"Could not record activity for {subdomain}: {e}")
+
+    def last_seen(self, subdomains):
+        """{subdomain: naive UTC datetime} for the tenants that had traffic"""
+        seen = {}
+        for subdomain in subdomains:
+            try:
+                mtime = os.stat(self._path(subdomain)).st_mtime
+            except OSError:
+                continue
+            seen[subdomain] = datetime.fromtimestamp(mtime, timezone.utc).replace(tzinfo=None)
+        return seen
+
+
+_activity_log = None
+_activity_log_lock = threading.Lock()
+
+
+def get_activity_log():
+    """Process-wide activity log in the Odoo data directory"""
+    global _activity_log
+    with _activity_log_lock:
+        if _activity_log is None:
+            from odoo.tools import config
+            _activity_log = ActivityLog(os.path.join(config['data_dir'], ACTIVITY_DIR))
+        return _activity_log
+
+
+def set_activity_log(activity_log):
+    """Swap the process-wide activity log; returns the previous one"""
+    global _activity_log
+    with _activity_log_lock:
+        previous, _activity_log = _activity_log, activity_log
+    return previous
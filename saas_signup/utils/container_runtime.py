@@ -0,0 +1,429 @@
+"""
+Container Runtime Adapter for SaaS Multi-Tenancy
+Process-wide access to the container engine used for tenant containers.
+
+All tenant container operations go through ``get_runtime()``. The default
+runtime talks to Docker through a single pooled client with timeouts and
+retry/backoff; ``FakeRuntime`` keeps containers in memory so the lifecycle
+code can be exercised without a Docker daemon (``set_runtime(FakeRuntime())``).
+"""
+
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60        # seconds per Docker API call
+DEFAULT_RETRIES = 3         # attempts for transient API errors
+DEFAULT_BACKOFF = 0.5       # seconds, doubled on every retry
+DEFAULT_MAX_WORKERS = 8     # threads backing the async API
+DEFAULT_POOL_SIZE = 16      # HTTP connections kept open to the daemon
+OUTPUT_TAIL_LINES = 200     # lines of a streamed one-shot run kept for error reports
+
+ContainerInfo = namedtuple('ContainerInfo', ['id', 'name', 'status', 'labels', 'attrs'])
+
+
+class ContainerNotFound(Exception):
+    """The requested container or volume does not exist"""
+
+
+class ContainerRuntimeError(Exception):
+    """A container operation failed after retries"""
+
+
+class ContainerRuntime:
+    """Base runtime: synchronous primitives plus a thread-pool backed async API"""
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    # Synchronous primitives, implemented by subclasses
+    def get(self, name):
+        raise NotImplementedError
+
+    def list(self, labels=None, all=True):
+        raise NotImplementedError
+
+    def run(self, image, name, **kwargs):
+        """Start a detached container and return its ContainerInfo"""
+        raise NotImplementedError
+
+    def run_to_completion(self, image, name, timeout=3600, on_output=None, **kwargs):
+        """Run a one-shot container, wait for it, remove it and return its output.
+
+        With ``on_output`` every log line is passed to it while the container runs
+        and only the last lines are returned.
+        """
+        raise NotImplementedError
+
+    def create(self, image, name, **kwargs):
+        raise NotImplementedError
+
+    def start(self, name):
+        raise NotImplementedError
+
+    def stop(self, name, timeout=10):
+        raise NotImplementedError
+
+    def remove(self, name, force=False):
+        raise NotImplementedError
+
+    def rename(self, name, new_name):
+        raise NotImplementedError
+
+    def exec(self, name, cmd):
+        """Run a command in a container, return (exit_code, output)"""
+        raise NotImplementedError
+
+    def create_volume(self, name):
+        raise NotImplementedError
+
+    def remove_volume(self, name):
+        raise NotImplementedError
+
+    def exists(self, name):
+        try:
+            self.get(name)
+            return True
+        except ContainerNotFound:
+            return False
+
+    # Async API
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='saas_container'
+                )
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def start_async(self, name):
+        return self.submit(self.start, name)
+
+    def stop_async(self, name, timeout=10):
+        return self.submit(self.stop, name, timeout)
+
+    def run_async(self, image, name, **kwargs):
+        return self.submit(self.run, image, name, **kwargs)
+
+    def remove_async(self, name, force=False):
+        return self.submit(self.remove, name, force)
+
+    def fan_out(self, fn, items):
+        """Run fn(item) for every item on the pool.
+
+        Returns {item: (result, error)} once all calls finished; concurrency is
+        bounded by the pool size.
+        """
+        futures = {item: self.submit(fn, item) for item in items}
+        results = {}
+        for item, future in futures.items():
+            try:
+                results[item] = (future.result(), None)
+            except Exception as e:
+                results[item] = (None, e)
+        return results
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+class DockerRuntime(ContainerRuntime):
+    """Docker engine runtime sharing one pooled client across the process"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 max_workers=DEFAULT_MAX_WORKERS, pool_size=DEFAULT_POOL_SIZE):
+        super().__init__(max_workers=max_workers)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                import docker
+                self._client = docker.from_env(timeout=self.timeout, max_pool_size=self.pool_size)
+            return self._client
+
+    def _reset_client(self):
+        with self._client_lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception:
+                    pass
+                self._client = None
+
+    def _call(self, operation, fn):
+        """Run a Docker call with retry/backoff on transient failures"""
+        import docker
+        import requests
+
+        delay = self.backoff
+        for attempt in range(1, self.retries + 1):
+            try:
+                return fn(self.client)
+            except docker.errors.NotFound as e:
+                raise ContainerNotFound(str(e)) from e
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # Daemon restarted or socket went stale: reconnect before retrying
+                self._reset_client()
+                error = e
+            except docker.errors.APIError as e:
+                if not e.is_server_error():
+                    raise ContainerRuntimeError(f"{operation}: {e}") from e
+                error = e
+            except docker.errors.DockerException as e:
+                raise ContainerRuntimeError(f"{operation}: {e}") from e
+            if attempt < self.retries:
+                _logger.warning(f"Docker {operation} failed (attempt {attempt}/{self.retries}): {error}")
+                time.sleep(delay)
+                delay *= 2
+        raise ContainerRuntimeError(f"{operation}: {error}") from error
+
+    @staticmethod
+    def _info(container):
+        return ContainerInfo(container.id, container.name, container.status, container.labels, container.attrs)
+
+    def get(self, name):
+        return self._call(f"get {name}", lambda c: self._info(c.containers.get(name)))
+
+    def list(self, labels=None, all=True):
+        filters = {'label': [f"{k}={v}" for k, v in labels.items()]} if labels else None
+        return self._call('list', lambda c: [self._info(x) for x in c.containers.list(all=all, filters=filters)])
+
+    def run(self, image, name, **kwargs):
+        kwargs['detach'] = True
+        return self._call(f"run {name}", lambda c: self._info(c.containers.run(image, name=name, **kwargs)))
+
+    def run_to_completion(self, image, name, timeout=3600, on_output=None, **kwargs):
+        container = self._call(f"run {name}", lambda c: c.containers.run(image, name=name, detach=True, **kwargs))
+        try:
+            if on_output is not None:
+                output = self._stream_output(container, name, on_output)
+            result = container.wait(timeout=timeout)
+            if on_output is None:
+                output = container.logs(stdout=True, stderr=True)
+        finally:
+            try:
+                container.remove(force=True)
+            except Exception as e:
+                _logger.warning(f"Could not remove one-shot container {name}: {e}")
+        status = result.get('StatusCode', 1)
+        if status != 0:
+            tail = output[-2000:].decode(errors='replace')
+            raise ContainerRuntimeError(f"{name} exited with status {status}: {tail}")
+        return output
+
+    @staticmethod
+    def _stream_output(container, name, on_output):
+        """Feed log lines to on_output as they arrive; returns the tail of the output"""
+        tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        pending = b''
+        try:
+            for chunk in container.logs(stream=True, follow=True, stdout=True, stderr=True):
+                pending += chunk
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    tail.append(line)
+                    try:
+                        on_output(line.decode(errors='replace'))
+                    except Exception as e:
+                        _logger.warning(f"Output handler failed for {name}: {e}")
+        except Exception as e:
+            # Losing the stream must not lose the run: wait() still reports the exit status
+            _logger.warning(f"Log stream of {name} interrupted: {e}")
+        if pending:
+            tail.append(pending)
+        return b'\n'.join(tail)
+
+    def create(self, image, name, **kwargs):
+        return self._call(f"create {name}", lambda c: self._info(c.containers.create(image, name=name, **kwargs)))
+
+    def start(self, name):
+        return self._call(f"start {name}", lambda c: c.containers.get(name).start())
+
+    def stop(self, name, timeout=10):
+        return self._call(f"stop {name}", lambda c: c.containers.get(name).stop(timeout=timeout))
+
+    def remove(self, name, force=False):
+        return self._call(f"remove {name}", lambda c: c.containers.get(name).remove(force=force))
+
+    def rename(self, name, new_name):
+        return self._call(f"rename {name}", lambda c: c.containers.get(name).rename(new_name))
+
+    def exec(self, name, cmd):
+        def _exec(c):
+            result = c.containers.get(name).exec_run(cmd)
+            return result.exit_code, result.output
+        return self._call(f"exec {name}", _exec)
+
+    def create_volume(self, name):
+        return self._call(f"create volume {name}", lambda c: c.volumes.create(name=name).name)
+
+    def remove_volume(self, name):
+        return self._call(f"remove volume {name}", lambda c: c.volumes.get(name).remove())
+
+
+class FakeRuntime(ContainerRuntime):
+    """In-memory runtime for tests and benchmarks.
+
+    ``latency`` (seconds) is added to every container operation to mimic the
+    cost of Docker API round trips; ``calls`` records every operation and
+    ``outputs`` scripts the log lines of one-shot containers.
+    """
+
+    def __init__(self, latency=0.0, max_workers=DEFAULT_MAX_WORKERS):
+        super().__init__(max_workers=max_workers)
+        self.latency = latency
+        self.containers = {}
+        self.volumes = set()
+        self.calls = []
+        self.outputs = {}  # one-shot container name -> log lines it prints
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _op(self, operation, name):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls.append((operation, name))
+
+    def _get(self, name):
+        with self._lock:
+            container = self.containers.get(name)
+        if container is None:
+            raise ContainerNotFound(f"No such container: {name}")
+        return container
+
+    def _add(self, image, name, status, kwargs):
+        with self._lock:
+            if name in self.containers:
+                raise ContainerRuntimeError(f"Conflict: container name {name} is already in use")
+            container_id = f"{next(self._ids):04d}{uuid.uuid4().hex}"
+            self.containers[name] = {
+                'id': container_id,
+                'name': name,
+                'image': image,
+                'status': status,
+                'labels': dict(kwargs.get('labels') or {}),
+                'attrs': {'Config': {'Image': image}, 'NetworkSettings': {'Networks': {}}},
+                'kwargs': kwargs,
+            }
+        return self.get(name)
+
+    def get(self, name):
+        c = self._get(name)
+        return ContainerInfo(c['id'], c['name'], c['status'], c['labels'], c['attrs'])
+
+    def list(self, labels=None, all=True):
+        with self._lock:
+            containers = list(self.containers.values())
+        return [
+            ContainerInfo(c['id'], c['name'], c['status'], c['labels'], c['attrs'])
+            for c in containers
+            if (all or c['status'] == 'running')
+            and _labels_match(c['labels'], labels)
+        ]
+
+    def run(self, image, name, **kwargs):
+        self._op('run', name)
+        return self._add(image, name, 'running', kwargs)
+
+    def run_to_completion(self, image, name, timeout=3600, on_output=None, **kwargs):
+        self._op('run_to_completion', name)
+        lines = self.outputs.get(name, [])
+        if on_output is not None:
+            for line in lines:
+                on_output(line)
+        return '\n'.join(lines).encode()
+
+    def create(self, image, name, **kwargs):
+        self._op('create', name)
+        return self._add(image, name, 'created', kwargs)
+
+    def start(self, name):
+        self._op('start', name)
+        self._get(name)['status'] = 'running'
+
+    def stop(self, name, timeout=10):
+        self._op('stop', name)
+        self._get(name)['status'] = 'exited'
+
+    def remove(self, name, force=False):
+        self._op('remove', name)
+        container = self._get(name)
+        if container['status'] == 'running' and not force:
+            raise ContainerRuntimeError(f"Cannot remove running container {name}")
+        with self._lock:
+            self.containers.pop(name, None)
+
+    def rename(self, name, new_name):
+        self._op('rename', name)
+        with self._lock:
+            container = self.containers.pop(name, None)
+            if container is None:
+                raise ContainerNotFound(f"No such container: {name}")
+            container['name'] = new_name
+            self.containers[new_name] = container
+
+    def exec(self, name, cmd):
+        self._op('exec', name)
+        self._get(name)
+        return 0, b''
+
+    def create_volume(self, name):
+        self._op('create_volume', name)
+        with self._lock:
+            self.volumes.add(name)
+        return name
+
+    def remove_volume(self, name):
+        self._op('remove_volume', name)
+        with self._lock:
+            if name not in self.volumes:
+                raise ContainerNotFound(f"No such volume: {name}")
+            self.volumes.discard(name)
+
+
+def _labels_match(container_labels, labels):
+    return all(container_labels.get(k) == v for k, v in (labels or {}).items())
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """Process-wide container runtime (Docker unless replaced with set_runtime)"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = DockerRuntime()
+        return _runtime
+
+
+def set_runtime(runtime):
+    """Swap the process-wide runtime (e.g. a FakeRuntime in tests); returns the previous one"""
+    global _runtime
+    with _runtime_lock:
+        previous, _runtime = _runtime, runtime
+    return previous
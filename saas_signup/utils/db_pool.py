@@ -0,0 +1,241 @@
+"""
+Control-Plane PostgreSQL Connection Pooling for SaaS Multi-Tenancy
+Pooled connections to the ``postgres`` maintenance database and tenant databases.
+
+Credentials come from the Odoo server configuration (``db_host``, ``db_port``,
+``db_user``, ``db_password``). One pool serves the maintenance database; tenant
+databases get small pools kept in a bounded LRU, so idle tenants do not pin
+connections. Before a database is dropped or used as a ``CREATE DATABASE``
+template, call ``close_database(name)`` to release pooled connections to it.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+_logger = logging.getLogger(__name__)
+
+MAINTENANCE_DB = 'postgres'
+MAINTENANCE_MAXCONN = 8     # connections to the maintenance database
+TENANT_MAXCONN = 2          # connections per tenant database
+TENANT_POOLS = 32           # tenant databases with a pool at any time
+ACQUIRE_TIMEOUT = 30        # seconds to wait for a free pooled connection
+
+
+def get_db_params():
+    """Connection parameters from the Odoo server configuration (db_password is required)"""
+    from odoo.tools import config
+    password = config.get('db_password')
+    if not password:
+        raise RuntimeError("db_password is not set in the Odoo server configuration; "
+                           "tenant containers and pooled connections need it")
+    return {
+        'host': config.get('db_host') or 'db',
+        'port': int(config.get('db_port') or 5432),
+        'user': config.get('db_user') or 'odoo',
+        'password': password,
+    }
+
+
+class _CountingPool(pg_pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool reporting opened connections to its manager"""
+
+    def __init__(self, manager, minconn, maxconn, **kwargs):
+        self._manager = manager
+        super().__init__(minconn, maxconn, **kwargs)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        self._manager._count('opened')
+        return conn
+
+
+class _Slot:
+    """A pool plus the semaphore bounding concurrent borrowers"""
+
+    def __init__(self, pool, maxconn):
+        self.pool = pool
+        self.semaphore = threading.BoundedSemaphore(maxconn)
+        self.borrowed = 0
+        self.retired = False  # removed from the manager; closed when the last borrower returns
+
+
+class ConnectionManager:
+    """Pooled connections with wait and churn metrics"""
+
+    def __init__(self, maintenance_maxconn=MAINTENANCE_MAXCONN, tenant_maxconn=TENANT_MAXCONN,
+                 tenant_pools=TENANT_POOLS, acquire_timeout=ACQUIRE_TIMEOUT, params=None):
+        self.maintenance_maxconn = maintenance_maxconn
+        self.tenant_maxconn = tenant_maxconn
+        self.tenant_pools = tenant_pools
+        self.acquire_timeout = acquire_timeout
+        self._params = params
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,       # connections handed out
+            'waits': 0,           # checkouts that had to wait for a free connection
+            'wait_seconds': 0.0,  # total time spent waiting
+            'timeouts': 0,        # checkouts that gave up waiting
+            'opened': 0,          # physical connections opened
+            'closed': 0,          # physical connections closed (broken, evicted, released)
+            'evictions': 0,       # tenant pools evicted from the LRU
+        }
+
+    @property
+    def params(self):
+        if self._params is None:
+            self._params = get_db_params()
+        return self._params
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        """Snapshot of the pool metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pools'] = len(self._slots)
+            stats['borrowed'] = sum(slot.borrowed for slot in self._slots.values())
+        return stats
+
+    # ==================
+    # POOLS
+    # ==================
+
+    def _slot(self, dbname):
+        """Pool for a database, creating it and evicting idle tenant pools as needed"""
+        with self._lock:
+            slot = self._slots.get(dbname)
+            if slot is not None:
+                self._slots.move_to_end(dbname)
+                slot.borrowed += 1
+                return slot
+
+            evicted = []
+            if dbname != MAINTENANCE_DB:
+                tenants = [name for name in self._slots if name != MAINTENANCE_DB]
+                for name in tenants[:max(len(tenants) - self.tenant_pools + 1, 0)]:
+                    if self._slots[name].borrowed == 0:
+                        evicted.append(self._slots.pop(name))
+                        self._stats['evictions'] += 1
+
+            maxconn = self.maintenance_maxconn if dbname == MAINTENANCE_DB else self.tenant_maxconn
+            slot = _Slot(_CountingPool(self, 0, maxconn, database=dbname, **self.params), maxconn)
+            slot.borrowed += 1
+            self._slots[dbname] = slot
+
+        for old in evicted:
+            self._close_pool(old.pool)
+        return slot
+
+    def _close_pool(self, pool):
+        closed = sum(1 for conn in pool._pool if not conn.closed)
+        pool.closeall()
+        self._count('closed', closed)
+
+    def close_database(self, dbname):
+        """Close pooled connections to a database (before DROP or CREATE ... TEMPLATE).
+
+        A pool with borrowed connections is retired instead: new checkouts get a fresh
+        pool and the retired one is closed when its last borrower returns.
+        """
+        with self._lock:
+            slot = self._slots.pop(dbname, None)
+            if slot is None:
+                return
+            slot.retired = True
+            if slot.borrowed:
+                _logger.warning(f"Pool for {dbname} retired while {slot.borrowed} connection(s) are borrowed")
+                return
+        self._close_pool(slot.pool)
+
+    def closeall(self):
+        with self._lock:
+            slots, self._slots = list(self._slots.values()), OrderedDict()
+            for slot in slots:
+                slot.retired = True
+            idle = [slot for slot in slots if not slot.borrowed]
+        for slot in idle:
+            self._close_pool(slot.pool)
+
+    # ==================
+    # CHECKOUT
+    # ==================
+
+    @contextmanager
+    def connection(self, dbname=MAINTENANCE_DB, autocommit=True):
+        """Borrow a pooled connection; broken connections are discarded on return"""
+        slot = self._slot(dbname)
+        try:
+            started = time.monotonic()
+            if not slot.semaphore.acquire(blocking=False):
+                self._count('waits')
+                if not slot.semaphore.acquire(timeout=self.acquire_timeout):
+                    self._count('timeouts')
+                    raise pg_pool.PoolError(f"No pooled connection to {dbname} within {self.acquire_timeout}s")
+                self._count('wait_seconds', time.monotonic() - started)
+
+            broken = False
+            try:
+                conn = slot.pool.getconn()
+                self._count('checkouts')
+                try:
+                    conn.autocommit = autocommit
+                    yield conn
+                    if not autocommit:
+                        conn.commit()
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # Server closed or terminated the connection (e.g. pg_terminate_backend)
+                    broken = True
+                    raise
+                finally:
+                    broken = broken or bool(conn.closed)
+                    slot.pool.putconn(conn, close=broken)
+                    if broken:
+                        self._count('closed')
+            finally:
+                slot.semaphore.release()
+        finally:
+            with self._lock:
+                slot.borrowed -= 1
+                close = slot.retired and not slot.borrowed
+            if close:
+                self._close_pool(slot.pool)
+
+    @contextmanager
+    def cursor(self, dbname=MAINTENANCE_DB, autocommit=True):
+        """Borrow a pooled connection and yield a cursor on it"""
+        with self.connection(dbname, autocommit=autocommit) as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_connection_manager():
+    """Process-wide connection manager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ConnectionManager()
+        return _manager
+
+
+def set_connection_manager(manager):
+    """Swap the process-wide manager; returns the previous one"""
+    global _manager
+    with _manager_lock:
+        previous, _manager = _manager, manager
+    return previous
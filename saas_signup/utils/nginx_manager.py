@@ -4,9 +4,16 @@ Dynamically creates and manages Nginx configurations for tenant subdomains
 """
 
 import os
+import re
 import subprocess
+import tempfile
+import threading
+import time
 import logging
-import docker
+
+from .container_runtime import get_runtime
+from .nginx_reload import get_reload_coordinator
+from .waiting_responder import split_wake_url
 
 _logger = logging.getLogger(__name__)
 
@@ -27,9 +34,29 @@ class NginxManager:
     SYSTEM_NGINX_ENABLED = "/etc/nginx/sites-enabled"
     DOCKER_NGINX_CONF_DIR = "/etc/nginx/conf.d"
     
+    # Map routing mode: one host -> backend map plus one shared server block
+    TENANT_MAP_FILE = "saas_tenant_map.conf"
+    TENANT_SERVER_FILE = "saas_tenants.conf"
+    DOCKER_RESOLVER = "127.0.0.11"  # Docker embedded DNS, resolves tenant container names
+    
+    # Nginx container discovery, cached between reloads (dropped when a reload fails)
+    TARGET_TTL = 300  # seconds
+    _target_lock = threading.Lock()
+    _configured_target = None
+    _cached_target = None
+    _cached_target_expires = 0.0
+    _nginx_type = None
+    
     @classmethod
     def _detect_nginx_type(cls):
-        """Detect if using system nginx or docker nginx"""
+        """Detect if using system nginx or docker nginx (probed once per process)"""
+        if cls._nginx_type is None:
+            cls._nginx_type = cls._probe_nginx_type()
+        return cls._nginx_type
+    
+    @classmethod
+    def _probe_nginx_type(cls):
+        """Filesystem probes behind _detect_nginx_type"""
         # Check for our project's docker nginx config directory first
         project_docker_dir = "/home/avodahdevops/Desktop/Odoo_Projects/Odoo19/nginx/conf.d"
         if os.path.exists(project_docker_dir):
@@ -42,6 +69,41 @@ class NginxManager:
             # Fallback: assume docker for SaaS platform
             return 'docker'
     
+    @classmethod
+    def configure_target(cls, container=None):
+        """Pin the nginx container (ID or name) reloads are sent to; empty means auto-discover"""
+        container = (container or '').strip() or None
+        with cls._target_lock:
+            if container != cls._configured_target:
+                cls._configured_target = container
+                cls._cached_target = None
+    
+    @classmethod
+    def _get_nginx_target(cls, runtime):
+        """Docker nginx container to reload: the configured one, else a TTL-cached discovery"""
+        with cls._target_lock:
+            if cls._configured_target:
+                return cls._configured_target
+            if cls._cached_target and time.monotonic() < cls._cached_target_expires:
+                return cls._cached_target
+        
+        nginx_containers = [c for c in runtime.list(all=False) if 'nginx' in c.name.lower()]
+        if not nginx_containers:
+            return None
+        target = nginx_containers[0].name
+        with cls._target_lock:
+            cls._cached_target = target
+            cls._cached_target_expires = time.monotonic() + cls.TARGET_TTL
+        _logger.info(f"Nginx container discovered: {target}")
+        return target
+    
+    @classmethod
+    def _invalidate_nginx_target(cls):
+        """Forget the discovered container and nginx type so the next reload probes again"""
+        with cls._target_lock:
+            cls._cached_target = None
+            cls._nginx_type = None
+    
     @classmethod
     def _get_saas_config(cls):
         """Get SaaS configuration for nginx path"""
@@ -98,6 +160,20 @@ class NginxManager:
         config_dir = cls._get_config_dir()
         config_file = f"{config_dir}/{subdomain}.conf"
         
+        previous = None
+        if os.path.exists(config_file):
+            with open(config_file) as f:
+                previous = f.read()
+        
+        def rollback():
+            # Runs from the reload coordinator if nginx rejects the configuration
+            if previous is None:
+                if os.path.exists(config_file):
+                    os.remove(config_file)
+            else:
+                with open(config_file, 'w') as f:
+                    f.write(previous)
+        
         try:
             # Write config
             with open(config_file, 'w') as f:
@@ -105,8 +181,9 @@ class NginxManager:
             
             _logger.info(f"✅ Nginx config written to {config_file}")
             
-            # Test and reload Nginx container
-            cls._test_and_reload()
+            # Test and reload Nginx container (debounced, shared with other changes);
+            # a failing `nginx -t` rolls this file back
+            cls._request_reload(f"create {subdomain}", rollback=rollback)
             
             _logger.info(f"✅ Nginx config created for {subdomain}.{main_domain} → port {odoo_port}")
             return True
@@ -114,8 +191,7 @@ class NginxManager:
         except Exception as e:
             _logger.error(f"❌ Failed to create Nginx config for {subdomain}: {e}")
             # Cleanup on failure
-            if os.path.exists(config_file):
-                os.remove(config_file)
+            rollback()
             raise
     
     @classmethod
@@ -147,7 +223,7 @@ class NginxManager:
                         _logger.info(f"✅ Removed config: {config_file}")
             
             if removed:
-                cls._reload()
+                cls._request_reload(f"remove {subdomain}")
                 _logger.info(f"✅ Nginx config removed for {subdomain}")
             return removed
             
@@ -158,7 +234,7 @@ class NginxManager:
     @classmethod
     def update_tenant_config(cls, subdomain, odoo_port, longpolling_port=None):
         """
-        Update existing tenant config (remove and recreate)
+        Update existing tenant config (remove and recreate, one coalesced reload)
         
         Args:
             subdomain: Tenant subdomain
@@ -175,9 +251,7 @@ class NginxManager:
     def _get_container_ip(cls, container_name):
         """Get the IP address of a Docker container on the odoo-network"""
         try:
-            client = docker.from_env()
-            container = client.containers.get(container_name)
-            container.reload()  # Refresh container info
+            container = get_runtime().get(container_name)
 
             # Get the network settings for odoo19_odoo-network
             networks = container.attrs.get('NetworkSettings', {}).get('Networks', {})
@@ -317,6 +391,276 @@ server {{
 }}
 """
     
+    # ==================
+    # MAP ROUTING
+    # ==================
+    
+    @classmethod
+    def _map_backend(cls, route, nginx_type):
+        """Backend address for a route: container name on the shared network, or the host port"""
+        if nginx_type == 'system':
+            return f"127.0.0.1:{route['port']}"
+        return f"{route['container_name']}:8069"
+    
+    @classmethod
+    def render_tenant_map(cls, routes, main_domain, nginx_type='docker'):
+        """
+        Render the host -> backend map, one line per tenant
+        
+        Args:
+            routes: iterable of dicts with 'subdomain', 'port' and 'container_name'
+            main_domain: Main domain for subdomains
+            nginx_type: 'docker' or 'system'
+        """
+        lines = [
+            f"    {route['subdomain']}.{main_domain} {cls._map_backend(route, nginx_type)};"
+            for route in sorted(routes, key=lambda r: r['subdomain'])
+        ]
+        body = '\n'.join(lines)
+        return f"""# ==============================================
+# SaaS Tenant Routing Map ({len(lines)} tenants)
+# Auto-generated by Avodah SaaS Platform - do not edit
+# Raise map_hash_max_size in nginx.conf for very large fleets
+# ==============================================
+
+map $host $tenant_backend {{
+    hostnames;
+    default "";
+{body}
+}}
+"""
+    
+    @classmethod
+    def _render_wake_block(cls, wake_url):
+        """Server-level directives handing requests for a stopped (hibernated) tenant to the wake URL"""
+        if not wake_url:
+            return ''
+        origin, path = split_wake_url(wake_url)
+        return f"""
+    # Stopped tenant (scale-to-zero): the wake endpoint, asked on the tenant's own host,
+    # schedules its start and answers with a page refreshing until the tenant is up
+    error_page 502 504 = @wake_tenant;
+    location @wake_tenant {{
+        rewrite ^ {path} break;
+        proxy_pass {origin};
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-Host $host;
+        add_header Cache-Control "no-store" always;
+    }}
+    """
+    
+    @classmethod
+    def render_shared_server(cls, main_domain, nginx_type='docker', wake_url=None):
+        """Render the single server block routing every tenant subdomain through the map"""
+        domain = re.escape(main_domain)
+        resolver = f"resolver {cls.DOCKER_RESOLVER} valid=30s ipv6=off;" if nginx_type != 'system' else ''
+        wake = cls._render_wake_block(wake_url)
+        return f"""# ==============================================
+# SaaS Tenants Shared Server (map routing)
+# Auto-generated by Avodah SaaS Platform - do not edit
+# ==============================================
+
+server {{
+    listen 80;
+    # Regex name: explicit server_name blocks keep priority
+    server_name ~^[^.]+\\.{domain}$;
+    {resolver}
+    
+    if ($tenant_backend = "") {{
+        return 404;
+    }}
+    
+    # Proxy settings
+    proxy_read_timeout 720s;
+    proxy_connect_timeout 720s;
+    proxy_send_timeout 720s;
+    proxy_buffers 16 64k;
+    proxy_buffer_size 128k;
+    client_max_body_size 100M;
+    client_body_buffer_size 128k;
+    
+    gzip on;
+    gzip_vary on;
+    gzip_proxied any;
+    gzip_comp_level 6;
+    gzip_types text/plain text/css text/xml text/javascript application/json application/javascript application/xml+rss application/rss+xml font/truetype font/opentype application/vnd.ms-fontobject image/svg+xml;
+    {wake}
+    location /websocket {{
+        proxy_pass http://$tenant_backend;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_set_header X-Forwarded-Host $host;
+    }}
+    
+    location / {{
+        proxy_pass http://$tenant_backend;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_set_header X-Forwarded-Host $host;
+        proxy_set_header X-Forwarded-Port $server_port;
+        proxy_redirect off;
+    }}
+}}
+"""
+    
+    @classmethod
+    def _atomic_write(cls, path, content):
+        """Write a file via temp file + rename; returns False when the content is unchanged"""
+        try:
+            with open(path) as f:
+                if f.read() == content:
+                    return False
+        except FileNotFoundError:
+            pass
+        
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.saas_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+    
+    @classmethod
+    def write_tenant_map(cls, routes, main_domain, config_dir=None, wake_url=None):
+        """
+        Regenerate map routing from the full route list and reload only if it changed
+        
+        Args:
+            routes: iterable of dicts with 'subdomain', 'port' and 'container_name'
+            main_domain: Main domain for subdomains
+            config_dir: nginx include directory (defaults to the detected one)
+            wake_url: endpoint stopped tenants are redirected to (scale-to-zero), if any
+        
+        Returns:
+            bool: True if nginx configuration changed
+        """
+        routes = list(routes)
+        nginx_type = cls._detect_nginx_type()
+        config_dir = config_dir or cls._get_config_dir()
+        changed = cls._atomic_write(
+            os.path.join(config_dir, cls.TENANT_MAP_FILE),
+            cls.render_tenant_map(routes, main_domain, nginx_type),
+        )
+        changed |= cls._atomic_write(
+            os.path.join(config_dir, cls.TENANT_SERVER_FILE),
+            cls.render_shared_server(main_domain, nginx_type, wake_url=wake_url),
+        )
+        if changed:
+            cls._request_reload(f"map {len(routes)} tenants")
+            _logger.info(f"✅ Nginx tenant map updated in {config_dir}")
+        return changed
+    
+    # ==================
+    # DYNAMIC ROUTING
+    # ==================
+    
+    @classmethod
+    def render_dynamic_server(cls, main_domain, lookup_url, nginx_type='docker', wake_url=None, route_secret=None):
+        """Render the static server block resolving each request's backend via auth_request"""
+        secret_header = f'proxy_set_header X-Saas-Route-Secret "{route_secret}";' if route_secret else ''
+        domain = re.escape(main_domain)
+        wake = cls._render_wake_block(wake_url)
+        lookup_url = lookup_url.rstrip('/')
+        resolver = f"resolver {cls.DOCKER_RESOLVER} valid=30s ipv6=off;" if nginx_type != 'system' else ''
+        proxy_headers = """proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_set_header X-Forwarded-Host $host;"""
+        return f"""# ==============================================
+# SaaS Tenants Shared Server (dynamic routing)
+# Backends come from {lookup_url}/saas/route; routing changes need no reload
+# Auto-generated by Avodah SaaS Platform - do not edit
+# ==============================================
+
+server {{
+    listen 80;
+    server_name ~^[^.]+\\.{domain}$;
+    {resolver}
+    
+    proxy_read_timeout 720s;
+    proxy_connect_timeout 720s;
+    proxy_send_timeout 720s;
+    client_max_body_size 100M;
+    
+    # Backend lookup (answers 204 + X-Tenant-Backend, or 403 for unknown tenants)
+    location = /_saas_route {{
+        internal;
+        proxy_pass {lookup_url}/saas/route;
+        proxy_pass_request_body off;
+        proxy_set_header Content-Length "";
+        proxy_set_header X-Original-Host $host;
+        {secret_header}
+    }}
+    
+    error_page 403 = @unknown_tenant;
+    location @unknown_tenant {{
+        return 404;
+    }}
+    {wake}
+    location /websocket {{
+        auth_request /_saas_route;
+        auth_request_set $tenant_backend $upstream_http_x_tenant_backend;
+        proxy_pass http://$tenant_backend;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+        {proxy_headers}
+    }}
+    
+    location / {{
+        auth_request /_saas_route;
+        auth_request_set $tenant_backend $upstream_http_x_tenant_backend;
+        proxy_pass http://$tenant_backend;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        {proxy_headers}
+        proxy_redirect off;
+    }}
+}}
+"""
+    
+    @classmethod
+    def write_dynamic_server(cls, main_domain, lookup_url, config_dir=None, wake_url=None, route_secret=None):
+        """
+        Install the dynamic routing server block; reloads only when it changed (normally once)
+        
+        Returns:
+            bool: True if nginx configuration changed
+        """
+        nginx_type = cls._detect_nginx_type()
+        config_dir = config_dir or cls._get_config_dir()
+        changed = cls._atomic_write(
+            os.path.join(config_dir, cls.TENANT_SERVER_FILE),
+            cls.render_dynamic_server(main_domain, lookup_url, nginx_type, wake_url=wake_url,
+                                      route_secret=route_secret),
+        )
+        # A map left over from map routing mode would be unused
+        map_file = os.path.join(config_dir, cls.TENANT_MAP_FILE)
+        if os.path.exists(map_file):
+            os.remove(map_file)
+            changed = True
+        if changed:
+            cls._request_reload("dynamic routing server")
+        return changed
+    
     @classmethod
     def _test_and_reload(cls):
         """Test Nginx config and reload - works for both system and docker nginx"""
@@ -336,27 +680,25 @@ server {{
                     _logger.warning(f"Nginx reload warning: {reload_result.stderr}")
             else:
                 # Docker nginx
-                import docker
-                client = docker.from_env()
+                runtime = get_runtime()
                 
-                nginx_containers = [c for c in client.containers.list() if 'nginx' in c.name.lower()]
-                if not nginx_containers:
+                nginx_container = cls._get_nginx_target(runtime)
+                if not nginx_container:
                     _logger.warning("No nginx container found, skipping reload")
                     return
                 
-                nginx_container = nginx_containers[0]
-                
-                result = nginx_container.exec_run('nginx -t')
-                if result.exit_code != 0:
-                    raise Exception(f"Nginx config test failed: {result.output.decode()}")
+                exit_code, output = runtime.exec(nginx_container, 'nginx -t')
+                if exit_code != 0:
+                    raise Exception(f"Nginx config test failed: {output.decode()}")
                 
-                reload_result = nginx_container.exec_run('nginx -s reload')
-                if reload_result.exit_code == 0:
+                exit_code, output = runtime.exec(nginx_container, 'nginx -s reload')
+                if exit_code == 0:
                     _logger.info("✅ Docker Nginx reloaded successfully")
                 else:
-                    _logger.warning(f"Nginx reload warning: {reload_result.output.decode()}")
+                    _logger.warning(f"Nginx reload warning: {output.decode()}")
                     
         except Exception as e:
+            cls._invalidate_nginx_target()
             _logger.error(f"Failed to reload nginx: {e}")
             raise
     
@@ -365,6 +707,11 @@ server {{
         """Reload Nginx to apply changes"""
         cls._test_and_reload()
     
+    @classmethod
+    def _request_reload(cls, change, rollback=None):
+        """Queue a reload covering this change; returns immediately (see nginx_reload)"""
+        get_reload_coordinator().request(change, rollback=rollback)
+    
     @classmethod
     def test_config(cls):
         """Test if current Nginx configuration is valid"""
@@ -385,6 +732,8 @@ server {{
             return configs
         
         for filename in os.listdir(config_dir):
+            if filename in (cls.TENANT_MAP_FILE, cls.TENANT_SERVER_FILE):
+                continue
             if filename.endswith('.conf') and filename not in ['default.conf', 'nginx.conf', 'default']:
                 # Extract subdomain from filename
                 subdomain = filename.split('.')[0]
@@ -0,0 +1,212 @@
+"""
+Nginx Reload Coordinator for SaaS Multi-Tenancy
+Debounces and coalesces nginx test+reload cycles.
+
+Config writers call ``request(change)`` and return immediately. The first
+request of a burst starts a timer; when it fires, every change queued so far
+is covered by a single ``nginx -t`` + reload, so a bulk approval of N tenants
+restarts nginx workers once instead of N times. A window of 0 reloads inline.
+
+A change may come with a ``rollback`` callable undoing its file write. When a
+reload fails, queued changes are rolled back newest first, retrying after each
+one, until nginx accepts the configuration again; the history entry names the
+changes that were rolled back, so one bad tenant file cannot break every later
+reload.
+
+The timer lives in one worker process. So that a worker recycled or killed
+before its timer fired cannot leave written config unloaded, every request
+touches a marker file next to the config, a successful reload removes it,
+pending changes are flushed at interpreter exit, and ``recover()`` (run by a
+cron) reloads for a marker nobody cleared in time.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 2.0    # seconds changes are collected before one reload
+HISTORY_SIZE = 50       # reloads kept for reporting
+MARKER_NAME = '.saas_reload_pending'
+STALE_AFTER = 60        # seconds a pending marker may age before another process reloads for it
+
+
+class ReloadCoordinator:
+    """At most one nginx test+reload per window, covering every queued change"""
+
+    def __init__(self, reload_fn=None, window=DEFAULT_WINDOW, marker=None):
+        self._reload_fn = reload_fn
+        self.window = window
+        self._marker = marker
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()  # one reload at a time
+        self._pending = []
+        self._timer = None
+        self.history = deque(maxlen=HISTORY_SIZE)
+
+    def configure(self, window=None):
+        if window is not None:
+            self.window = max(float(window), 0.0)
+
+    def _reload(self):
+        if self._reload_fn is not None:
+            return self._reload_fn()
+        from .nginx_manager import NginxManager
+        return NginxManager._test_and_reload()
+
+    def _marker_path(self):
+        if self._marker is not None:
+            return self._marker
+        from .nginx_manager import NginxManager
+        return os.path.join(NginxManager._get_config_dir(), MARKER_NAME)
+
+    def _mark_pending(self):
+        try:
+            path = self._marker_path()
+            with open(path, 'a'):
+                pass
+            os.utime(path)
+        except OSError as e:
+            _logger.debug(f"Could not write nginx reload marker: {e}")
+
+    def _clear_marker(self, since):
+        """Remove the marker unless a change was requested after ``since`` (epoch seconds)"""
+        try:
+            path = self._marker_path()
+            if os.path.getmtime(path) <= since:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _logger.debug(f"Could not clear nginx reload marker: {e}")
+
+    def request(self, change, rollback=None):
+        """Queue a config change (e.g. 'create acme'); the reload happens later"""
+        self._mark_pending()
+        with self._lock:
+            self._pending.append((change, rollback))
+            if self.window <= 0:
+                schedule = False
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.name = 'saas_nginx_reload'
+                schedule = True
+            else:
+                return
+        if schedule:
+            self._timer.start()
+        else:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return [change for change, _rollback in self._pending]
+
+    def flush(self):
+        """Reload now for every queued change; returns the history entry (None if nothing queued)"""
+        with self._reload_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                queued, self._pending = self._pending, []
+            if not queued:
+                return None
+
+            changes = [change for change, _rollback in queued]
+            started = time.monotonic()
+            entry = {'changes': changes, 'ok': True, 'error': None, 'rolled_back': [], 'at': time.time()}
+            try:
+                self._reload()
+                self._clear_marker(entry['at'])
+                _logger.info(f"✅ Nginx reloaded once for {len(changes)} change(s): {', '.join(changes)}")
+            except Exception as e:
+                entry.update(ok=False, error=str(e))
+                _logger.error(f"❌ Nginx reload failed for {len(changes)} change(s) ({', '.join(changes)}): {e}")
+                entry['rolled_back'] = self._roll_back(queued, entry['at'])
+            entry['seconds'] = round(time.monotonic() - started, 3)
+            self.history.append(entry)
+            return entry
+
+    def recover(self, max_age=None):
+        """Reload for config another process wrote but never reloaded; returns the history entry or None"""
+        if self.pending():
+            return None  # Our own timer covers it
+        max_age = STALE_AFTER if max_age is None else max_age
+        try:
+            age = time.time() - os.path.getmtime(self._marker_path())
+        except OSError:
+            return None
+        if age < max(max_age, self.window):
+            return None
+        _logger.warning(f"⚠️ Nginx config written {age:.0f}s ago was never reloaded, reloading now")
+        with self._lock:
+            self._pending.append(('recover unreloaded config', None))
+        return self.flush()
+
+    def _roll_back(self, queued, since):
+        """Undo changes newest first until a reload succeeds; returns the rolled back changes"""
+        rolled_back = []
+        for change, rollback in reversed(queued):
+            if rollback is None:
+                continue
+            try:
+                rollback()
+            except Exception as e:
+                _logger.error(f"❌ Could not roll back nginx change '{change}': {e}")
+                continue
+            rolled_back.append(change)
+            try:
+                self._reload()
+            except Exception:
+                continue
+            self._clear_marker(since)
+            _logger.warning(f"⚠️ Nginx reloaded after rolling back: {', '.join(rolled_back)}")
+            break
+        return rolled_back
+
+    def stats(self):
+        with self._lock:
+            return {
+                'window': self.window,
+                'pending': len(self._pending),
+                'reloads': len(self.history),
+                'last': self.history[-1] if self.history else None,
+            }
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_reload_coordinator():
+    """Process-wide reload coordinator"""
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = ReloadCoordinator()
+        return _coordinator
+
+
+@atexit.register
+def _flush_at_exit():
+    """Reload for changes still waiting on the timer when the worker exits"""
+    coordinator = _coordinator
+    if coordinator is not None and coordinator.pending():
+        try:
+            coordinator.flush()
+        except Exception as e:
+            _logger.error(f"❌ Nginx reload at exit failed: {e}")
+
+
+def set_reload_coordinator(coordinator):
+    """Swap the process-wide coordinator; returns the previous one"""
+    global _coordinator
+    with _coordinator_lock:
+        previous, _coordinator = _coordinator, coordinator
+    return previous
@@ -0,0 +1,83 @@
+"""
+Module Install Progress for SaaS Multi-Tenancy
+Turns the log stream of ``odoo -i/-u --stop-after-init`` into structured progress.
+
+Odoo logs ``Loading module <name> (<n>/<total>)`` for every module of a
+loading pass (at DEBUG level, enabled with ``LOG_HANDLER``). ``ProgressTracker``
+parses streamed lines and hands throttled snapshots to a callback, so the
+caller can store them without a database write per log line. Reported
+percentages never go down, even when a later, larger pass starts over.
+"""
+
+import re
+import time
+
+# Appended to odoo commands so module loading lines are logged
+LOG_HANDLER = '--log-handler=odoo.modules.loading:DEBUG'
+MIN_INTERVAL = 1.0  # seconds between two reported snapshots
+
+MODULE_RE = re.compile(r'Loading module (\S+) \((\d+)/(\d+)\)')
+
+
+def parse_line(line):
+    """{'module', 'loaded', 'total'} for a module loading line, else None"""
+    match = MODULE_RE.search(line)
+    if not match:
+        return None
+    return {'module': match.group(1), 'loaded': int(match.group(2)), 'total': int(match.group(3))}
+
+
+class ProgressTracker:
+    """Feeds on log lines and reports {'percent', 'message', ...} at most every min_interval"""
+
+    def __init__(self, on_progress, min_interval=MIN_INTERVAL):
+        self.on_progress = on_progress
+        self.min_interval = min_interval
+        self.module = None
+        self.loaded = 0
+        self.total = 0
+        self._reported = None
+        self._last_report = 0.0
+
+    @property
+    def percent(self):
+        # 100 only once the run finished: a later, larger loading pass may still come
+        return min(self.loaded * 100 // self.total, 99) if self.total else 0
+
+    def snapshot(self):
+        message = f"Loading {self.module} ({self.loaded}/{self.total})" if self.module else 'Starting'
+        return {
+            'module': self.module,
+            'loaded': self.loaded,
+            'total': self.total,
+            'percent': self.percent,
+            'message': message,
+        }
+
+    def feed(self, line):
+        parsed = parse_line(line)
+        if parsed is None:
+            return
+        # Odoo loads the base graph first; ignore passes smaller than one already seen
+        if parsed['total'] < self.total:
+            return
+        self.module, self.loaded, self.total = parsed['module'], parsed['loaded'], parsed['total']
+        # The base-only pass (1/1) says nothing about the real run: wait for the full graph
+        if self.total > 1 and time.monotonic() - self._last_report >= self.min_interval:
+            self._report(self.snapshot())
+
+    def finish(self):
+        """Report completion regardless of throttling (nothing to report if no module line was seen)"""
+        if not self.total:
+            return
+        snapshot = dict(self.snapshot(), percent=100, message=f"{self.total} modules loaded")
+        self._report(snapshot)
+
+    def _report(self, snapshot):
+        if self._reported and snapshot['percent'] < self._reported['percent']:
+            snapshot = dict(snapshot, percent=self._reported['percent'])
+        if snapshot == self._reported:
+            return
+        self._reported = snapshot
+        self._last_report = time.monotonic()
+        self.on_progress(snapshot)
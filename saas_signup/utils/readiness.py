@@ -0,0 +1,69 @@
+"""
+Tenant Readiness Probing for SaaS Multi-Tenancy
+Waits for a tenant Odoo container to answer before it is used.
+
+A probe asks ``/web/health`` over HTTP; endpoints configured without a path
+fall back to a plain TCP connect. Probing retries with exponential backoff
+until the overall deadline.
+"""
+
+import logging
+import socket
+import time
+import urllib.error
+import urllib.request
+
+_logger = logging.getLogger(__name__)
+
+HEALTH_PATH = '/web/health'
+DEFAULT_DEADLINE = 120      # seconds before a tenant is reported as timed out
+INITIAL_DELAY = 0.5         # seconds before the second probe
+MAX_DELAY = 8.0             # cap for the backoff between probes
+PROBE_TIMEOUT = 2.0         # seconds per probe
+
+
+def probe(host, port, path=HEALTH_PATH, timeout=PROBE_TIMEOUT):
+    """True if the endpoint answers (HTTP below 500, or TCP accept when path is None)"""
+    if path is None:
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=timeout) as response:
+            return response.status < 500
+    except urllib.error.HTTPError as e:
+        # Odoo is serving requests even if the health route is missing
+        return e.code < 500
+    except (urllib.error.URLError, OSError, ValueError):
+        return False
+
+
+def wait_until_ready(endpoints, deadline=DEFAULT_DEADLINE, initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY):
+    """Poll endpoints [(host, port, path), ...] until one answers or the deadline passes.
+
+    Returns the number of seconds waited, or None on timeout.
+    """
+    started = time.monotonic()
+    delay = initial_delay
+    while True:
+        for host, port, path in endpoints:
+            if probe(host, port, path):
+                return time.monotonic() - started
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            _logger.warning(f"Readiness deadline of {deadline}s passed for {endpoints}")
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def tenant_endpoints(container_name, port, mode='http'):
+    """Tenant container on the Docker network, then its published host port"""
+    path = HEALTH_PATH if mode == 'http' else None
+    return [
+        (container_name, 8069, path),
+        ('localhost', port, path),
+    ]
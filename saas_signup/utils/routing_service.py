@@ -0,0 +1,198 @@
+"""
+Dynamic Tenant Routing for SaaS Multi-Tenancy
+Subdomain -> backend table consulted by nginx at request time.
+
+In dynamic routing mode nginx runs one static server block whose
+``auth_request`` asks Odoo (``/saas/route``) for the backend of the requested
+host and proxies to it. Approve/suspend/delete only update this table, so
+routing changes never rewrite nginx config nor reload workers.
+
+The table lives in a route store shared by all Odoo workers on the host:
+``FileRouteStore`` keeps it in one JSON file (atomic replace, re-read when its
+mtime changes); ``MemoryRouteStore`` is the in-process stand-in used in tests.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+
+_logger = logging.getLogger(__name__)
+
+ROUTE_STORE_FILE = 'saas_routes.json'
+
+
+class RouteStore:
+    """subdomain -> backend ('host:port') mapping"""
+
+    def get(self, subdomain):
+        raise NotImplementedError
+
+    def update(self, routes=None, removed=()):
+        """Set the given {subdomain: backend} routes and drop the removed subdomains"""
+        raise NotImplementedError
+
+    def replace(self, routes):
+        """Replace the whole table"""
+        raise NotImplementedError
+
+    def all(self):
+        raise NotImplementedError
+
+
+class MemoryRouteStore(RouteStore):
+    """Process-local store (tests, single-worker setups)"""
+
+    def __init__(self, routes=None):
+        self._routes = dict(routes or {})
+        self._lock = threading.Lock()
+
+    def get(self, subdomain):
+        return self._routes.get(subdomain)
+
+    def update(self, routes=None, removed=()):
+        with self._lock:
+            self._routes.update(routes or {})
+            for subdomain in removed:
+                self._routes.pop(subdomain, None)
+
+    def replace(self, routes):
+        with self._lock:
+            self._routes = dict(routes)
+
+    def all(self):
+        return dict(self._routes)
+
+
+class FileRouteStore(RouteStore):
+    """JSON file shared by every worker on the host; readers reload it only when it changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._mtime = None
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        # Every write is a fresh inode (atomic replace), so this catches same-tick rewrites too
+        mtime = (stat.st_ino, stat.st_mtime_ns)
+        if mtime != self._mtime:
+            with self._lock:
+                try:
+                    with open(self.path) as f:
+                        self._routes = json.load(f)
+                    self._mtime = mtime
+                except (OSError, ValueError) as e:
+                    _logger.error(f"❌ Could not read route store {self.path}: {e}")
+        return self._routes
+
+    def get(self, subdomain):
+        return self._load().get(subdomain)
+
+    def all(self):
+        return dict(self._load())
+
+    def _write(self, mutate):
+        """Read-modify-write under an exclusive file lock, replacing the file atomically"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.path) as f:
+                    routes = json.load(f)
+            except (FileNotFoundError, ValueError):
+                routes = {}
+            mutate(routes)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.saas_routes_', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(routes, f, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def update(self, routes=None, removed=()):
+        def mutate(table):
+            table.update(routes or {})
+            for subdomain in removed:
+                table.pop(subdomain, None)
+        self._write(mutate)
+
+    def replace(self, routes):
+        def mutate(table):
+            table.clear()
+            table.update(routes)
+        self._write(mutate)
+
+
+class RoutingService:
+    """Maintains the tenant routing table and answers nginx lookups"""
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def subdomain_of(host, main_domain=None):
+        """'acme.example.com:80' -> 'acme' (None when the host is not a tenant subdomain)"""
+        host = (host or '').split(':')[0].lower().rstrip('.')
+        if main_domain:
+            suffix = f".{main_domain.lower()}"
+            if not host.endswith(suffix):
+                return None
+            host = host[:-len(suffix)]
+        subdomain = host.split('.')[0]
+        return subdomain or None
+
+    def lookup(self, host, main_domain=None):
+        """Backend address for a request host, or None"""
+        subdomain = self.subdomain_of(host, main_domain)
+        return self.store.get(subdomain) if subdomain else None
+
+    def set_routes(self, routes):
+        """Add or move tenants: {subdomain: backend}"""
+        if routes:
+            self.store.update(routes=routes)
+            _logger.info(f"🔀 Routes set: {', '.join(sorted(routes))}")
+
+    def remove_routes(self, subdomains):
+        subdomains = list(subdomains)
+        if subdomains:
+            self.store.update(removed=subdomains)
+            _logger.info(f"🔀 Routes removed: {', '.join(sorted(subdomains))}")
+
+    def sync(self, routes):
+        """Replace the table with the full {subdomain: backend} set"""
+        self.store.replace(routes)
+        _logger.info(f"🔀 Routing table rebuilt with {len(routes)} tenant(s)")
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_routing_service():
+    """Process-wide routing service backed by a file in the Odoo data directory"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            from odoo.tools import config
+            path = config.get('saas_route_store') or os.path.join(config['data_dir'], ROUTE_STORE_FILE)
+            _service = RoutingService(FileRouteStore(path))
+        return _service
+
+
+def set_routing_service(service):
+    """Swap the process-wide service (e.g. one backed by MemoryRouteStore); returns the previous one"""
+    global _service
+    with _service_lock:
+        previous, _service = _service, service
+    return previous
@@ -0,0 +1,157 @@
+"""
+Shared Waiting Page Responder for SaaS Multi-Tenancy
+One container serves the "pending approval" page for every pending tenant.
+
+Instead of a dedicated nginx:alpine container per pending signup, a single
+nginx container on the host network listens on the port of every tenant in
+the ``pending`` state. ``sync(ports)`` rewrites its configuration from that
+port list and reloads it in place, so pending tenants cost no container of
+their own and a port is released as soon as its tenant is approved.
+
+Ports of hibernated tenants (``wake_ports``) are proxied to the wake URL with
+the visitor's own host, which schedules the tenant's start and answers with a
+page refreshing until the tenant is up.
+"""
+
+import base64
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from .container_runtime import get_runtime, ContainerNotFound, ContainerRuntimeError
+
+_logger = logging.getLogger(__name__)
+
+RESPONDER_NAME = 'saas_waiting_responder'
+RESPONDER_IMAGE = 'nginx:alpine'
+CONF_PATH = '/etc/nginx/conf.d/default.conf'
+HTML_PATH = '/usr/share/nginx/html/index.html'
+
+WAITING_PAGE_HTML = '''<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1.0"><title>Account Pending Approval</title><style>*{margin:0;padding:0;box-sizing:border-box}body{font-family:-apple-system,BlinkMacSystemFont,"Segoe UI",Roboto,sans-serif;background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);min-height:100vh;display:flex;align-items:center;justify-content:center;padding:20px}.container{max-width:600px;background:white;border-radius:20px;box-shadow:0 20px 60px rgba(0,0,0,0.3);padding:50px;text-align:center;animation:fadeIn 0.5s ease-in}@keyframes fadeIn{from{opacity:0;transform:translateY(-20px)}to{opacity:1;transform:translateY(0)}}.icon{font-size:80px;margin-bottom:20px;animation:pulse 2s infinite}@keyframes pulse{0%,100%{transform:scale(1)}50%{transform:scale(1.1)}}h1{color:#333;font-size:32px;margin-bottom:15px}.status{display:inline-block;background:#FEF3C7;color:#92400E;padding:10px 25px;border-radius:25px;font-weight:bold;margin:20px 0;border:2px solid #F59E0B}p{color:#666;font-size:18px;line-height:1.6;margin:20px 0}.info-box{background:#F3F4F6;border-left:4px solid #667eea;padding:20px;margin:30px 0;text-align:left;border-radius:5px}.info-box h3{color:#667eea;margin-bottom:15px;font-size:18px}.info-box ul{list-style:none;padding:0}.info-box li{padding:8px 0;color:#555}.info-box li:before{content:"✓ ";color:#10B981;font-weight:bold;margin-right:8px}.footer{margin-top:30px;padding-top:20px;border-top:1px solid #E5E7EB;color:#999;font-size:14px}.refresh-notice{background:#DBEAFE;color:#1E40AF;padding:15px;border-radius:10px;margin-top:20px;font-size:14px}</style></head><body><div class="container"><div class="icon">⏳</div><h1>Account Pending Approval</h1><div class="status">⚠️ Awaiting Admin Approval</div><p>Thank you for signing up! Your Odoo ERP instance is being prepared.</p><div class="info-box"><h3>📋 What's Happening?</h3><ul><li>Your account has been created</li><li>Database has been prepared</li><li>Awaiting administrator approval</li><li>Your instance will activate automatically once approved</li></ul></div><p><strong>Approval Time:</strong> Usually within 24 hours</p><div class="refresh-notice"><strong>💡 Tip:</strong> Once approved, simply refresh this page. The Odoo login will appear automatically.</div><div class="footer"><p>Odoo ERP SaaS Platform</p><p>Need help? Contact your administrator</p></div></div><script>setTimeout(function(){location.reload()},60000);</script></body></html>'''
+
+
+def render_config(ports, wake_ports=(), wake_url=None):
+    """nginx servers answering pending ports with the waiting page and hibernated ports with a wake redirect"""
+    if not ports and not wake_ports:
+        return "# No pending or hibernated tenants\n"
+    content = "# Auto-generated by Avodah SaaS Platform - do not edit\n"
+    if ports:
+        listens = '\n'.join(f"    listen {port};" for port in ports)
+        content += f"""
+server {{
+{listens}
+    server_name _;
+    root /usr/share/nginx/html;
+    
+    location / {{
+        add_header Cache-Control "no-store";
+        try_files /index.html =404;
+    }}
+}}
+"""
+    if wake_ports:
+        listens = '\n'.join(f"    listen {port};" for port in wake_ports)
+        origin, path = split_wake_url(wake_url)
+        content += f"""
+server {{
+{listens}
+    server_name _;
+    
+    location / {{
+        rewrite ^ {path} break;
+        proxy_pass {origin};
+        proxy_set_header Host $http_host;
+        proxy_set_header X-Forwarded-Host $http_host;
+        add_header Cache-Control "no-store" always;
+    }}
+}}
+"""
+    return content
+
+
+def split_wake_url(wake_url):
+    """'http://saas:8069/saas/wake' -> ('http://saas:8069', '/saas/wake') for a rewrite + proxy_pass pair"""
+    parts = urlsplit(wake_url)
+    return f"{parts.scheme}://{parts.netloc}", parts.path or '/'
+
+
+def _write_file_command(path, content):
+    """Shell snippet writing content to path inside the container (base64 keeps quoting safe)"""
+    encoded = base64.b64encode(content.encode()).decode()
+    return f"echo {encoded} | base64 -d > {path}"
+
+
+class WaitingResponder:
+    """Keeps the shared responder container listening on exactly the pending tenant ports"""
+
+    def __init__(self, runtime=None, html=WAITING_PAGE_HTML):
+        self._runtime = runtime
+        self.html = html
+        self._lock = threading.Lock()
+
+    @property
+    def runtime(self):
+        return self._runtime or get_runtime()
+
+    def sync(self, ports, wake_ports=(), wake_url=None):
+        """Serve the waiting page on `ports` and the wake redirect on `wake_ports`; returns the waiting ports"""
+        ports = sorted({int(port) for port in ports if port})
+        wake_ports = sorted({int(port) for port in wake_ports if port} - set(ports)) if wake_url else []
+        config = render_config(ports, wake_ports, wake_url)
+        with self._lock:
+            try:
+                container = self.runtime.get(RESPONDER_NAME)
+            except ContainerNotFound:
+                container = None
+
+            if container is None or container.status != 'running':
+                if container is not None:
+                    self.runtime.remove(RESPONDER_NAME, force=True)
+                self._start(config)
+            else:
+                exit_code, output = self.runtime.exec(RESPONDER_NAME, [
+                    'sh', '-c', f"{_write_file_command(CONF_PATH, config)} && nginx -s reload",
+                ])
+                if exit_code != 0:
+                    raise ContainerRuntimeError(f"Waiting responder reload failed: {output.decode(errors='replace')}")
+        _logger.info(f"⏳ Waiting page served on {len(ports)} pending port(s), wake redirect on {len(wake_ports)}")
+        return ports
+
+    def _start(self, config):
+        script = ' && '.join([
+            _write_file_command(HTML_PATH, self.html),
+            _write_file_command(CONF_PATH, config),
+            'exec nginx -g "daemon off;"',
+        ])
+        self.runtime.run(
+            RESPONDER_IMAGE,
+            RESPONDER_NAME,
+            command=['sh', '-c', script],
+            # Host networking: ports are opened by nginx itself, so the set can change without recreating
+            network_mode='host',
+            labels={'saas.type': 'waiting'},
+            restart_policy={'Name': 'unless-stopped'},
+        )
+        _logger.info(f"⏳ Waiting page responder container started")
+
+
+_responder = None
+_responder_lock = threading.Lock()
+
+
+def get_waiting_responder():
+    """Process-wide waiting page responder"""
+    global _responder
+    with _responder_lock:
+        if _responder is None:
+            _responder = WaitingResponder()
+        return _responder
+
+
+def set_waiting_responder(responder):
+    """Swap the process-wide responder; returns the previous one"""
+    global _responder
+    with _responder_lock:
+        previous, _responder = _responder, responder
+    return previous